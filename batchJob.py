@@ -0,0 +1,108 @@
+# Utility classes for running ToneRank's prompts as an offline Groq batch job
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import json
+import os
+import hashlib
+from myEmail import Email
+from llm import MODEL, MAX_RESPONSE_LEN, TEMP
+
+# Constants
+BATCH_REQUESTS_FILE_NAME = "batch_requests.jsonl" # the batch input file written for Groq's batch API
+BATCH_EMAILS_FILE_NAME = "batch_emails.json" # the emails (and their request ids) waiting for batch results
+BATCH_ENDPOINT = "/v1/chat/completions" # the API endpoint each batch request is sent to
+
+class BatchJob:
+
+    """ Reads and writes the JSONL files used by Groq's batch API. Each request line holds a custom_id and
+     a chat completion request; each result line holds the same custom_id and either the response or an
+     error, so results can be matched to requests whatever order they come back in. """
+
+    @staticmethod
+    def make_custom_id(kind, key):
+        """ Returns a stable custom_id for a request of the specified kind (e.g. "uscore" or "todo"), derived
+         from a key which identifies it (a message id or the prompt text). """
+        return f"{kind}-{hashlib.sha256(key.encode('UTF-8')).hexdigest()[:16]}"
+
+    @staticmethod
+    def make_request(custom_id, prompt):
+        """ Returns a batch request line for a prompt, with the same model settings as GroqLlama. """
+        return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT,
+                "body": {"model": MODEL, "messages": [{"role": "user", "content": prompt}],
+                         "max_tokens": MAX_RESPONSE_LEN, "temperature": TEMP}}
+
+    @staticmethod
+    def write_jsonl(file_name, lines):
+        """ Writes a list of dictionaries to a JSONL file, replacing it atomically. """
+        temp_file_name = file_name + ".tmp"
+        with open(temp_file_name, 'w', encoding='utf-8') as file:
+            for line in lines:
+                file.write(json.dumps(line) + "\n")
+        os.replace(temp_file_name, file_name)
+
+    @staticmethod
+    def read_jsonl(file_name):
+        """ Reads a JSONL file into a list of dictionaries, skipping blank lines. """
+        with open(file_name, 'r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    @staticmethod
+    def read_results(file_names):
+        """ Reads one or more batch result files. Returns a dictionary mapping each custom_id to the response
+         text, or to an Exception if the request failed. """
+        results = {}
+        for file_name in file_names:
+            for line in BatchJob.read_jsonl(file_name):
+                response = line.get('response') or {}
+                if line.get('error') or response.get('status_code', 200) != 200:
+                    error = line.get('error') or response.get('body')
+                    results[line['custom_id']] = Exception(f"Batch request failed: {error}")
+                else:
+                    results[line['custom_id']] = response['body']['choices'][0]['message']['content']
+        return results
+
+    @staticmethod
+    def save_emails(file_name, emails, custom_ids):
+        """ Saves the emails of a batch job, with the custom_id of each email's request. """
+        with open(file_name, 'w', encoding='utf-8') as file:
+            json.dump([{"custom_id": custom_id, "email": e.to_dict()} for e, custom_id in zip(emails, custom_ids)], file)
+
+    @staticmethod
+    def load_emails(file_name):
+        """ Loads the emails saved by save_emails. Returns (emails, custom_ids). """
+        with open(file_name, 'r', encoding='utf-8') as file:
+            entries = json.load(file)
+        return [Email.from_dict(entry['email']) for entry in entries], [entry['custom_id'] for entry in entries]
+
+
+class LocalBatchEndpoint:
+
+    """ A local, file-based stand-in for Groq's batch endpoint. It answers every request in a batch input
+     file with a responder function and writes a results file in the same format Groq returns, so the
+     batch workflow can be run and tested without the batch API. """
+
+    def __init__(self, responder):
+        """ Creates a new LocalBatchEndpoint. responder(prompt) returns the response text for a prompt, or
+         raises an exception if the request should fail. """
+        self.responder = responder
+
+    def run(self, requests_file_name, results_file_name):
+        """ Answers every request in the requests file and writes the results file. Returns the number of
+         requests which failed. """
+        results = []
+        failures = 0
+        for index, request in enumerate(BatchJob.read_jsonl(requests_file_name)):
+            result = {"id": f"batch_req_{index}", "custom_id": request['custom_id'], "response": None, "error": None}
+            try:
+                content = self.responder(request['body']['messages'][0]['content'])
+                result["response"] = {"status_code": 200, "request_id": f"req_{index}",
+                    "body": {"model": request['body']['model'],
+                             "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                          "finish_reason": "stop"}]}}
+            except Exception as e:
+                result["error"] = {"code": "request_failed", "message": str(e)}
+                failures = failures + 1
+            results.append(result)
+        BatchJob.write_jsonl(results_file_name, results)
+        return failures
@@ -0,0 +1,162 @@
+# Checks that an interrupted run can be resumed, and a run's failures retried, without repeating finished work
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_checkpoint.py [--size N] [--interrupt-after N] [--failure-rate R]
+# A run is interrupted with SIGINT (as Ctrl-C would) partway through scoring, then resumed; another run has
+# some emails fail every retry, then only those are retried, with and without a scoring budget (whose
+# estimates must not be retried or reported as failures). Exits with status 1 if any of them repeats work.
+
+import argparse
+import contextlib
+import os
+import signal
+import sys
+import threading
+import time
+from groq import InternalServerError
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+from toneRank import toneRank_main
+from runOptions import RunOptions
+from toneRank_io import ToneRank_IO
+from gmailPipe import GmailPipe
+from llm import GroqLlama
+from checkpoint import RunCheckpoint
+from synthInbox import make_inbox
+from fakeGmail import FakeGmailService
+from fakeGroq import FakeGroq, fake_uscore
+from bench_pipeline import load_prompt_data, set_up_user, temporary_workdir
+
+
+class InterruptingGroq(FakeGroq):
+
+    """ A FakeGroq which sends this process a SIGINT once it has answered interrupt_after requests. """
+
+    def __init__(self, prompt_data, interrupt_after, **kwargs):
+        super().__init__(prompt_data, **kwargs)
+        self.interrupt_after = interrupt_after
+        self.interrupted = False
+
+    def raw_create(self, **kwargs):
+        response = super().raw_create(**kwargs)
+        with self.lock:
+            interrupt = self.calls >= self.interrupt_after and not self.interrupted
+            self.interrupted = self.interrupted or interrupt
+        if interrupt:
+            os.kill(os.getpid(), signal.SIGINT)
+        return response
+
+
+class FailingGroq(FakeGroq):
+
+    """ A FakeGroq which always fails the scoring prompts whose fake uscore is below failure_rate * 10, so
+     those emails fail every retry (as they would in an outage), and answers the rest. """
+
+    def __init__(self, prompt_data, failure_rate, **kwargs):
+        super().__init__(prompt_data, **kwargs)
+        self.failure_rate = failure_rate
+        self.failed = 0
+
+    def raw_create(self, messages, **kwargs):
+        prompt = messages[0]['content']
+        if not prompt.startswith(self.todo_prompt) and fake_uscore(prompt) < self.failure_rate * 10:
+            with self.lock:
+                self.calls = self.calls + 1
+                self.failed = self.failed + 1
+            raise self._error(InternalServerError, 500, "Internal server error", {})
+        return super().raw_create(messages, **kwargs)
+
+
+def run(groq, func):
+    """ Runs func quietly against groq. Returns (Llama3 calls made, wall seconds, True if it was interrupted). """
+    GroqLlama.client_override = groq
+    GroqLlama.get_cached_llama_response.cache_clear() # nothing is answered from memory
+    calls, wall = groq.calls, time.perf_counter()
+    interrupted = False
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            func()
+        except KeyboardInterrupt:
+            interrupted = True
+            for thread in threading.enumerate(): # let the queries in flight finish (and be journaled), as they would on exit
+                if thread is not threading.current_thread() and not thread.daemon:
+                    thread.join()
+    return groq.calls - calls, time.perf_counter() - wall, interrupted
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Checks resuming interrupted runs and retrying failed emails.")
+    parser.add_argument("--size", type=int, default=500, help="the number of messages in the inbox")
+    parser.add_argument("--interrupt-after", type=int, default=100, help="the Llama3 requests answered before the interrupt")
+    parser.add_argument("--groq-latency", type=float, default=0.01, help="seconds per fake Groq request")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="the share of emails which fail every retry")
+    parser.add_argument("--max-llm-calls", type=int, default=100, help="the scoring budget of the run retried with a budget")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    prompt_data = load_prompt_data()
+    GmailPipe.service_override = FakeGmailService(make_inbox(args.size, seed=args.seed))
+    failures = []
+    rows = []
+    main = lambda **options: toneRank_main(RunOptions(use_cache=False, **options))
+
+    with temporary_workdir():
+        ToneRank_IO.active.load_remote_data()
+        set_up_user()
+        full = run(FakeGroq(prompt_data, seed=args.seed), main)
+        rows.append(("uninterrupted run", full))
+
+        interrupted = run(InterruptingGroq(prompt_data, args.interrupt_after, latency=args.groq_latency, seed=args.seed), main)
+        rows.append(("interrupted run", interrupted))
+        if not interrupted[2]:
+            failures.append(f"the run was not interrupted (it needed fewer than {args.interrupt_after} requests)")
+        resumed = run(FakeGroq(prompt_data, seed=args.seed), lambda: main(resume=True))
+        rows.append(("resumed run", resumed))
+        if interrupted[0] + resumed[0] != full[0]:
+            failures.append(f"the interrupted and resumed runs made {interrupted[0]} + {resumed[0]} Llama3 requests, "
+                            f"but the run alone made {full[0]}")
+        journal = RunCheckpoint()
+        if not journal.load() or not journal.finished or journal.pending():
+            failures.append("the resumed run did not finish scoring every email")
+
+        failing = FailingGroq(prompt_data, args.failure_rate, seed=args.seed)
+        flaky = run(failing, main)
+        rows.append(("run with failures", flaky))
+        journal.load()
+        flagged = len(journal.failures)
+        retried = run(FakeGroq(prompt_data, seed=args.seed), lambda: main(retry_flagged=True))
+        rows.append((f"retry of {flagged} flagged", retried))
+        if flagged == 0:
+            failures.append("no email failed, so nothing was retried")
+        if retried[0] != flagged + 1: # each flagged email, and the to-do list
+            failures.append(f"retrying {flagged} flagged emails made {retried[0]} Llama3 requests")
+        journal.load()
+        if journal.failures:
+            failures.append(f"{len(journal.failures)} emails still failed after the retry")
+
+        budgeted = run(FailingGroq(prompt_data, args.failure_rate, seed=args.seed), lambda: main(max_llm_calls=args.max_llm_calls))
+        rows.append(("run with a budget", budgeted))
+        journal.load()
+        flagged, estimated = len(journal.failures), len(journal.estimated)
+        retried = run(FakeGroq(prompt_data, seed=args.seed), lambda: main(retry_flagged=True))
+        rows.append((f"retry of {flagged} flagged", retried))
+        if estimated == 0:
+            failures.append(f"a budget of {args.max_llm_calls} queries left no email to an estimate")
+        if retried[0] != flagged + 1:
+            failures.append(f"retrying {flagged} flagged emails after a budgeted run made {retried[0]} Llama3 requests")
+        journal.load()
+        reported_flagged = ToneRank_IO.active.store.runs(1)[0][3]
+        if journal.failures or reported_flagged or len(journal.estimated) != estimated:
+            failures.append(f"after the retry, {reported_flagged} emails were reported as not processed and "
+                            f"{len(journal.estimated)} of {estimated} were still ranked on an estimate")
+        ToneRank_IO.active.save_local_data()
+
+    print(f"{'run':>24}  {'Llama3 requests':>15}  {'wall (s)':>8}")
+    for name, (calls, wall, _) in rows:
+        print(f"{name:>24}  {calls:>15}  {wall:>8.2f}")
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    print("✅ Resumed and retried runs only queried the remaining work." if not failures else "❌ Check failed.")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,107 @@
+# Checks that the daemon only scores new mail, and measures the cost of its cycles against re-running ToneRank
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_daemon.py [--size N] [--idle-cycles N] [--new N]
+# Exits with status 1 if an idle cycle queries Llama3, a cycle with new mail re-scores old mail, or a reply
+# to a thread already ranked does not add to that thread's entry.
+
+import argparse
+import contextlib
+import copy
+import os
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+from toneRank import toneRank_daemon, toneRank_main
+from runOptions import RunOptions
+from toneRank_io import ToneRank_IO
+from gmailPipe import GmailPipe
+from llm import GroqLlama
+from rankDaemon import DecayingRanking, REPORT_FILE_NAME
+from synthInbox import make_inbox
+from fakeGmail import FakeGmailService
+from fakeGroq import FakeGroq
+from bench_pipeline import load_prompt_data, set_up_user, temporary_workdir
+
+
+def make_new_mail(count, seed):
+    """ Returns count messages which have just arrived, with ids and threads no other message has. """
+    messages = make_inbox(count, seed=seed, now=time.time())
+    for message in messages:
+        message['id'] = f"new{seed}-{message['id']}"
+        message['threadId'] = f"new{seed}-{message['threadId']}"
+    return messages
+
+def make_reply(message, seed):
+    """ Returns a message which has just arrived in the same thread as message. """
+    reply = copy.deepcopy(message)
+    reply['id'] = f"reply{seed}-{message['id']}"
+    reply['internalDate'] = str(int(time.time() * 1000))
+    return reply
+
+def run(groq, func):
+    """ Runs func quietly. Returns (Llama3 calls made, CPU seconds, wall seconds). """
+    calls = groq.calls
+    GroqLlama.get_cached_llama_response.cache_clear() # nothing is answered from memory
+    cpu, wall = time.process_time(), time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        func()
+    return groq.calls - calls, time.process_time() - cpu, time.perf_counter() - wall
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Checks and benchmarks the daemon mode.")
+    parser.add_argument("--size", type=int, default=1000, help="the number of messages in the inbox at the start")
+    parser.add_argument("--idle-cycles", type=int, default=20, help="the number of cycles run without new mail")
+    parser.add_argument("--new", type=int, default=10, help="the number of messages delivered before the last cycle")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    prompt_data = load_prompt_data()
+    service = FakeGmailService(make_inbox(args.size, seed=args.seed))
+    groq = FakeGroq(prompt_data, seed=args.seed)
+    GmailPipe.service_override = service
+    GroqLlama.client_override = groq
+    failures = []
+    with temporary_workdir():
+        ToneRank_IO.active.load_remote_data()
+        set_up_user()
+        daemon = lambda cycles: toneRank_daemon(RunOptions(use_cache=False), interval=0, cycles=cycles)
+
+        first = run(groq, lambda: daemon(1))
+        idle = run(groq, lambda: daemon(args.idle_cycles))
+        if idle[0] != 0:
+            failures.append(f"{args.idle_cycles} idle cycles made {idle[0]} Llama3 calls")
+        new_mail = make_new_mail(args.new, args.seed + 1)
+        service.deliver(new_mail)
+        new = run(groq, lambda: daemon(1))
+        if new[0] > args.new + 1: # each new email, and the to-do list
+            failures.append(f"a cycle with {args.new} new emails made {new[0]} Llama3 calls")
+        ranked = DecayingRanking(store=ToneRank_IO.active.store)
+        if any(message['threadId'] not in ranked.entries for message in new_mail):
+            failures.append("some of the new mail was not ranked")
+        if not os.path.exists(REPORT_FILE_NAME) or os.path.exists(REPORT_FILE_NAME + ".tmp"):
+            failures.append(f"{REPORT_FILE_NAME} was not written")
+        thread_id = next(iter(ranked.entries))
+        before = ranked.entries[thread_id][0]
+        reply = next(make_reply(message, args.seed) for message in service.store.values() if message['threadId'] == thread_id)
+        service.deliver([reply])
+        run(groq, lambda: daemon(1))
+        after = DecayingRanking(store=ToneRank_IO.active.store).entries[thread_id][0]
+        if after.msg_id != reply['id'] or after.message_count != before.message_count + 1:
+            failures.append(f"a reply to a thread of {before.message_count} messages left an entry for "
+                            f"{after.message_count} messages")
+        rerun = run(groq, lambda: toneRank_main(RunOptions(use_cache=False)))
+        ToneRank_IO.active.save_local_data()
+
+    print(f"{'run':>26}  {'Llama3 calls':>12}  {'CPU (ms)':>10}  {'wall (ms)':>10}")
+    for name, (calls, cpu, wall), per in [("first cycle", first, 1), (f"idle cycle (mean of {args.idle_cycles})", idle, args.idle_cycles),
+                                          (f"cycle with {args.new} new emails", new, 1), ("one-shot run", rerun, 1)]:
+        print(f"{name:>26}  {calls / per:>12.1f}  {cpu / per * 1000:>10.2f}  {wall / per * 1000:>10.2f}")
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    print("✅ Idle cycles made no Llama3 calls, and only new mail was scored." if not failures else "❌ Check failed.")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,142 @@
+# Checks the domain classifier against a simple reference, and measures its memory and lookup time
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_domains.py [--list-sizes N ...] [--lookups N]
+# Exits with status 1 if any classification differs from the reference.
+
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+from email.utils import parseaddr
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+from domainClassifier import DomainClassifier, DOMAIN_LIST_DIR, KINDS, sender_address
+
+LIST_SIZES = [1000, 10000, 50000] # the number of extra (synthetic) disposable domains loaded
+TLDS = ["com", "net", "org", "io", "co.uk", "com.au", "de", "fr", "edu", "info"]
+
+
+def random_label(rnd):
+    return "".join(rnd.choice(string.ascii_lowercase + string.digits) for _ in range(rnd.randint(4, 12)))
+
+def make_list(size, rnd):
+    """ Returns size random provider domains, about 2% of them wildcard (*.domain) entries. """
+    return [("*." if rnd.random() < 0.02 else "") + f"{random_label(rnd)}.{rnd.choice(TLDS)}" for _ in range(size)]
+
+# From headers the simple forms do not cover, which must go through the full parser
+UNUSUAL_SENDERS = ["\"Doe, John\" <John.Doe@Example.com>", "john@example.com (John Doe)", "<john@example.com>",
+                   "\"a\\\"b\" <ab@example.com>", "undisclosed-recipients:;", "Team: a@example.com, b@example.com;",
+                   "\"john@example.com\" <real@example.org>", "John Q. Public <jqp@mail.example.co.uk>", "",
+                   "=?utf-8?q?J=C3=B6rg?= <jorg@example.de>", "\"user\"@example.com", "a@[127.0.0.1]", "x@y@z.com"]
+
+def make_senders(listed, count, rnd):
+    """ Returns count From headers from a pool of count / 20 senders (inboxes repeat their senders): a third
+     at listed domains (some at a subdomain), the rest at other domains. """
+    pool = []
+    for _ in range(max(1, count // 20)):
+        if rnd.random() < 0.33:
+            domain = rnd.choice(listed).lstrip("*.")
+            if rnd.random() < 0.2:
+                domain = f"mail.{domain}"
+        else:
+            domain = f"{random_label(rnd)}.{rnd.choice(TLDS)}"
+        name = random_label(rnd).capitalize()
+        pool.append(f"\"{name}\" <{name.lower()}@{domain}>" if rnd.random() < 0.7 else f"{name.lower()}@{domain}")
+    return [rnd.choice(pool) for _ in range(count)]
+
+class ReferenceClassifier:
+
+    """ The obvious implementation: a dict of entries, checked for every suffix of the domain. """
+
+    def __init__(self, list_dir):
+        self.entries = {} # domain or *.domain -> kind
+        for kind in KINDS:
+            for file_name in sorted(os.listdir(list_dir)):
+                if file_name.startswith(kind) and file_name.endswith(".txt"):
+                    with open(os.path.join(list_dir, file_name), 'r', encoding='utf-8') as file:
+                        for line in file:
+                            line = line.split("#", 1)[0].strip().lower()
+                            if line:
+                                self.entries[line] = kind
+
+    def classify(self, domain):
+        labels = domain.split(".")
+        for i in range(len(labels)): # most specific first
+            suffix = ".".join(labels[i:])
+            if suffix in self.entries:
+                return self.entries[suffix]
+            if i + 1 < len(labels) and "*." + ".".join(labels[i + 1:]) in self.entries:
+                return self.entries["*." + ".".join(labels[i + 1:])]
+        return None
+
+def measure(factory):
+    """ Returns (object, seconds to build, bytes allocated) for factory(). """
+    tracemalloc.start()
+    start = time.perf_counter()
+    built = factory()
+    seconds = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, seconds, allocated
+
+def per_call(func, items):
+    """ Returns the mean time (in microseconds) of func per item. """
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Checks and benchmarks the sender domain classifier.")
+    parser.add_argument("--list-sizes", type=int, nargs="+", default=LIST_SIZES, help="the synthetic list sizes")
+    parser.add_argument("--lookups", type=int, default=100000, help="the number of senders classified per list size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    mismatches = 0
+    for sender in UNUSUAL_SENDERS + make_senders(make_list(100, rnd), 2000, rnd):
+        expected = parseaddr(sender)[1].lower()
+        if sender_address(sender)[0] != expected:
+            print(f"❌ {sender!r}: {sender_address(sender)[0]!r} != {expected!r}", file=sys.stderr)
+            mismatches = mismatches + 1
+
+    print(f"{'domains':>8}  {'load (s)':>8}  {'memory (MB)':>11}  {'reference (MB)':>14}  {'classify (us)':>13}  "
+          f"{'parse + classify (us)':>21}  {'cached (us)':>11}")
+    for size in args.list_sizes:
+        with tempfile.TemporaryDirectory() as list_dir:
+            # The bundled lists plus a large synthetic one, like a published disposable domain list
+            for file_name in os.listdir(DOMAIN_LIST_DIR):
+                with open(os.path.join(DOMAIN_LIST_DIR, file_name), 'r', encoding='utf-8') as source, \
+                        open(os.path.join(list_dir, file_name), 'w', encoding='utf-8') as copy:
+                    copy.write(source.read())
+            listed = make_list(size, rnd)
+            with open(os.path.join(list_dir, "disposable_synthetic.txt"), 'w', encoding='utf-8') as file:
+                file.write("\n".join(listed) + "\n")
+
+            classifier, load_seconds, memory = measure(lambda: DomainClassifier(list_dir))
+            reference, _, reference_memory = measure(lambda: ReferenceClassifier(list_dir))
+
+        senders = make_senders(listed, args.lookups, rnd)
+        domains = [sender_address(sender)[1] for sender in senders]
+        for domain in domains:
+            if classifier.classify(domain) != reference.classify(domain):
+                print(f"❌ {domain}: {classifier.classify(domain)} != {reference.classify(domain)}", file=sys.stderr)
+                mismatches = mismatches + 1
+
+        classify_us = per_call(classifier.classify, domains)
+        cold_us = per_call(lambda sender: classifier.classify(sender_address.__wrapped__(sender)[1]), senders) # uncached
+        sender_address.cache_clear()
+        warm_us = per_call(lambda sender: classifier.classify(sender_address(sender)[1]), senders)
+        print(f"{classifier.trie.size:>8}  {load_seconds:>8.3f}  {memory / 1e6:>11.2f}  {reference_memory / 1e6:>14.2f}  "
+              f"{classify_us:>13.3f}  {cold_us:>21.3f}  {warm_us:>11.3f}")
+
+    print("✅ Every classification matched the reference." if mismatches == 0 else f"❌ {mismatches} classifications differed.")
+    sys.exit(1 if mismatches else 0)
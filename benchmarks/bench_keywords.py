@@ -0,0 +1,79 @@
+# Micro-benchmark for the keyword modifier: one regex per keyword vs. the KeywordIndex
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_keywords.py [--emails N] [--body-words N]
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from keywordIndex import KeywordIndex
+
+KEYWORD_COUNTS = [10, 100, 1000] # the keyword list sizes to benchmark
+
+def per_keyword_modifier(keywords, subject, body):
+    """ The original get_keyword_modifier: a separate regex search for every keyword. """
+    uscore_modifier = 0.0
+    for word in keywords.keys():
+        pattern = r'\b' + re.escape(word) + r'\b'
+        if re.findall(pattern, subject) or word in re.findall(pattern, body):
+            uscore_modifier = uscore_modifier + keywords[word]
+    return uscore_modifier
+
+def make_keywords(count, rnd):
+    """ Returns count random keywords (some of them overlapping, some with punctuation) with random weights. """
+    keywords = {}
+    while len(keywords) < count:
+        word = "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(2, 9)))
+        if rnd.random() < 0.1:
+            word = word + rnd.choice(["!", "-" + word[:2], ":", "++"])
+        keywords[word] = float(rnd.randint(1, 5))
+    return keywords
+
+def make_texts(keywords, count, body_words, rnd):
+    """ Returns count (subject, body) pairs which contain some of the keywords among random words. """
+    pool = list(keywords)
+    texts = []
+    for _ in range(count):
+        words = ["".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(1, 8))) for _ in range(body_words)]
+        for _ in range(rnd.randint(0, 5)):
+            words[rnd.randrange(len(words))] = rnd.choice(pool)
+        texts.append((" ".join(words[:8]), " ".join(words)))
+    return texts
+
+def time_it(func, texts):
+    """ Returns the mean time (in microseconds) taken by func per text. """
+    start = time.perf_counter()
+    for subject, body in texts:
+        func(subject, body)
+    return (time.perf_counter() - start) / len(texts) * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks the keyword modifier.")
+    parser.add_argument("--emails", type=int, default=200, help="the number of emails scored per keyword count")
+    parser.add_argument("--body-words", type=int, default=300, help="the number of words in each body")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    print(f"{'keywords':>8}  {'per keyword (us)':>16}  {'index build (us)':>16}  {'index (us)':>10}  {'speedup':>7}")
+    for count in KEYWORD_COUNTS:
+        keywords = make_keywords(count, rnd)
+        texts = make_texts(keywords, args.emails, args.body_words, rnd)
+
+        start = time.perf_counter()
+        index = KeywordIndex(keywords)
+        build_time = (time.perf_counter() - start) * 1e6
+
+        # Both versions must produce exactly the same modifier
+        for subject, body in texts:
+            assert index.modifier(subject, body) == per_keyword_modifier(keywords, subject, body)
+
+        old_time = time_it(lambda subject, body: per_keyword_modifier(keywords, subject, body), texts)
+        new_time = time_it(index.modifier, texts)
+        print(f"{count:>8}  {old_time:>16.1f}  {build_time:>16.1f}  {new_time:>10.1f}  {old_time / new_time:>6.1f}x")
@@ -0,0 +1,128 @@
+# Measures the peak RSS of holding an inbox of Emails, against the representation used before __slots__
+# and lazily decoded bodies
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_memory.py [--sizes N ...] [--output FILE]
+# Each measurement runs in a fresh interpreter, as peak RSS only ever grows. Needs the resource module
+# (Linux or macOS).
+
+import argparse
+import base64
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+from synthInbox import make_inbox
+
+SIZES = [1000, 10000, 100000]
+REPRESENTATIONS = ["legacy", "slots", "slots+spill"] # before this change, __slots__ with raw bodies, and with spilling
+ACCESS_PATTERNS = ["held", "read"] # bodies never read (only listed by subject), or every body read once
+POOL_SIZE = 2000 # the distinct messages generated (each is parsed again for every copy, so no body is shared)
+BODY_WORDS = (20, 800)
+UNICODE_SHARE = 0.3 # the share of bodies with typographic quotes, which make a str take 2 bytes per character
+EMOJI_SHARE = 0.05 # the share of bodies with an emoji, which make a str take 4 bytes per character
+
+
+class LegacyEmail:
+
+    """ The Email class before __slots__ and raw bodies: a __dict__ per email and a decoded str body. """
+
+    def __init__(self, subject, sender, date, body, msg_id=None, internal_date=0, headers=None, thread_id=None):
+        self.subject = subject
+        self.sender = sender
+        self.date = date
+        self.body = body
+        self.msg_id = msg_id
+        self.internal_date = internal_date
+        self.headers = headers if headers is not None else {}
+        self.thread_id = thread_id
+        self.message_count = 1
+        self.thread_context = ""
+        self.uscore = -1.0
+        self.tokens_saved = 0
+        self.estimated = False
+
+def legacy_parse_message(msg_data):
+    """ GmailPipe.parse_message before bodies were kept raw: every body decoded to a str up front. """
+    headers = msg_data['payload']['headers']
+    def get_header(name):
+        return next((h['value'] for h in headers if h['name'].lower() == name.lower()), None)
+    body = ""
+    for part in msg_data['payload'].get('parts', []):
+        if part.get('mimeType') == 'text/plain':
+            body = base64.urlsafe_b64decode(part['body']['data'].encode('UTF-8')).decode('UTF-8')
+            break
+    kept_headers = {h['name'].lower(): h['value'] for h in headers if h['name'].lower() in ("list-unsubscribe", "precedence")}
+    return LegacyEmail(get_header('Subject'), get_header('From'), get_header('Date'), body, msg_data.get('id'),
+                       int(msg_data.get('internalDate', 0)), kept_headers, msg_data.get('threadId'))
+
+def make_pool(seed):
+    """ Returns POOL_SIZE Gmail messages, some of whose bodies have non-ASCII characters. """
+    rnd = random.Random(seed)
+    pool = make_inbox(POOL_SIZE, seed=seed, body_words=BODY_WORDS)
+    for msg in pool:
+        part = msg['payload']['parts'][0]['body']
+        body = base64.urlsafe_b64decode(part['data']).decode('UTF-8')
+        roll = rnd.random()
+        if roll < EMOJI_SHARE:
+            body = body + " 🎉"
+        elif roll < EMOJI_SHARE + UNICODE_SHARE:
+            body = "“" + body + "” — sent from my phone"
+        part['data'] = base64.urlsafe_b64encode(body.encode('UTF-8')).decode('ascii')
+    return pool
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB on Linux
+
+def run_child(representation, size, access, seed):
+    """ Parses size messages into Emails and holds them all. Returns the growth in peak RSS (in MB). """
+    from gmailPipe import GmailPipe
+    from myEmail import Email
+    from bodyStore import BodyStore
+    pool = make_pool(seed)
+    parse = legacy_parse_message if representation == "legacy" else GmailPipe.parse_message
+    if representation == "slots+spill":
+        Email.body_store = BodyStore()
+    before = peak_rss_mb()
+    emails = [parse(pool[i % POOL_SIZE]) for i in range(size)]
+    if access == "read":
+        sum(len(e.body) for e in emails) # decode every body (spilled bodies are read back each time)
+    return peak_rss_mb() - before
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the peak RSS of holding an inbox of Emails.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="the numbers of messages held")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--child", nargs=3, metavar=("REPRESENTATION", "SIZE", "ACCESS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(run_child(args.child[0], int(args.child[1]), args.child[2], args.seed))
+        sys.exit()
+
+    results = []
+    print(f"{'messages':>8}  {'access':>6}  " + "  ".join(f"{name + ' (MB)':>16}" for name in REPRESENTATIONS) + "  change")
+    for size in args.sizes:
+        for access in ACCESS_PATTERNS:
+            row = {}
+            for representation in REPRESENTATIONS:
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), "--seed", str(args.seed), "--child",
+                                         representation, str(size), access], capture_output=True, text=True, check=True)
+                row[representation] = float(output.stdout.strip().splitlines()[-1])
+                results.append({"size": size, "access": access, "representation": representation, "peak_rss_mb": row[representation]})
+            change = "  ".join(f"{(row[name] - row['legacy']) / row['legacy']:+.0%}" if row['legacy'] > 0 else "n/a"
+                               for name in REPRESENTATIONS[1:])
+            print(f"{size:>8}  {access:>6}  " + "  ".join(f"{row[name]:>16.1f}" for name in REPRESENTATIONS) + f"  {change}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({"results": results}, file, indent=2)
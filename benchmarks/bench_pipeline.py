@@ -0,0 +1,186 @@
+# End-to-end and per-stage benchmarks of ToneRank, run against a synthetic inbox and local fake Gmail/Groq backends
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_pipeline.py [--sizes N ...] [--modes MODE ...] [--output FILE] [--compare OLD_FILE]
+# Results are written as JSON, so the results of two commits can be compared with --compare.
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+from toneRank import toneRank_main, categorise_email, get_keyword_modifier, rank_emails, make_future
+from runOptions import RunOptions
+from toneRank_io import ToneRank_IO
+from gmailPipe import GmailPipe, BATCH_SIZE
+from llm import GroqLlama
+from metrics import Metrics
+from synthInbox import make_inbox, make_whitelist, KEYWORDS
+from fakeGmail import FakeGmailService
+from fakeGroq import FakeGroq
+
+SIZES = [10, 100, 1000, 10000] # the inbox sizes to benchmark
+MODES = {"default": {}, "stream": {"stream": True}, "batch-prompts": {"batch_scoring": True}} # toneRank_main options
+RESULTS_VERSION = 2 # bumped if the format of the results changes
+
+
+def load_prompt_data():
+    with open(os.path.join(REPO_DIR, 'prompts.json'), 'r') as f:
+        return json.load(f)
+
+def set_up_user():
+    """ Gives ToneRank_IO the same user preferences for every run. """
+    ToneRank_IO.active.keywords = dict(KEYWORDS)
+    ToneRank_IO.active.email_whitelist = set(make_whitelist())
+    ToneRank_IO.active.whitelist_index = None # rebuilt for the new whitelist
+    ToneRank_IO.active.top_email_size = ToneRank_IO.DEFAULT_TOP_EMAIL_SIZE
+    ToneRank_IO.active.todo_list_sample_size = ToneRank_IO.DEFAULT_TODO_SAMPLE_SIZE
+
+@contextlib.contextmanager
+def temporary_workdir():
+    """ Runs the body in an empty working directory holding only prompts.json, so no cache, history or
+     state file from an earlier run (or from the user's own runs) is used. """
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="tonerank-bench-") as workdir:
+        shutil.copy(os.path.join(REPO_DIR, 'prompts.json'), workdir)
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(previous)
+
+def make_backends(size, args, prompt_data):
+    """ Points GmailPipe and GroqLlama at fresh fake backends serving an inbox of the specified size. """
+    service = FakeGmailService(make_inbox(size, seed=args.seed), args.gmail_latency, args.gmail_error_rate, args.seed)
+    groq = FakeGroq(prompt_data, args.groq_latency, args.groq_error_rate, args.groq_rate_limit_rate,
+                    args.groq_requests_per_minute, args.seed)
+    GmailPipe.service_override = service
+    GroqLlama.client_override = groq
+    GroqLlama.get_cached_llama_response.cache_clear() # no responses carried over from the last run
+    return service, groq
+
+def bench_end_to_end(size, mode, args, prompt_data):
+    """ Times a full toneRank_main run (fetch, preprocess, score, rank and report) on an inbox. """
+    service, groq = make_backends(size, args, prompt_data)
+    with temporary_workdir(), open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        toneRank_main(RunOptions(**MODES[mode]))
+        seconds = time.perf_counter() - start
+    return {"benchmark": "end_to_end", "mode": mode, "size": size, "seconds": seconds,
+            "emails_per_second": size / seconds, "llm_calls": groq.calls, "llm_rate_limited": groq.rate_limited,
+            "llm_errors": groq.errors, "gmail_round_trips": service.calls,
+            "stages": Metrics.active.to_dict()["stages"]} # the run's own per-stage breakdown
+
+def best_of(repeat, prepare, func):
+    """ Returns the shortest time taken by func(prepare()) over repeat runs (prepare is not timed). """
+    best = None
+    for _ in range(repeat):
+        data = prepare()
+        start = time.perf_counter()
+        func(data)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def bench_stages(size, args, prompt_data):
+    """ Times the fetch, categorise, keyword-score and sort stages on their own. """
+    service, _ = make_backends(size, args, prompt_data)
+    fetch = lambda _: GmailPipe.get_emails_last_24_hours(BATCH_SIZE, service)
+    emails = fetch(None)
+    rnd = random.Random(args.seed)
+
+    def scored_copies():
+        """ Fresh emails (ranking adds stars to subjects) with their base uscores already known. """
+        copies = GmailPipe.get_emails_last_24_hours(BATCH_SIZE, service)
+        return copies, {id(e): make_future(rnd.randint(0, 100) / 10.0) for e in copies}
+
+    stages = {
+        "fetch": (lambda: None, fetch),
+        "categorise": (lambda: emails, lambda data: [categorise_email(e) for e in data]),
+        "keyword_score": (lambda: emails, lambda data: [get_keyword_modifier(e) for e in data]),
+        "sort": (scored_copies, lambda data: rank_emails(data[0], None, prompt_data, base_uscores=data[1])),
+    }
+    results = []
+    for stage, (prepare, func) in stages.items():
+        seconds = best_of(args.repeat, prepare, func)
+        results.append({"benchmark": stage, "mode": "stage", "size": size, "seconds": seconds,
+                        "emails_per_second": size / seconds if seconds > 0 else None})
+    return results
+
+def git_commit():
+    """ Returns the commit the benchmarks were run on (with "+dirty" if there are local changes), or None. """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("+dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old, new):
+    """ Prints the time taken by each benchmark in two sets of results, and the speedup. """
+    old_times = {(r['benchmark'], r['mode'], r['size']): r['seconds'] for r in old['results']}
+    print(f"Comparing {old.get('commit')} (old) with {new.get('commit')} (new)", file=sys.stderr)
+    print(f"{'benchmark':>14}  {'mode':>13}  {'size':>6}  {'old (s)':>9}  {'new (s)':>9}  {'speedup':>7}", file=sys.stderr)
+    for r in new['results']:
+        old_seconds = old_times.get((r['benchmark'], r['mode'], r['size']))
+        speedup = f"{old_seconds / r['seconds']:>6.2f}x" if old_seconds and r['seconds'] else "    n/a"
+        old_text = f"{old_seconds:>9.4f}" if old_seconds is not None else f"{'-':>9}"
+        print(f"{r['benchmark']:>14}  {r['mode']:>13}  {r['size']:>6}  {old_text}  {r['seconds']:>9.4f}  {speedup}",
+              file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks ToneRank against a synthetic inbox and fake backends.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="the inbox sizes (default 10 100 1000 10000)")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=["default"], help="the end-to-end modes to run")
+    parser.add_argument("--skip-end-to-end", action="store_true", help="only run the per-stage benchmarks")
+    parser.add_argument("--skip-stages", action="store_true", help="only run the end-to-end benchmarks")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of runs of each stage (the best is kept)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed for the inbox and the fake backends")
+    parser.add_argument("--gmail-latency", type=float, default=0.0, help="the seconds each Gmail round trip takes")
+    parser.add_argument("--gmail-error-rate", type=float, default=0.0, help="the chance each message in a batch fails")
+    parser.add_argument("--groq-latency", type=float, default=0.005, help="the seconds each Groq request takes")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0, help="the chance each Groq request fails with a 500")
+    parser.add_argument("--groq-rate-limit-rate", type=float, default=0.0, help="the chance each Groq request gets a 429")
+    parser.add_argument("--groq-requests-per-minute", type=int, default=None, help="the Groq rate limit (default none)")
+    parser.add_argument("--output", help="write the JSON results to this file (default: standard output)")
+    parser.add_argument("--compare", metavar="OLD_FILE", help="compare the results with an earlier results file")
+    args = parser.parse_args()
+
+    prompt_data = load_prompt_data()
+    set_up_user()
+    results = []
+    for size in args.sizes:
+        if not args.skip_stages:
+            print(f"Stages, {size} messages...", file=sys.stderr)
+            results.extend(bench_stages(size, args, prompt_data))
+        if not args.skip_end_to_end:
+            for mode in args.modes:
+                print(f"End to end ({mode}), {size} messages...", file=sys.stderr)
+                results.append(bench_end_to_end(size, mode, args, prompt_data))
+
+    output = {"version": RESULTS_VERSION, "commit": git_commit(), "date": datetime.now(timezone.utc).isoformat(),
+              "python": platform.python_version(), "platform": platform.platform(), "config": vars(args),
+              "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(output, file, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            compare(json.load(file), output)
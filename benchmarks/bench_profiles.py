@@ -0,0 +1,81 @@
+# Measures running ToneRank for many mailboxes at once against running them one after another
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_profiles.py [--profiles N] [--size N] [--workers N ...]
+# Every profile gets its own synthetic inbox and fake Gmail/Groq backends (with latency, as the speedup
+# comes from overlapping the time each mailbox spends waiting). Exits with status 1 if a profile fails.
+
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+from toneRank import toneRank_main
+from runOptions import RunOptions
+from gmailPipe import GmailPipe
+from llm import GroqLlama
+from multiMailbox import run_profiles, find_profiles, TOKEN_FILE_NAME
+from synthInbox import make_inbox, make_whitelist, KEYWORDS
+from fakeGmail import FakeGmailService
+from fakeGroq import FakeGroq
+from toneRank_io import ToneRank_IO
+
+
+def prepare_fakes(size, gmail_latency, groq_latency, profile_dir):
+    """ Points this worker at fake backends serving the profile's own inbox (run inside the worker). """
+    seed = int(os.path.basename(profile_dir).rsplit("-", 1)[1])
+    with open(os.path.join(REPO_DIR, 'prompts.json'), 'r') as f:
+        prompt_data = json.load(f)
+    GmailPipe.service_override = FakeGmailService(make_inbox(size, seed=seed), gmail_latency, seed=seed)
+    GroqLlama.client_override = FakeGroq(prompt_data, groq_latency, seed=seed)
+
+def make_profiles(directory, count):
+    """ Creates count profiles, each with a placeholder token.json and the benchmark's preferences. """
+    for i in range(count):
+        profile_dir = os.path.join(directory, f"profile-{i}")
+        os.makedirs(profile_dir)
+        with open(os.path.join(profile_dir, TOKEN_FILE_NAME), 'w') as token_file:
+            token_file.write("{}")
+        profile = ToneRank_IO(os.path.join(profile_dir, "tonerank_state.sqlite3"))
+        profile.load_remote_data()
+        for entry in make_whitelist():
+            profile.add_email_to_whitelist(entry)
+        for keyword, weight in KEYWORDS.items():
+            profile.add_keyword(keyword, weight)
+        profile.save_local_data()
+    return find_profiles(directory)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks running ToneRank for many mailboxes at once.")
+    parser.add_argument("--profiles", type=int, default=8, help="the number of mailbox profiles")
+    parser.add_argument("--size", type=int, default=200, help="the number of messages in each inbox")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="the numbers of profiles run at once")
+    parser.add_argument("--gmail-latency", type=float, default=0.05, help="seconds per fake Gmail round trip")
+    parser.add_argument("--groq-latency", type=float, default=0.05, help="seconds per fake Groq request")
+    args = parser.parse_args()
+
+    prepare = functools.partial(prepare_fakes, args.size, args.gmail_latency, args.groq_latency)
+    failures = 0
+    print(f"{'workers':>7}  {'total (s)':>9}  {'slowest profile (s)':>19}  {'sum of profiles (s)':>19}  {'Llama3 requests':>15}")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory(prefix="tonerank-profiles-") as directory: # fresh state for every run
+            profile_dirs = make_profiles(directory, args.profiles)
+            start = time.perf_counter()
+            results = list(run_profiles(profile_dirs, toneRank_main, RunOptions(), workers,
+                                        os.path.join(directory, "llm_cache.sqlite3"), prepare=prepare))
+            total = time.perf_counter() - start
+        for result in results:
+            if result["error"] is not None:
+                print(f"❌ {result['profile']}: {result['error']}", file=sys.stderr)
+                failures = failures + 1
+        print(f"{workers:>7}  {total:>9.2f}  {max(r['seconds'] for r in results):>19.2f}  "
+              f"{sum(r['seconds'] for r in results):>19.2f}  {sum(r['llm_requests'] for r in results):>15}")
+    sys.exit(1 if failures else 0)
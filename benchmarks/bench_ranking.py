@@ -0,0 +1,62 @@
+# Times Ranking against sorting every tier (its order is checked by tests/test_ranking.py)
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_ranking.py [--sizes N ...] [--top K]
+
+import argparse
+import random
+import sys
+import time
+import os
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+from myEmail import Email
+from ranking import Ranking
+
+SIZES = [10, 100, 1000, 10000, 100000]
+
+
+def make_scored(size, rnd):
+    """ Returns size (email, category, has_keywords) triples with uscores on a coarse grid, so many tie. """
+    scored = []
+    for i in range(size):
+        e = Email(f"Subject {i}", f"sender{i}@example.com", "", "")
+        e.uscore = rnd.randint(0, 20) / 2.0 + (rnd.choice([0.0, 0.5, 1.5]) if rnd.random() < 0.3 else 0.0)
+        scored.append((e, rnd.choice([0, 1, 2]), rnd.random() < 0.3))
+    return scored
+
+def reference_order(scored):
+    """ Sorts the emails the way rank_emails used to: six tiers (category 0 with keywords, category 0,
+     category 1 with keywords, ...), each sorted with Email's comparisons. """
+    tiers = [[] for _ in range(6)]
+    for e, category, has_keywords in scored:
+        tiers[category * 2 + (0 if has_keywords else 1)].append(e)
+    return [e for tier in tiers for e in sorted(tier)]
+
+def best_time(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times the Ranking used for the priority report.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="the numbers of emails ranked")
+    parser.add_argument("--top", type=int, default=10, help="the number of top emails the report needs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    print(f"{'size':>7}  {'six sorts (s)':>13}  {'build + top (s)':>15}  {'iterate all (s)':>15}")
+    for size in args.sizes:
+        scored = make_scored(size, rnd)
+        sort_seconds = best_time(lambda: reference_order(scored))
+        top_seconds = best_time(lambda: Ranking(scored).top(args.top))
+        ranking = Ranking(scored)
+        iterate_seconds = best_time(lambda: list(ranking))
+        print(f"{size:>7}  {sort_seconds:>13.5f}  {top_seconds:>15.5f}  {iterate_seconds:>15.5f}")
@@ -0,0 +1,97 @@
+# Startup benchmark: how long importing ToneRank takes, and which modules that time goes to
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+#
+# Usage: python benchmarks/bench_startup.py [--repeat N] [--top N] [--output FILE] [--compare OLD_FILE]
+# Each run imports the modules in a fresh interpreter with python -X importtime, so nothing is already loaded.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+MODULES = ["toneRank", "toneRank_io"] # the entry point, and what the menu-only options need
+HEAVY_DEPENDENCIES = ["groq", "googleapiclient", "google_auth_oauthlib", "numpy", "dotenv"] # should only load when a run needs them
+RESULTS_VERSION = 1 # bumped if the format of the results changes
+
+
+def parse_importtime(stderr):
+    """ Parses the output of python -X importtime into a dictionary mapping each module to its
+     (self, cumulative) import time in seconds. """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return times
+
+def import_once(module):
+    """ Imports a module in a fresh interpreter. Returns (wall seconds, import times by module). """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, parse_importtime(process.stderr)
+
+def bench_module(module, repeat, top):
+    """ Imports a module repeat times, and returns the median times and the slowest imports of the median run. """
+    runs = sorted((import_once(module) for _ in range(repeat)), key=lambda run: run[1][module][1])
+    wall_seconds, times = runs[len(runs) // 2]
+    slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:top]
+    return {"benchmark": "import", "mode": module, "size": 1,
+            "seconds": statistics.median(run[1][module][1] for run in runs),
+            "process_seconds": statistics.median(run[0] for run in runs),
+            "modules_imported": len(times),
+            "heavy_dependencies_loaded": [name for name in HEAVY_DEPENDENCIES if name in times],
+            "slowest": [{"module": name, "cumulative_seconds": cumulative, "self_seconds": self_seconds}
+                        for name, (self_seconds, cumulative) in slowest]}
+
+def git_commit():
+    """ Returns the commit the benchmark was run on (with "+dirty" if there are local changes), or None. """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("+dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures how long importing ToneRank takes.")
+    parser.add_argument("--modules", nargs="+", default=MODULES, help="the modules to import (default toneRank toneRank_io)")
+    parser.add_argument("--repeat", type=int, default=5, help="the number of imports of each module (the median is kept)")
+    parser.add_argument("--top", type=int, default=10, help="the number of slowest imports listed")
+    parser.add_argument("--output", help="write the JSON results to this file (default: standard output)")
+    parser.add_argument("--compare", metavar="OLD_FILE", help="compare the results with an earlier results file")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules:
+        print(f"Importing {module}...", file=sys.stderr)
+        results.append(bench_module(module, args.repeat, args.top))
+        print(f"  {results[-1]['seconds'] * 1000:.1f}ms to import, {results[-1]['process_seconds'] * 1000:.1f}ms for the "
+              f"process; heavy dependencies loaded: {', '.join(results[-1]['heavy_dependencies_loaded']) or 'none'}",
+              file=sys.stderr)
+
+    output = {"version": RESULTS_VERSION, "commit": git_commit(), "date": datetime.now(timezone.utc).isoformat(),
+              "python": platform.python_version(), "platform": platform.platform(), "config": vars(args),
+              "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(output, file, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+    if args.compare:
+        sys.path.insert(0, BENCHMARK_DIR)
+        from bench_pipeline import compare # the same table as the pipeline benchmarks
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            compare(json.load(file), output)
@@ -0,0 +1,202 @@
+# A local stand-in for the Gmail API service, which GmailPipe can be pointed at
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import base64
+import html
+import random
+import threading
+import time
+import types
+from googleapiclient.errors import HttpError
+
+MAX_BATCH_SIZE = 100 # the Gmail API rejects larger batches
+
+
+class _Request:
+
+    """ A request which runs when execute() is called, like googleapiclient's HttpRequest. """
+
+    def __init__(self, service, func):
+        self.service = service
+        self.func = func
+
+    def execute(self):
+        self.service._wait()
+        return self.func()
+
+
+class _BatchRequest:
+
+    """ A batch of requests sent in one round trip. Each message in the batch may fail on its own (with a
+     429, as the real API does when a batch is too big for the quota), and the callback is told either way. """
+
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        if len(self.requests) >= MAX_BATCH_SIZE:
+            raise ValueError(f"A batch may hold at most {MAX_BATCH_SIZE} requests")
+        self.requests.append((request, request_id))
+
+    def execute(self):
+        self.service._wait()
+        with self.service.lock:
+            self.service.batch_calls = self.service.batch_calls + 1
+        for request, request_id in self.requests:
+            if self.service._roll_error():
+                self.callback(request_id, None, FakeGmailService.make_error(429, "Too many concurrent requests for user"))
+            else:
+                self.callback(request_id, request.func(), None)
+
+
+class FakeGmailService:
+
+    """ Serves a list of message resources (e.g. from synthInbox.make_inbox) through the parts of the Gmail
+     API GmailPipe uses: messages().list (with paging and an after: query), messages().get (in the full
+     or metadata format), messages().attachments().get, batch requests, getProfile and history().list.
+     A part whose body has both data and an attachmentId is served the way Gmail serves attachments and
+     large parts: without its data, which must be fetched by id. Every round trip takes latency seconds,
+     and each message fetched in a batch fails with a 429 with probability error_rate. """
+
+    def __init__(self, messages, latency=0.0, error_rate=0.0, seed=0):
+        self.store = {message['id']: message for message in messages}
+        self.order = [message['id'] for message in messages] # newest first, as Gmail lists them
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.history_id = 1000
+        self.delivered = [] # (historyId, message id) for each message delivered after the start
+        self.calls = 0 # round trips, including batches
+        self.batch_calls = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_error(status, reason):
+        """ Returns an HttpError like the ones googleapiclient raises. """
+        return HttpError(types.SimpleNamespace(status=status, reason=reason), reason.encode('UTF-8'))
+
+    def _wait(self):
+        with self.lock:
+            self.calls = self.calls + 1
+        if self.latency > 0.0:
+            time.sleep(self.latency)
+
+    def _roll_error(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    # The resource hierarchy: service.users().messages().list(...), and so on
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def attachments(self):
+        return types.SimpleNamespace(get=self._attachment_get)
+
+    def history(self):
+        return types.SimpleNamespace(list=self._history_list)
+
+    def new_batch_http_request(self, callback=None):
+        return _BatchRequest(self, callback)
+
+    def getProfile(self, userId):
+        return _Request(self, lambda: {"emailAddress": "me@example.com", "historyId": str(self.history_id)})
+
+    def list(self, userId, q=None, maxResults=100, pageToken=None, **kwargs):
+        """ Lists message ids newest first, one page at a time. Only the after:<seconds> query is understood. """
+        def run():
+            ids = self.order
+            if q and q.startswith("after:"):
+                after = int(q.split(":", 1)[1]) * 1000
+                ids = [msg_id for msg_id in ids if int(self.store[msg_id]['internalDate']) > after]
+            start = int(pageToken or 0)
+            end = start + min(maxResults, 500)
+            page = {"messages": [{"id": msg_id, "threadId": self.store[msg_id]['threadId']} for msg_id in ids[start:end]],
+                    "resultSizeEstimate": len(ids)}
+            if end < len(ids):
+                page["nextPageToken"] = str(end)
+            return page
+        return _Request(self, run)
+
+    def get(self, userId, id, format="full", metadataHeaders=None, **kwargs):
+        def run():
+            if id not in self.store:
+                raise FakeGmailService.make_error(404, "Not Found")
+            message = self.store[id]
+            if format == "metadata":
+                return FakeGmailService._metadata(message, metadataHeaders)
+            return FakeGmailService._without_attachment_data(message)
+        return _Request(self, run)
+
+    @staticmethod
+    def _parts(part):
+        """ Yields a part and every part nested in it. """
+        yield part
+        for child in part.get('parts', []):
+            yield from FakeGmailService._parts(child)
+
+    @staticmethod
+    def _without_attachment_data(message):
+        """ Returns the message with the data of parts stored by attachmentId left out (copying only what changes). """
+        def strip(part):
+            body = part.get('body', {})
+            if 'attachmentId' in body and 'data' in body:
+                part = dict(part, body={key: value for key, value in body.items() if key != 'data'})
+            if 'parts' in part:
+                part = dict(part, parts=[strip(child) for child in part['parts']])
+            return part
+        if not any('attachmentId' in part.get('body', {}) for part in FakeGmailService._parts(message['payload'])):
+            return message
+        return dict(message, payload=strip(message['payload']))
+
+    @staticmethod
+    def _metadata(message, header_names):
+        """ Returns the message as the metadata format does: the named headers, the snippet and the size, but
+         no parts or bodies. """
+        names = {name.lower() for name in header_names or []}
+        payload = message['payload']
+        headers = [h for h in payload.get('headers', []) if not names or h['name'].lower() in names]
+        size = 0
+        snippet = message.get('snippet')
+        for part in FakeGmailService._parts(payload):
+            data = part.get('body', {}).get('data', "")
+            size = size + len(data) * 3 // 4
+            if snippet is None and data and part.get('mimeType') == "text/plain":
+                snippet = html.escape(" ".join(base64.urlsafe_b64decode(data).decode('UTF-8', 'replace').split())[:200])
+        return {key: value for key, value in message.items() if key != 'payload'} | {
+            "payload": {"mimeType": payload.get('mimeType'), "headers": headers},
+            "snippet": snippet or "", "sizeEstimate": size}
+
+    def _attachment_get(self, userId, messageId, id, **kwargs):
+        def run():
+            for part in FakeGmailService._parts(self.store.get(messageId, {}).get('payload', {})):
+                body = part.get('body', {})
+                if body.get('attachmentId') == id:
+                    return {"size": body.get('size', len(body.get('data', "")) * 3 // 4), "data": body.get('data', "")}
+            raise FakeGmailService.make_error(404, "Not Found")
+        return _Request(self, run)
+
+    def deliver(self, messages):
+        """ Adds new messages to the inbox (newest first, like the list), recording each in the history. """
+        with self.lock:
+            for message in messages:
+                self.store[message['id']] = message
+                self.history_id = self.history_id + 1
+                self.delivered.append((self.history_id, message['id']))
+            self.order = [message['id'] for message in reversed(messages)] + self.order
+
+    def _history_list(self, userId, startHistoryId, historyTypes=None, pageToken=None, **kwargs):
+        """ Lists the messages delivered after startHistoryId, in one page. """
+        def run():
+            start = int(startHistoryId)
+            records = [{"id": str(history_id), "messagesAdded": [{"message": {
+                           "id": msg_id, "threadId": self.store[msg_id]['threadId'],
+                           "labelIds": self.store[msg_id].get('labelIds', [])}}]}
+                       for history_id, msg_id in self.delivered if history_id > start]
+            return {"history": records, "historyId": str(self.history_id)} if records else {"historyId": str(self.history_id)}
+        return _Request(self, run)
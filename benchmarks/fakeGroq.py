@@ -0,0 +1,114 @@
+# A local stand-in for the Groq client, which GroqLlama can be pointed at
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import collections
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import types
+import httpx
+from groq import RateLimitError, InternalServerError
+
+API_URL = "https://api.groq.com/openai/v1/chat/completions"
+RATE_LIMIT_WINDOW = 60.0 # the window (in seconds) requests_per_minute is enforced over
+RETRY_AFTER = 0.05 # the retry-after (in seconds) sent with a 429
+
+
+def fake_uscore(text):
+    """ Returns a stable pseudo-random uscore (0 to 10, one decimal place) for a piece of text. """
+    return int(hashlib.sha256(text.encode('UTF-8')).hexdigest()[:8], 16) % 101 / 10.0
+
+
+class _RawResponse:
+
+    """ The result of with_raw_response.create(): the headers, and parse() for the completion. """
+
+    def __init__(self, content, headers, prompt):
+        self.headers = headers
+        self.content = content
+        self.prompt = prompt
+
+    def parse(self):
+        message = types.SimpleNamespace(role="assistant", content=self.content)
+        usage = types.SimpleNamespace(prompt_tokens=len(self.prompt) // 4, completion_tokens=len(self.content) // 4,
+                                      total_tokens=(len(self.prompt) + len(self.content)) // 4)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(index=0, message=message, finish_reason="stop")],
+                                     usage=usage, model="fake")
+
+
+class FakeGroq:
+
+    """ Answers chat completion requests locally, with the shape of the groq client's responses: a
+     deterministic urgency score for a scoring prompt, a JSON array for a batch prompt, and a numbered
+     list for the to-do list prompt. Each request takes latency seconds, fails with a 500 with
+     probability error_rate, and is refused with a 429 (with retry-after and x-ratelimit-* headers) with
+     probability rate_limit_rate, or whenever more than requests_per_minute requests arrive in a minute. """
+
+    def __init__(self, prompt_data, latency=0.0, error_rate=0.0, rate_limit_rate=0.0, requests_per_minute=None, seed=0):
+        """ Creates a new FakeGroq which recognises the prompts in prompt_data (the contents of prompts.json). """
+        self.todo_prompt = prompt_data['prompts']['todo_prompt']['prompt']
+        self.batch_prompts = [prompt_data['prompts'][prompt_id]['prompt'].split("{email_list}")[0]
+                              for prompt_id in ('uscore_batch_prompt_one', 'uscore_batch_prompt_two')]
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests_per_minute = requests_per_minute
+        self.random = random.Random(seed)
+        self.sent = collections.deque() # the times of recent requests, for the rate limit
+        self.calls = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        completions = types.SimpleNamespace(create=self.create, with_raw_response=types.SimpleNamespace(create=self.raw_create))
+        self.chat = types.SimpleNamespace(completions=completions)
+
+    def _headers(self, remaining):
+        limit = self.requests_per_minute or 1000000
+        return {"x-ratelimit-limit-requests": str(limit), "x-ratelimit-remaining-requests": str(max(0, remaining)),
+                "x-ratelimit-reset-requests": f"{RATE_LIMIT_WINDOW}s", "x-ratelimit-remaining-tokens": "1000000",
+                "x-ratelimit-reset-tokens": "1s"}
+
+    def _error(self, error_class, status, message, headers):
+        return error_class(message, response=httpx.Response(status, headers=headers, request=httpx.Request("POST", API_URL)),
+                           body=None)
+
+    def _answer(self, prompt):
+        """ Returns the response text for a prompt. """
+        if prompt.startswith(self.todo_prompt):
+            return "1. Reply to the most urgent emails\n2. Review the attached documents"
+        for batch_prompt in self.batch_prompts:
+            if prompt.startswith(batch_prompt):
+                entries = re.split(r"^### Email \d+\n", prompt[len(batch_prompt):], flags=re.MULTILINE)[1:]
+                return json.dumps([fake_uscore(entry.strip()) for entry in entries])
+        return str(fake_uscore(prompt.split("Email subject: ", 1)[-1].strip()))
+
+    def raw_create(self, messages, model=None, max_tokens=None, temperature=None, **kwargs):
+        prompt = messages[0]['content']
+        with self.lock:
+            self.calls = self.calls + 1
+            now = time.monotonic()
+            while self.sent and self.sent[0] < now - RATE_LIMIT_WINDOW:
+                self.sent.popleft()
+            over_limit = self.requests_per_minute is not None and len(self.sent) >= self.requests_per_minute
+            roll = self.random.random()
+            if over_limit or roll < self.rate_limit_rate:
+                self.rate_limited = self.rate_limited + 1
+                headers = dict(self._headers(0), **{"retry-after": str(RETRY_AFTER)})
+                raise self._error(RateLimitError, 429, "Rate limit reached", headers)
+            self.sent.append(now)
+            remaining = (self.requests_per_minute or 1000000) - len(self.sent)
+            failed = roll < self.rate_limit_rate + self.error_rate
+            if failed:
+                self.errors = self.errors + 1
+        if self.latency > 0.0:
+            time.sleep(self.latency)
+        if failed:
+            raise self._error(InternalServerError, 500, "Internal server error", {})
+        return _RawResponse(self._answer(prompt), self._headers(remaining), prompt)
+
+    def create(self, **kwargs):
+        return self.raw_create(**kwargs).parse()
@@ -0,0 +1,94 @@
+# Generates reproducible synthetic inboxes, in the format the Gmail API returns messages
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import base64
+import random
+import time
+from email.utils import format_datetime
+from datetime import datetime, timezone
+
+# Constants
+DEFAULT_CATEGORY_MIX = (0.1, 0.6, 0.3) # the share of messages from whitelisted, organisation and personal senders
+DEFAULT_BODY_WORDS = (20, 400) # the min and max number of words in a body
+DEFAULT_MEAN_THREAD_LENGTH = 1.5 # the mean number of messages per thread
+DEFAULT_BULK_RATIO = 0.3 # the share of organisation mail which is bulk mail (newsletters, notifications)
+DEFAULT_TEMPLATED_RATIO = 0.2 # the share of organisation mail sent from a template (only a number changes)
+WINDOW_SECONDS = 23 * 60 * 60 # messages are spread over the last 23 hours
+
+WORDS = ("the meeting report project budget review schedule lunch call update team client please thanks "
+         "tomorrow today week invoice payment contract draft proposal question follow up attached document "
+         "deadline urgent asap soon important issue problem fix deploy release customer order account "
+         "family weekend dinner party birthday kids school trip photos game coffee").split()
+KEYWORDS = {"urgent": 2.0, "asap": 1.5, "deadline": 1.0, "invoice": 0.5, "contract": 0.5} # user-defined keywords
+PUBLIC_DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "hotmail.com", "icloud.com"]
+NAMES = ["alex", "sam", "jordan", "taylor", "morgan", "casey", "riley", "jamie", "avery", "quinn"]
+ORGANISATIONS = ["acme", "globex", "initech", "umbrella", "hooli", "stark", "wayne", "wonka"]
+TEMPLATES = ["Your order #{n} has shipped and will arrive in {m} days. Track it in your account.",
+             "Build {n} of the main pipeline failed at step {m}. Open the logs to see the failing test.",
+             "Alert: disk usage on server {n} is at {m} percent. Please free some space soon."]
+
+
+def _encode(text):
+    return base64.urlsafe_b64encode(text.encode('UTF-8')).decode('ascii')
+
+def _body(rnd, body_words):
+    """ Returns a random body of between body_words[0] and body_words[1] words. """
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(*body_words)))
+
+def make_whitelist(count=3):
+    """ Returns the whitelisted (Category 0) addresses used by make_inbox. """
+    return [f"{NAMES[i]}@boss.example.org" for i in range(count)]
+
+def make_inbox(size, seed=0, category_mix=DEFAULT_CATEGORY_MIX, body_words=DEFAULT_BODY_WORDS,
+               mean_thread_length=DEFAULT_MEAN_THREAD_LENGTH, bulk_ratio=DEFAULT_BULK_RATIO,
+               templated_ratio=DEFAULT_TEMPLATED_RATIO, now=None):
+    """ Returns a list of size full Gmail message resources (as returned by messages().get), newest first.
+     Senders are drawn from the whitelist, organisation domains and public domains according to
+     category_mix; messages are grouped into threads with a geometric number of messages each (mean
+     mean_thread_length); some organisation mail is bulk mail (with List-Unsubscribe headers) or sent
+     from a template. The same arguments always give the same inbox. """
+    rnd = random.Random(seed)
+    now_ms = int((now if now is not None else time.time()) * 1000)
+    whitelist = make_whitelist()
+    continue_thread = 1.0 - 1.0 / max(1.0, mean_thread_length) # the chance the next message joins the same thread
+
+    messages = []
+    thread = None
+    for i in range(size):
+        if thread is None or rnd.random() >= continue_thread: # Start a new thread
+            category = rnd.choices([0, 1, 2], weights=category_mix)[0]
+            if category == 0:
+                sender = rnd.choice(whitelist)
+            elif category == 1:
+                sender = f"{rnd.choice(['news', 'alerts', 'billing', 'support', 'noreply'])}@{rnd.choice(ORGANISATIONS)}.com"
+            else:
+                sender = f"{rnd.choice(NAMES)}{rnd.randint(1, 99)}@{rnd.choice(PUBLIC_DOMAINS)}"
+            kind = "personal"
+            if category == 1:
+                roll = rnd.random()
+                kind = "bulk" if roll < bulk_ratio else "templated" if roll < bulk_ratio + templated_ratio else "personal"
+            thread = {"id": f"thread{i:06d}", "sender": sender, "kind": kind,
+                      "subject": " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 6))).capitalize(),
+                      "template": rnd.choice(TEMPLATES), "length": 0}
+        thread["length"] = thread["length"] + 1
+
+        if thread["kind"] == "templated":
+            body = thread["template"].format(n=rnd.randint(100, 99999), m=rnd.randint(1, 99))
+        else:
+            body = _body(rnd, body_words)
+        subject = thread["subject"] if thread["length"] == 1 else "Re: " + thread["subject"]
+        internal_date = now_ms - int(WINDOW_SECONDS * 1000 * i / max(1, size)) - rnd.randint(0, 999)
+        headers = [{"name": "Subject", "value": subject}, {"name": "From", "value": thread["sender"]},
+                   {"name": "Date", "value": format_datetime(datetime.fromtimestamp(internal_date / 1000, timezone.utc))}]
+        if thread["kind"] == "bulk":
+            body = body + "\n\nYou are receiving this newsletter because you signed up. Unsubscribe here."
+            headers.append({"name": "List-Unsubscribe", "value": f"<mailto:unsubscribe@{thread['sender'].split('@')[1]}>"})
+            headers.append({"name": "Precedence", "value": "bulk"})
+
+        messages.append({"id": f"msg{i:06d}", "threadId": thread["id"], "internalDate": str(internal_date),
+                         "labelIds": ["INBOX"], "snippet": body[:100],
+                         "payload": {"mimeType": "multipart/alternative", "headers": headers,
+                                     "parts": [{"mimeType": "text/plain", "body": {"data": _encode(body)}},
+                                               {"mimeType": "text/html", "body": {"data": _encode(f"<p>{body}</p>")}}]}})
+    return messages
@@ -0,0 +1,86 @@
+# Memory-mapped spill-to-disk store for large email bodies
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import mmap
+import tempfile
+import threading
+
+# Constants
+SPILL_THRESHOLD = 2048 # bodies larger than this (in bytes) are spilled to disk when a store is in use
+INITIAL_CAPACITY = 1 << 20 # the size the spill file starts at (doubled whenever it fills up)
+
+
+class SpilledBody:
+
+    """ A handle to a body kept in a BodyStore. """
+
+    __slots__ = ("store", "offset", "length")
+
+    def __init__(self, store, offset, length):
+        self.store = store
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        """ Returns the raw bytes of the body. """
+        return self.store.read(self.offset, self.length)
+
+
+class BodyStore:
+
+    """ Keeps raw email bodies in an anonymous temporary file, read back through a memory map, so large
+     bodies live in the page cache (which the OS can drop and reload) instead of on the Python heap. Bodies
+     are written with plain file writes, so only the ones read back are ever mapped into the process. They
+     are appended and never moved; the file is deleted when the store is closed or the process exits. Safe
+     to share between threads. """
+
+    def __init__(self, threshold=SPILL_THRESHOLD):
+        """ Creates an empty store, for bodies larger than threshold bytes. """
+        self.threshold = threshold
+        self.file = tempfile.TemporaryFile(buffering=0) # unbuffered, so writes are visible through the map at once
+        self.capacity = 0
+        self.size = 0 # the bytes used
+        self.map = None
+        self.lock = threading.Lock()
+
+    def _grow(self, needed):
+        """ Resizes the file (doubling it) and remaps it, so it can hold at least needed bytes. """
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < needed:
+            capacity = capacity * 2
+        if self.map is not None:
+            self.map.close()
+        self.file.truncate(capacity)
+        self.map = mmap.mmap(self.file.fileno(), capacity, access=mmap.ACCESS_READ)
+        self.capacity = capacity
+
+    def put(self, data):
+        """ Stores raw bytes and returns a SpilledBody for them. """
+        with self.lock:
+            offset = self.size
+            if offset + len(data) > self.capacity:
+                self._grow(offset + len(data))
+            self.file.seek(offset)
+            self.file.write(data)
+            self.size = offset + len(data)
+        return SpilledBody(self, offset, len(data))
+
+    def read(self, offset, length):
+        """ Returns a copy of the bytes stored at offset. """
+        with self.lock:
+            return self.map[offset:offset + length]
+
+    def close(self):
+        """ Closes the store and deletes its file. Bodies still in it can no longer be read. """
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
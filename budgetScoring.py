@@ -0,0 +1,156 @@
+# Budget-aware selective scoring: spend a limited number of Llama3 queries where they can change the top of the report
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import math
+import threading
+import time
+from domainClassifier import sender_address
+
+# Constants
+DEFAULT_PRIOR = 5.0 # the estimated base uscore of an email from a sender with no history
+PRIOR_SPREAD = 3.0 # how far (in uscore points) a sender with a single score may be from its mean
+MAX_SENDER_WEIGHT = 20 # the running mean weighs about this many of a sender's latest scores
+MAX_SENDERS = 5000 # the max number of senders kept in the history (the least recently seen are dropped)
+
+
+class BudgetExhausted(Exception):
+
+    """ Raised instead of sending a query once a ScoringBudget has none left. """
+
+
+class SenderHistory:
+
+    """ Keeps a running mean of the base uscore Llama3 gives each sender, as a cheap guess at how urgent
+     their next email will be. Safe to share between threads. """
+
+    def __init__(self, store=None):
+        """ Creates a new history. If a StateStore is given, the history is loaded from it, and save()
+         writes the senders seen in this run back to it; otherwise the history only lasts for this run. """
+        self.store = store
+        self.senders = store.senders() if store is not None else {} # address -> [mean uscore, weight, time last seen]
+        self.changed = set() # the senders recorded since the last save
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(sender):
+        """ Returns the lowercase address of a sender ("Name <address>" or a bare address). """
+        return sender_address(sender)[0]
+
+    def lookup(self, sender):
+        """ Returns (mean uscore, weight) for a sender, or None if they have no history. """
+        with self.lock:
+            entry = self.senders.get(SenderHistory.key(sender))
+        return None if entry is None else (entry[0], entry[1])
+
+    def record(self, sender, uscore):
+        """ Adds a base uscore Llama3 gave to an email from a sender. """
+        key = SenderHistory.key(sender)
+        with self.lock:
+            mean, weight, _ = self.senders.get(key, [0.0, 0, 0.0])
+            weight = min(weight + 1, MAX_SENDER_WEIGHT) # capped, so a sender's older scores fade
+            self.senders[key] = [mean + (uscore - mean) / weight, weight, time.time()]
+            self.changed.add(key)
+
+    def save(self):
+        """ Writes the senders recorded since the last save to the store, keeping the MAX_SENDERS most
+         recently seen. """
+        if self.store is None:
+            return
+        with self.lock:
+            changed = {key: self.senders[key] for key in self.changed}
+            self.changed = set()
+        self.store.save_senders(changed, MAX_SENDERS)
+
+
+class ScoringBudget:
+
+    """ Limits the Llama3 scoring queries of a run to max_calls, and/or to those started within deadline
+     seconds of the budget being created. Every query actually sent counts (including the retries of a
+     batch prompt whose response was malformed), while responses found in a cache do not. Emails are ordered by cheap local signals (their tier, which the
+     category and keywords already decide, then an optimistic guess at their uscore from the sender's
+     history and their keyword modifier), so the queries go to the emails most likely to make the top of
+     the report. Emails left without a query get the guess as their uscore and are marked as estimated. """
+
+    def __init__(self, max_calls=None, deadline=None, sender_history=None):
+        self.max_calls = max_calls
+        self.deadline_at = time.monotonic() + deadline if deadline is not None else None
+        self.sender_history = sender_history
+        self.calls = 0 # the number of queries sent
+        self.estimated = 0 # the number of emails ranked on an estimate
+        self.skipped_by_deadline = 0 # the queries not started because the deadline had passed
+        self.lock = threading.Lock()
+
+    def estimate(self, email):
+        """ Returns (estimated base uscore, uncertainty) for an email, from its sender's history. """
+        history = self.sender_history.lookup(email.sender) if self.sender_history is not None else None
+        if history is None:
+            return DEFAULT_PRIOR, PRIOR_SPREAD * 2.0 # nothing is known about the sender
+        mean, weight = history
+        return mean, PRIOR_SPREAD / math.sqrt(weight)
+
+    def order(self, candidates, keyword_modifier):
+        """ Returns the (email, category) pairs in the order they should be queried: by tier (as in the
+         report), then by the most their uscore could plausibly be. keyword_modifier(email) gives the
+         modifier added to the base uscore. """
+        def priority(pair):
+            email, category = pair
+            modifier = keyword_modifier(email)
+            guess, uncertainty = self.estimate(email)
+            return (category * 2 + (0 if modifier > 0.0 else 1), -(guess + uncertainty + modifier))
+        return sorted(candidates, key=priority)
+
+    def select(self, candidates, keyword_modifier, per_call=1):
+        """ Splits the (email, category) pairs into (to_query, to_estimate), both in priority order, where
+         each query scores up to per_call emails. """
+        ordered = self.order(candidates, keyword_modifier)
+        if self.max_calls is None:
+            return ordered, []
+        allowed = max(0, self.max_calls) * per_call
+        return ordered[:allowed], ordered[allowed:]
+
+    def expired(self):
+        """ Returns True if the deadline has passed. """
+        return self.deadline_at is not None and time.monotonic() >= self.deadline_at
+
+    def spend(self):
+        """ Claims one query, to be sent now. Raises BudgetExhausted if max_calls queries were already sent,
+         or the deadline has passed. """
+        with self.lock:
+            if self.deadline_at is not None and time.monotonic() >= self.deadline_at:
+                self.skipped_by_deadline = self.skipped_by_deadline + 1
+                raise BudgetExhausted("The scoring deadline has passed")
+            if self.max_calls is not None and self.calls >= self.max_calls:
+                raise BudgetExhausted(f"All {self.max_calls} scoring queries were sent")
+            self.calls = self.calls + 1
+
+    def guard(self, func):
+        """ Wraps func(job) so it returns None instead of a result once the budget stops it from sending a
+         query (it raised BudgetExhausted), or the deadline has passed before it started. """
+        def guarded(job):
+            if self.expired():
+                with self.lock:
+                    self.skipped_by_deadline = self.skipped_by_deadline + 1
+                return None
+            try:
+                return func(job)
+            except BudgetExhausted:
+                return None
+        return guarded
+
+    def mark_estimated(self, email):
+        """ Marks an email as ranked without a query, and returns its estimated base uscore. """
+        email.estimated = True
+        with self.lock:
+            self.estimated = self.estimated + 1
+        return self.estimate(email)[0]
+
+    def summary(self):
+        """ Returns a one-line summary of what the budget left unscored. """
+        limits = []
+        if self.max_calls is not None:
+            limits.append(f"at most {self.max_calls} queries")
+        if self.deadline_at is not None:
+            limits.append(f"a deadline ({self.skipped_by_deadline} queries not started in time)")
+        return (f"Budget ({', '.join(limits)}): {self.calls} queries sent, {self.estimated} emails ranked on an "
+                f"estimate, marked 'not scored'")
@@ -0,0 +1,185 @@
+# An append-only journal of a ranking run, so a run which stops partway through can be picked up again
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import json
+import os
+import threading
+import time
+from myEmail import Email
+
+# Constants
+CHECKPOINT_FILE_NAME = "run_checkpoint.jsonl" # the journal of the latest run (one JSON record per line)
+NOT_SCORED_MESSAGE = "Not scored before the run stopped (run ToneRank with --resume to score it)."
+
+
+class RunCheckpoint:
+
+    """ The journal of a ranking run: the emails it fetched, then the base uscore of each email as soon as it
+     is known (or the error which stopped it from being scored, or the estimate it was ranked on when a
+     ScoringBudget left it unqueried), then a marker once the report is printed.
+     Records are only ever appended, and each is on disk as soon as it is written, so a run killed by a
+     Groq outage, Ctrl-C or an expired token loses at most the queries in flight. Emails are keyed by their
+     Gmail message id. Safe to share between threads. """
+
+    def __init__(self, file_name=CHECKPOINT_FILE_NAME):
+        """ Creates a RunCheckpoint stored in file_name (nothing is read or written until asked). """
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.emails = [] # the emails of the journaled run, in the order they were fetched
+        self.scores = {} # msg_id -> base uscore
+        self.estimated = set() # the msg_ids whose uscore is an estimate (left unqueried by a ScoringBudget)
+        self.failures = {} # msg_id -> the error which stopped the email from being scored (until it is)
+        self.fetched = False # True once every email of the run was journaled
+        self.finished = False # True if the run printed its report (and was not resumed since)
+
+    def _append(self, records):
+        """ Appends records to the journal. """
+        with self.lock:
+            with open(self.file_name, 'a', encoding='utf-8') as journal:
+                journal.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def start(self):
+        """ Starts the journal of a new run, replacing the last one. """
+        with self.lock:
+            with open(self.file_name, 'w', encoding='utf-8') as journal:
+                journal.write(json.dumps({"run": time.time()}) + "\n")
+        self.emails, self.scores, self.failures, self.estimated = [], {}, {}, set()
+        self.fetched = self.finished = False
+
+    def restart(self, emails):
+        """ Starts the journal of a new run of these emails, carrying over the base uscores loaded from the
+         last journal for any of them (when resuming a run which stopped before it had all its emails, e.g.
+         while streaming). Returns a dictionary mapping id(email) to each uscore carried over. """
+        scores, estimated = self.scores, self.estimated
+        self.start()
+        self.record_emails(emails)
+        self.mark_fetched()
+        carried = [e for e in emails if e.msg_id in scores]
+        for e in carried:
+            self.record(e, scores[e.msg_id], e.msg_id in estimated)
+        return self.known_uscores()
+
+    def reopen(self):
+        """ Continues the journal loaded by load(), for a run resuming it. """
+        self._append([{"resumed": time.time()}])
+        self.finished = False
+
+    def load(self):
+        """ Reads the journal. Returns True if it holds a run whose emails were all fetched (so it can be
+         resumed), or False if there is none, or the run stopped while fetching. """
+        self.emails, self.scores, self.failures, self.estimated = [], {}, {}, set()
+        self.fetched = self.finished = False
+        if not os.path.exists(self.file_name):
+            return False
+        with open(self.file_name, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # a line cut short by a crash
+                if "email" in record:
+                    self.emails.append(Email.from_dict(record["email"]))
+                elif "uscore" in record:
+                    self.scores[record["key"]] = record["uscore"]
+                    self.failures.pop(record["key"], None) # scored on a retry
+                    if record.get("estimated"):
+                        self.estimated.add(record["key"])
+                    else:
+                        self.estimated.discard(record["key"])
+                elif "error" in record:
+                    self.failures[record["key"]] = record["error"]
+                elif "fetched" in record:
+                    self.fetched = True
+                elif "finished" in record:
+                    self.finished = True
+                elif "resumed" in record:
+                    self.finished = False
+        return self.fetched
+
+    def record_emails(self, emails):
+        """ Journals fetched emails (after preprocessing and grouping by thread, as they are scored). """
+        self._append([{"email": e.to_dict()} for e in emails])
+        self.emails.extend(emails)
+
+    def mark_fetched(self):
+        """ Journals that every email of the run has been fetched. """
+        self._append([{"fetched": len(self.emails)}])
+        self.fetched = True
+
+    def record(self, email, result, estimated=False):
+        """ Journals the base uscore of an email (an estimate, if estimated is True), or the exception which
+         stopped it from being scored. """
+        if isinstance(result, Exception):
+            self._append([{"key": email.msg_id, "error": str(result)}])
+            with self.lock:
+                self.failures[email.msg_id] = str(result)
+        else:
+            self._append([{"key": email.msg_id, "uscore": float(result), "estimated": True} if estimated else
+                          {"key": email.msg_id, "uscore": float(result)}])
+            with self.lock:
+                self.scores[email.msg_id] = float(result)
+                self.failures.pop(email.msg_id, None)
+                if estimated:
+                    self.estimated.add(email.msg_id)
+                else:
+                    self.estimated.discard(email.msg_id)
+
+    def record_future(self, email, future):
+        """ Journals the result of a finished future holding an email's base uscore. """
+        if future.exception() is not None:
+            self.record(email, future.exception())
+        elif future.result() is not None:
+            self.record(email, future.result())
+
+    def record_uscores(self, emails, base_uscores):
+        """ Journals the result of each of the emails, from a dictionary mapping id(email) to a finished future
+         holding its base uscore. The uscores of emails marked as estimated are journaled as estimates. """
+        for e in emails:
+            if e.estimated:
+                self.record(e, base_uscores[id(e)].result(), estimated=True)
+            else:
+                self.record_future(e, base_uscores[id(e)])
+
+    def journaled(self, func, batch=False):
+        """ Wraps func(job), which returns the base uscore of the email job[0] (or, if batch is True, a list
+         holding the result of each email in the list job[0]), so each result is journaled as soon as it is
+         known, on the thread which got it. A job (or an email of a batch) whose result is None (stopped by a
+         ScoringBudget) is not. """
+        def journaled_func(job):
+            try:
+                result = func(job)
+            except Exception as error:
+                if not batch:
+                    self.record(job[0], error)
+                raise
+            if result is not None:
+                for e, email_result in (zip(job[0], result) if batch else [(job[0], result)]):
+                    if email_result is not None:
+                        self.record(e, email_result)
+            return result
+        return journaled_func
+
+    def finish(self):
+        """ Journals that the run printed its report. """
+        self._append([{"finished": time.time()}])
+        self.finished = True
+
+    def pending(self):
+        """ Returns the journaled emails which have no base uscore yet (failed, or never scored). Emails a
+         ScoringBudget chose to rank on an estimate are not pending. """
+        return [e for e in self.emails if e.msg_id not in self.scores]
+
+    def known_uscores(self, retry_flagged=False):
+        """ Returns a dictionary mapping id(email) to the base uscore of each journaled email which needs
+         no query. Emails ranked on an estimate keep it, and are marked as estimated again. If retry_flagged
+         is True, only the emails which failed are to be scored again, so the ones never scored map to an
+         exception instead (and are reported as not processed). """
+        known = {}
+        for e in self.emails:
+            if e.msg_id in self.scores:
+                known[id(e)] = self.scores[e.msg_id]
+                e.estimated = e.msg_id in self.estimated
+            elif retry_flagged and e.msg_id not in self.failures:
+                known[id(e)] = Exception(NOT_SCORED_MESSAGE)
+        return known
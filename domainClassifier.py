@@ -0,0 +1,150 @@
+# Sender domain classifier: matches domains against large provider lists with a reversed-label trie
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import functools
+import glob
+import os
+import re
+from email.utils import parseaddr
+
+# Constants
+DOMAIN_LIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "domains") # the domain list files
+PUBLIC = "public" # free and consumer email providers
+DISPOSABLE = "disposable" # throwaway email providers
+ORGANISATION = "organisation" # domains which are never public (overrides a broader public or disposable entry)
+KINDS = [PUBLIC, DISPOSABLE, ORGANISATION] # the order lists are loaded in (later lists win when entries overlap)
+SENDER_CACHE_SIZE = 65536 # the number of parsed sender strings kept (most inboxes repeat their senders)
+
+# The keys a trie node keeps its kinds under (none of them can be a label, as labels never contain a '.')
+TERMINAL = "." # the kind of the node's own entry (covering the domain and its subdomains)
+WILDCARD = "*." # the kind of the node's *. entry (covering only the subdomains)
+EXACT = ".=" # the kind the domain itself matches, counting entries further up (set by freeze)
+BELOW = ".*" # the kind any unlisted subdomain matches, counting entries further up (set by freeze)
+
+# "Name <address>", "\"Name\" <address>" or a bare address: the forms nearly every From header takes
+ADDRESS = r'[^<>()\[\]\\\s,;:"@]+@[^<>()\[\]\\\s,;:"@]+'
+SIMPLE_SENDER_PATTERN = re.compile(rf'\s*(?:(?:"(?:[^"\\]|\\.)*"|[^"<>()\[\]\\,;:@]*?)\s*<({ADDRESS})>|({ADDRESS}))\s*')
+
+
+@functools.lru_cache(maxsize=SENDER_CACHE_SIZE)
+def sender_address(sender):
+    """ Returns (address, domain) for the sender of an email, both lowercase, parsed from its From header
+     ("Name <address>", a bare address, or anything else RFC 5322 allows). The domain is "" if there is none. """
+    match = SIMPLE_SENDER_PATTERN.fullmatch(sender)
+    if match is not None: # the common forms, without the full parser
+        address = (match.group(1) or match.group(2)).lower()
+    else:
+        address = parseaddr(sender)[1].lower()
+    return address, address.rpartition("@")[2].rstrip(".") if "@" in address else ""
+
+
+class DomainTrie:
+
+    """ Maps domains to a kind, matching on whole labels from the right, so an entry for example.com also
+     covers mail.example.com and an entry for *.edu covers every domain under edu (but not edu itself).
+     Nodes are dicts keyed by label; a node with nothing below it is stored as just its kind (one shared
+     string), which keeps tens of thousands of entries compact. The most specific matching entry wins.
+     Call freeze() after adding entries, so each node knows what it inherits and a lookup is one dict
+     access per label. """
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0 # the number of entries added
+
+    def add(self, entry, kind):
+        """ Adds an entry (example.com or *.example.com). Raises ValueError if it is not a valid domain. """
+        entry = entry.strip().lower().rstrip(".")
+        wildcard = entry.startswith("*.")
+        labels = (entry[2:] if wildcard else entry).split(".")
+        if not all(labels) or any("*" in label for label in labels):
+            raise ValueError(f"Invalid domain: {entry!r}")
+        node = self.root
+        for i, label in enumerate(reversed(labels)):
+            child = node.get(label)
+            if i == len(labels) - 1 and not wildcard and not isinstance(child, dict):
+                node[label] = kind # a leaf (or a leaf replaced)
+                break
+            if child is None:
+                child = node[label] = {}
+            elif isinstance(child, str):
+                child = node[label] = {TERMINAL: child} # a leaf grows subdomain entries
+            node = child
+        else:
+            node[WILDCARD if wildcard else TERMINAL] = kind
+        self.size = self.size + 1
+
+    def freeze(self):
+        """ Works out the EXACT and BELOW kinds of every node from the entries above it. """
+        stack = [(self.root, None)]
+        while stack:
+            node, inherited = stack.pop()
+            node.pop(EXACT, None)
+            node.pop(BELOW, None)
+            exact = node.get(TERMINAL, inherited)
+            below = node.get(WILDCARD, exact)
+            if exact is not None:
+                node[EXACT] = exact
+            if below is not None:
+                node[BELOW] = below
+            stack.extend((child, below) for child in node.values() if isinstance(child, dict))
+
+    def lookup(self, domain):
+        """ Returns the kind of the most specific entry matching a (lowercase) domain, or None. """
+        node = self.root
+        for label in reversed(domain.split(".")):
+            child = node.get(label)
+            if child is None:
+                return node.get(BELOW) # an unlisted subdomain of this node
+            if child.__class__ is str:
+                return child # the domain, or a parent of it, is listed
+            node = child
+        return node.get(EXACT)
+
+
+class DomainClassifier:
+
+    """ Classifies sender domains as public, disposable or organisation domains using the lists in
+     DOMAIN_LIST_DIR: every <kind>*.txt file, one domain (or *.domain) per line, with # comments. Users can
+     add their own lists (e.g. organisation.txt with their company's domains, or a large published list of
+     disposable providers) next to the bundled ones. """
+
+    shared_classifier = None # the classifier loaded from DOMAIN_LIST_DIR (loaded the first time it is needed)
+
+    def __init__(self, list_dir=DOMAIN_LIST_DIR):
+        """ Loads every domain list in list_dir. Invalid lines are skipped. """
+        self.trie = DomainTrie()
+        self.invalid = 0 # the number of lines which were not valid domains
+        for kind in KINDS:
+            for file_name in sorted(glob.glob(os.path.join(list_dir, f"{kind}*.txt"))):
+                self.load_list(file_name, kind)
+        self.trie.freeze()
+
+    def load_list(self, file_name, kind):
+        """ Adds every domain in a list file as the specified kind. Call trie.freeze() afterwards. """
+        with open(file_name, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue # skip blank lines and comments
+                try:
+                    self.trie.add(line, kind)
+                except ValueError:
+                    self.invalid = self.invalid + 1
+
+    def classify(self, domain):
+        """ Returns the kind of a (lowercase) domain: PUBLIC, DISPOSABLE, ORGANISATION, or None if it is
+         not in any list. """
+        return self.trie.lookup(domain)
+
+    def is_personal(self, domain):
+        """ Returns True if the domain belongs to a public or disposable email provider. """
+        kind = self.trie.lookup(domain)
+        return kind == PUBLIC or kind == DISPOSABLE
+
+    @staticmethod
+    def shared():
+        """ Returns the classifier for the bundled and user-added lists, loading it once per process. """
+        if DomainClassifier.shared_classifier is None:
+            DomainClassifier.shared_classifier = DomainClassifier()
+        return DomainClassifier.shared_classifier
@@ -0,0 +1,93 @@
+# Groups the messages of a Gmail thread so each thread is scored once
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import re
+from llm import CHARS_PER_TOKEN
+
+# Constants
+MAX_CONTEXT_MESSAGES = 5 # the max number of earlier messages summarised in a thread's context
+CONTEXT_TOKEN_BUDGET = 200 # the max estimated tokens of a thread's context
+CONTEXT_SNIPPET_LEN = 160 # the max characters kept from each earlier message
+SKIPPED_LINE_PATTERN = re.compile(r"^- \(\d+ earlier messages\)$") # the line counting the messages left out of a summary
+
+
+def summarise_messages(earlier, older_context="", older_count=0):
+    """ Returns a condensed summary of a thread's earlier messages (oldest first): one line per message with
+     its sender and the start of its body, keeping the most recent messages within the token budget. If
+     the thread had older_count messages before these, summarised in older_context (by this function), as
+     many of that summary's lines as fit are kept too. """
+    candidates = [] # one line per message, newest first, so the oldest are dropped when over budget
+    for e in reversed(earlier):
+        snippet = " ".join((e.body or "").split())
+        if len(snippet) > CONTEXT_SNIPPET_LEN:
+            snippet = snippet[:CONTEXT_SNIPPET_LEN].rstrip() + "..."
+        candidates.append(f"- {e.sender}: {snippet}")
+    candidates.extend(reversed([line for line in older_context.splitlines() if not SKIPPED_LINE_PATTERN.match(line)]))
+    lines = []
+    used = 0
+    for line in candidates[:MAX_CONTEXT_MESSAGES]:
+        if lines and used + len(line) > CONTEXT_TOKEN_BUDGET * CHARS_PER_TOKEN:
+            break
+        lines.append(line)
+        used = used + len(line)
+    skipped = len(earlier) + older_count - len(lines)
+    if skipped > 0:
+        lines.append(f"- ({skipped} earlier messages)")
+    return "\n".join(reversed(lines))
+
+def group_threads(emails, previous=None):
+    """ Groups a list of emails by Gmail thread. Returns one email per thread (the latest message, carrying
+     the message count and a summary of the earlier messages), in the order each thread's latest message
+     appeared in the list. Emails without a thread id are kept on their own. previous (if given) maps the
+     thread id of a thread grouped before to its latest message then (carrying its own count and summary),
+     for emails which are all newer messages of it: they are grouped with it, so the count and summary
+     cover the whole thread. """
+    threads = {}
+    for position, e in enumerate(emails):
+        key = e.thread_id if e.thread_id is not None else ("message", position)
+        threads.setdefault(key, []).append((e.internal_date, position, e))
+
+    grouped = []
+    for messages in threads.values():
+        messages.sort(key=lambda message: (message[0], -message[1])) # Oldest first (ties: later in the list is older)
+        _, position, latest = messages[-1]
+        before = previous.get(latest.thread_id) if previous is not None and latest.thread_id is not None else None
+        if before is not None:
+            earlier = [before] + [message[2] for message in messages[:-1]]
+            latest.message_count = before.message_count + len(messages)
+            latest.thread_context = summarise_messages(earlier, before.thread_context, before.message_count - 1)
+        elif len(messages) > 1:
+            earlier = [message[2] for message in messages[:-1]]
+            latest.message_count = len(messages)
+            latest.thread_context = summarise_messages(earlier)
+        grouped.append((position, latest))
+    grouped.sort(key=lambda pair: pair[0])
+    return [e for _, e in grouped]
+
+def group_thread_stream(stream, thread_sizes):
+    """ Groups a stream of (position, email) pairs by Gmail thread as it passes through. thread_sizes maps
+     each thread id to the number of its messages in the stream: a thread is held until all of them have
+     arrived, then its latest message is passed on (at its own position) carrying the message count and a
+     summary of the earlier ones, as group_threads does. Emails without a thread id, or the only message
+     of their thread, are passed on at once. Threads still held when the stream ends (a message could not
+     be fetched) are passed on then. """
+    held = {} # thread id -> the (position, email) pairs of the thread which have arrived
+    for position, e in stream:
+        if e.thread_id is None or thread_sizes.get(e.thread_id, 1) <= 1:
+            yield position, e
+            continue
+        messages = held.setdefault(e.thread_id, [])
+        messages.append((position, e))
+        if len(messages) >= thread_sizes[e.thread_id]:
+            yield grouped_thread(held.pop(e.thread_id))
+    for messages in held.values():
+        yield grouped_thread(messages)
+
+def grouped_thread(messages):
+    """ Returns (position, email) for the latest of a thread's (position, email) pairs, grouped with the
+     earlier ones by group_threads. """
+    messages.sort(key=lambda message: message[0]) # in stream order, as group_threads breaks ties by it
+    positions = {id(e): position for position, e in messages}
+    latest = group_threads([e for _, e in messages])[0]
+    return positions[id(latest)], latest
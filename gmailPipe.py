@@ -1,23 +1,77 @@
 # Data utility class for storing emails
 # @author Rylan Ahmadi (Ry305)
-# Last updated 06/12/2025
+# Last updated 10/18/2026
 
-from googleapiclient.discovery import build
-import base64
+import html
 from myEmail import Email
 from datetime import datetime, timedelta
 import json
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import os
+import time
+from metrics import Metrics
+from mimeBody import MAX_BODY_BYTES, SNIPPET_BYTES, choose_body_part, needs_fetch, extract_body
+
+# Constants
+BATCH_SIZE = 50 # the default number of messages fetched per batch request
+MAX_BATCH_SIZE = 100 # the most requests the Gmail API accepts in a single batch
+MAX_BATCH_RETRIES = 3 # the number of times messages which failed inside a batch are retried
+PAGE_SIZE = 500 # the number of message ids requested per page when listing messages
+SYNC_STATE_FILE_NAME = "sync_state.json" # the file used to store the last historyId and the fetched emails
+EXCLUDED_LABELS = {"SPAM", "TRASH", "DRAFT"} # messages with these labels are left out, as in a search
+DISCOVERY_FILE_NAME = "gmail_discovery.json" # the Gmail API discovery document, kept so it is not fetched or unpacked again
+KEPT_HEADERS = {"list-unsubscribe", "list-id", "precedence", "auto-submitted", "x-auto-response-suppress"} # bulk mail signals
+METADATA_HEADERS = ["Subject", "From", "Date"] + sorted(KEPT_HEADERS) # the headers asked for when only metadata is fetched
 
 class GmailPipe: 
 
+    service_override = None # a service to use instead of connecting to Gmail (e.g. a local fake for benchmarks)
+    service = None # the authorized service, reused for the rest of the process once it has been built
+    max_body_bytes = MAX_BODY_BYTES # the most bytes of body text kept from each message (see mimeBody)
+
+    @staticmethod
+    def load_discovery_document():
+        """ Returns the Gmail API discovery document from DISCOVERY_FILE_NAME. If the file is missing, or was
+         written by another version of googleapiclient, it is rewritten from the copy bundled with the library
+         (its static discovery documents), so the document is never fetched over the network. Returns None if
+         neither is available. """
+        from googleapiclient.version import __version__ as library_version
+        from googleapiclient.discovery_cache import get_static_doc
+        try:
+            with open(DISCOVERY_FILE_NAME, 'r', encoding='utf-8') as discovery_file:
+                cached = json.load(discovery_file)
+            if cached.get('version') == library_version:
+                return cached['document']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass # Missing or unreadable, so it is rewritten below
+        document = get_static_doc('gmail', 'v1')
+        if document is not None:
+            temp_file_name = DISCOVERY_FILE_NAME + ".tmp"
+            with open(temp_file_name, 'w', encoding='utf-8') as discovery_file:
+                json.dump({'version': library_version, 'document': document}, discovery_file)
+            os.replace(temp_file_name, DISCOVERY_FILE_NAME)
+        return document
+
+    @staticmethod
+    def build_service(creds):
+        """ Builds a Gmail API service from the local discovery document. """
+        from googleapiclient.discovery import build, build_from_document
+        document = GmailPipe.load_discovery_document()
+        if document is None:
+            return build('gmail', 'v1', credentials=creds)
+        return build_from_document(document, credentials=creds)
+
     @staticmethod
     def get_gmail_service():
-        """ Creates and returns a service for the gmail API. If necessary, refreshes credentials. """
+        """ Returns a service for the gmail API, building it on the first call. If necessary, refreshes
+         credentials. """
+        if GmailPipe.service_override is not None:
+            return GmailPipe.service_override
+        if GmailPipe.service is not None: # google-auth refreshes its token by itself from here on
+            return GmailPipe.service
         try:
             # Load credentials
             from google.oauth2.credentials import Credentials
+            from google.auth.transport.requests import Request
             creds = Credentials.from_authorized_user_file('token.json', ['https://www.googleapis.com/auth/gmail.readonly'])
             # Check if credentials have expired and refresh if needed
             if creds.expired and creds.refresh_token:
@@ -26,14 +80,13 @@ class GmailPipe:
                 GmailPipe._save_credentials(creds)
             elif creds.expired and not creds.refresh_token:
                 raise Exception("Token expired and no refresh token is available")
-            service = build('gmail', 'v1', credentials=creds)
-            return service
+            GmailPipe.service = GmailPipe.build_service(creds)
         except Exception as e:
             new_creds = GmailPipe.reauthorize_gmail()
             if new_creds is None:
                 raise Exception("Error: Failed to reauthorize Gmail API")
-            service = build('gmail', 'v1', credentials=new_creds)
-            return service
+            GmailPipe.service = GmailPipe.build_service(new_creds)
+        return GmailPipe.service
     
     @staticmethod
     def reauthorize_gmail():
@@ -44,6 +97,8 @@ class GmailPipe:
         SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
         
         try:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
             # Create the flow using the client secrets file
             flow = InstalledAppFlow.from_client_secrets_file(
                 'credentials.json',  # Make sure this file exists
@@ -100,50 +155,288 @@ class GmailPipe:
             json.dump(creds_data, token_file, indent=2)
 
     @staticmethod
-    def get_emails_last_24_hours():
-        """ Gets all messages sent in the past 24 hoursw """
-        # Get the service
+    def list_message_ids(service, query, thread_sizes=None):
+        """ Lists the ids of every message matching the query, following nextPageToken through all pages. If
+         thread_sizes (a dictionary) is given, the number of messages listed in each thread is added to it. """
+        message_ids = []
+        page_token = None
+        while True:
+            with Metrics.active.span("gmail_list", "gmail"):
+                results = service.users().messages().list(userId='me', q=query, maxResults=PAGE_SIZE,
+                                                          pageToken=page_token).execute()
+            message_ids.extend(msg['id'] for msg in results.get('messages', []))
+            if thread_sizes is not None:
+                for msg in results.get('messages', []):
+                    thread_sizes[msg['threadId']] = thread_sizes.get(msg['threadId'], 0) + 1
+            page_token = results.get('nextPageToken')
+            if not page_token: # If this was the last page
+                return message_ids
+
+    @staticmethod
+    def metadata_only():
+        """ Returns True if the body cap is no longer than the snippet Gmail sends with a message's metadata,
+         so messages are fetched without their bodies and the snippet stands in for the body. """
+        return GmailPipe.max_body_bytes <= SNIPPET_BYTES
+
+    @staticmethod
+    def message_request(service, msg_id):
+        """ Returns the request for a message's data: its full MIME tree (attachments are only ever sent by
+         id), or just its headers and snippet if metadata_only(). """
+        if GmailPipe.metadata_only():
+            return service.users().messages().get(userId='me', id=msg_id, format='metadata',
+                                                  metadataHeaders=METADATA_HEADERS)
+        return service.users().messages().get(userId='me', id=msg_id, format='full')
+
+    @staticmethod
+    def fetch_body_parts(service, messages):
+        """ Fetches the content of each message's body part which Gmail stored separately (by attachmentId,
+         as it does for some large text parts), with batch requests, and fills it into the message data. Only
+         the part the body is taken from is fetched; attachments never are. Parts which cannot be fetched
+         are left empty. """
+        pending = {}
+        for msg_data in messages:
+            part, _ = choose_body_part(msg_data['payload'])
+            if part is not None and needs_fetch(part):
+                pending[msg_data['id']] = part
+        if not pending:
+            return
+
+        # Callback for each part in a batch
+        def on_part(request_id, response, exception):
+            """ Stores the part's content, or leaves the part empty if it could not be fetched. """
+            if exception is not None:
+                Metrics.active.count("gmail_body_part_failures")
+            else:
+                pending[request_id]['body']['data'] = response.get('data', "")
+
+        msg_ids = list(pending)
+        for start in range(0, len(msg_ids), MAX_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_part)
+            for msg_id in msg_ids[start:start + MAX_BATCH_SIZE]:
+                batch.add(service.users().messages().attachments().get(userId='me', messageId=msg_id,
+                          id=pending[msg_id]['body']['attachmentId']), request_id=msg_id)
+            with Metrics.active.span("gmail_body_parts", "gmail", {"parts": len(msg_ids[start:start + MAX_BATCH_SIZE])}):
+                batch.execute()
+            Metrics.active.count("gmail_batches")
+        Metrics.active.count("gmail_body_parts_fetched", len(msg_ids))
+
+    @staticmethod
+    def iter_messages(service, message_ids, batch_size=BATCH_SIZE, delay=1):
+        """ Fetches the message data for each id (see message_request), using batch HTTP requests of up to
+         batch_size messages, and yields (position, message data) pairs as each batch completes, where
+         position is the message's index in message_ids. Messages which fail inside a batch are retried in
+         a later batch, and are left out if they still cannot be fetched. """
+        batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        positions = {msg_id: position for position, msg_id in enumerate(message_ids)}
+        fetched = {}
+        failed = {}
+
+        # Callback for each message in a batch
+        def on_message(request_id, response, exception):
+            """ Stores the message data, or records the failure so the message can be retried. """
+            if exception is not None:
+                failed[request_id] = exception
+            else:
+                fetched[request_id] = response
+
+        remaining = list(positions)
+        for attempt in range(MAX_BATCH_RETRIES + 1):
+            failed.clear()
+            for start in range(0, len(remaining), batch_size):
+                batch = service.new_batch_http_request(callback=on_message)
+                for msg_id in remaining[start:start + batch_size]:
+                    batch.add(GmailPipe.message_request(service, msg_id), request_id=msg_id)
+                with Metrics.active.span("gmail_batch", "gmail", {"messages": len(remaining[start:start + batch_size])}):
+                    batch.execute()
+                Metrics.active.count("gmail_batches")
+                if not GmailPipe.metadata_only():
+                    GmailPipe.fetch_body_parts(service, fetched.values())
+                for msg_id in list(fetched): # Hand over this batch's messages (so they are not all held at once)
+                    yield positions[msg_id], fetched.pop(msg_id)
+            remaining = [msg_id for msg_id in remaining if msg_id in failed]
+            if not remaining: # If every message was fetched
+                break
+            if attempt < MAX_BATCH_RETRIES:
+                Metrics.active.record_sleep("gmail", delay * (attempt + 1)) # back off before retrying the failed messages
+
+        for msg_id in remaining:
+            print(f"❌ Error: could not fetch message {msg_id}: {failed[msg_id]}")
+
+    @staticmethod
+    def fetch_messages(service, message_ids, batch_size=BATCH_SIZE, delay=1):
+        """ Fetches the message data for each id (see iter_messages). Returns the message data in the
+         same order as message_ids (messages which could not be fetched are left out). """
+        fetched = sorted(GmailPipe.iter_messages(service, message_ids, batch_size, delay), key=lambda pair: pair[0])
+        return [msg_data for _, msg_data in fetched]
+
+    @staticmethod
+    def parse_message(msg_data):
+        """ Creates an Email from the message data returned by the Gmail API. The body is the best text part
+         of the message (see mimeBody.extract_body), cut to max_body_bytes, or the message's snippet if only
+         its metadata was fetched. """
+        headers = msg_data['payload']['headers']
+
+        # Helper method for retrieving headers
+        def get_header(name):
+            """ Retrieves the specified header """
+            return next((h['value'] for h in headers if h['name'].lower() == name.lower()), None)
+        
+        # Get the first 3 fields
+        subject = get_header('Subject') or "(No Subject)"
+        sender = get_header('From') or "(Unknown Sender)"
+        date = get_header('Date')
+        
+        # Get email body (the 4th field), kept as raw bytes in its charset until it is read
+        if GmailPipe.metadata_only(): # Only the metadata was fetched
+            snippet = html.unescape(msg_data.get('snippet', "")).encode("utf-8")[:GmailPipe.max_body_bytes] # the cap is in bytes
+            body, charset = snippet.decode("utf-8", errors="ignore"), "utf-8" # drop a character cut in half
+            Metrics.active.count("gmail_bodies_from_snippet")
+        else:
+            body, charset, truncated = extract_body(msg_data['payload'], GmailPipe.max_body_bytes)
+            if truncated:
+                Metrics.active.count("gmail_bodies_truncated")
+
+        # Keep the headers which mark bulk or automated mail
+        kept_headers = {h['name'].lower(): h['value'] for h in headers if h['name'].lower() in KEPT_HEADERS}
+
+        # Create an email object
+        return Email(subject, sender, date, body, msg_data.get('id'), int(msg_data.get('internalDate', 0)), kept_headers,
+                     msg_data.get('threadId'), charset)
+
+    @staticmethod
+    def list_history_changes(service, start_history_id):
+        """ Lists the ids of the messages added and removed since start_history_id, following
+         nextPageToken through all pages. Returns (added_ids, removed_ids, latest_history_id). Raises
+         HttpError (status 404) if start_history_id is too old for Gmail to answer. """
+        added_ids = []
+        removed_ids = set()
+        page_token = None
+        history_id = start_history_id
+        while True:
+            results = service.users().history().list(userId='me', startHistoryId=start_history_id,
+                historyTypes=['messageAdded', 'messageDeleted', 'labelAdded'], maxResults=PAGE_SIZE,
+                pageToken=page_token).execute()
+            for record in results.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    if not EXCLUDED_LABELS.intersection(added['message'].get('labelIds', [])):
+                        added_ids.append(added['message']['id'])
+                for deleted in record.get('messagesDeleted', []):
+                    removed_ids.add(deleted['message']['id'])
+                for labelled in record.get('labelsAdded', []): # moving a message to spam or trash removes it
+                    if EXCLUDED_LABELS.intersection(labelled.get('labelIds', [])):
+                        removed_ids.add(labelled['message']['id'])
+            history_id = results.get('historyId', history_id)
+            page_token = results.get('nextPageToken')
+            if not page_token: # If this was the last page
+                return [msg_id for msg_id in added_ids if msg_id not in removed_ids], removed_ids, history_id
+
+    @staticmethod
+    def load_sync_state():
+        """ Loads the historyId and emails saved by the last sync, or returns None if there are none. """
+        if not os.path.exists(SYNC_STATE_FILE_NAME):
+            return None
+        try:
+            with open(SYNC_STATE_FILE_NAME, 'r', encoding='utf-8') as state_file:
+                state = json.load(state_file)
+            return state['history_id'], [Email.from_dict(data) for data in state['emails']]
+        except Exception as e:
+            print(f"❌ Error: could not read {SYNC_STATE_FILE_NAME}, running a full scan: {e}")
+            return None
+
+    @staticmethod
+    def save_sync_state(history_id, emails):
+        """ Saves the historyId and emails so the next sync only needs to fetch changes. The file is
+         replaced atomically so an interrupted save cannot corrupt it. """
+        temp_file_name = SYNC_STATE_FILE_NAME + ".tmp"
+        with open(temp_file_name, 'w', encoding='utf-8') as state_file:
+            json.dump({'history_id': history_id, 'emails': [e.to_dict() for e in emails]}, state_file)
+        os.replace(temp_file_name, SYNC_STATE_FILE_NAME)
+
+    @staticmethod
+    def sync_emails_last_24_hours(batch_size=BATCH_SIZE):
+        """ Gets all messages sent in the past 24 hours, like get_emails_last_24_hours, but only fetches
+         the messages added since the last sync (using the Gmail history API). Falls back to a full scan
+         on the first run, or if the stored historyId has expired. """
+        from googleapiclient.errors import HttpError
+        service = GmailPipe.get_gmail_service()
+        cutoff = int((datetime.now() - timedelta(days=1)).timestamp() * 1000) # 24 hours ago (in milliseconds)
+
+        state = GmailPipe.load_sync_state()
+        emails = None
+        if state is not None:
+            history_id, stored_emails = state
+            try:
+                added_ids, removed_ids, history_id = GmailPipe.list_history_changes(service, history_id)
+                stored_ids = {e.msg_id for e in stored_emails}
+                new_ids = [msg_id for msg_id in dict.fromkeys(added_ids) if msg_id not in stored_ids]
+                new_emails = [GmailPipe.parse_message(msg_data)
+                              for msg_data in GmailPipe.fetch_messages(service, new_ids, batch_size)]
+                emails = new_emails + [e for e in stored_emails if e.msg_id not in removed_ids]
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                print("❌ Stored history has expired, running a full scan.") # Gmail only keeps about a week of history
+
+        if emails is None: # If this is the first sync, or the history could not be used
+            # Take the historyId before listing, so nothing that arrives during the scan is missed next time
+            history_id = service.users().getProfile(userId='me').execute()['historyId']
+            emails = GmailPipe.get_emails_last_24_hours(batch_size, service)
+
+        # Drop emails which have fallen out of the 24 hour window, newest first like a Gmail search
+        emails = sorted((e for e in emails if e.internal_date > cutoff), key=lambda e: e.internal_date, reverse=True)
+        GmailPipe.save_sync_state(history_id, emails)
+        return emails
+
+    @staticmethod
+    def poll_new_emails(history_id=None, batch_size=BATCH_SIZE):
+        """ Gets the messages added since history_id, for a caller which keeps its own copy of the earlier
+         ones (when nothing has arrived this is a single history request). Returns (new_emails, removed_ids,
+         history_id), with the historyId to poll from next time. If history_id is None, or has expired,
+         every message from the past 24 hours is returned instead. """
+        from googleapiclient.errors import HttpError
         service = GmailPipe.get_gmail_service()
+        if history_id is not None:
+            try:
+                added_ids, removed_ids, history_id = GmailPipe.list_history_changes(service, history_id)
+                new_ids = list(dict.fromkeys(added_ids))
+                emails = [GmailPipe.parse_message(msg_data)
+                          for msg_data in GmailPipe.fetch_messages(service, new_ids, batch_size)] if new_ids else []
+                return emails, removed_ids, history_id
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                print("❌ Stored history has expired, running a full scan.") # Gmail only keeps about a week of history
+
+        # Take the historyId before listing, so nothing that arrives during the scan is missed next time
+        history_id = service.users().getProfile(userId='me').execute()['historyId']
+        return GmailPipe.get_emails_last_24_hours(batch_size, service), set(), history_id
+
+    @staticmethod
+    def get_emails_last_24_hours(batch_size=BATCH_SIZE, service=None):
+        """ Gets all messages sent in the past 24 hours, fetching them in batches of batch_size """
+        # Get the service
+        if service is None:
+            service = GmailPipe.get_gmail_service()
 
         # Get current time and the time 24 hours ago
         now = datetime.now()
         yesterday = now - timedelta(days=1)
         query = f"after:{int(yesterday.timestamp())}"
 
-        # Get message info from the past 24 hours
-        results = service.users().messages().list(userId='me', q=query).execute()
-        messages = results.get('messages', [])
-        
-        email_list = []
-        for msg in messages:
-            msg_data = service.users().messages().get(userId='me', id=msg['id'], format='full').execute()
-            headers = msg_data['payload']['headers']
-            payload = msg_data['payload']
-
-            # Helper method for retrieving headers
-            def get_header(name):
-                """ Retrieves the specified header """
-                return next((h['value'] for h in headers if h['name'].lower() == name.lower()), None)
-            
-            # Get the first 3 fields
-            subject = get_header('Subject') or "(No Subject)"
-            sender = get_header('From') or "(Unknown Sender)"
-            date = get_header('Date')
-            
-            # Get email body (the 4th field)
-            parts = msg_data['payload'].get('parts', [])
-            if parts:
-                for part in parts:
-                    if part.get('mimeType') == 'text/plain':
-                        body_data = part['body']['data']
-                        body = base64.urlsafe_b64decode(body_data.encode('UTF-8')).decode('UTF-8')
-                        break
-            else:
-                body_data = msg_data['payload']['body'].get('data')
-                if body_data:
-                    body = base64.urlsafe_b64decode(body_data.encode('UTF-8')).decode('UTF-8')
+        # Get message info from the past 24 hours (all pages)
+        message_ids = GmailPipe.list_message_ids(service, query)
 
-            email = Email(subject, sender, date, body) # Create an email object
-            email_list.append(email) # add it to the list
+        # Fetch the messages in batches and create an email object for each
+        return [GmailPipe.parse_message(msg_data) for msg_data in GmailPipe.fetch_messages(service, message_ids, batch_size)]
 
-        return email_list
+    @staticmethod
+    def iter_emails_last_24_hours(batch_size=BATCH_SIZE, thread_sizes=None):
+        """ Generator version of get_emails_last_24_hours: yields (position, email) pairs as each batch of
+         messages arrives, where position is the email's place in the full (newest first) listing. If
+         thread_sizes (a dictionary) is given, it is filled with the number of messages listed in each
+         thread before the first email is yielded (see emailThreads.group_thread_stream). """
+        service = GmailPipe.get_gmail_service()
+        yesterday = datetime.now() - timedelta(days=1)
+        message_ids = GmailPipe.list_message_ids(service, f"after:{int(yesterday.timestamp())}", thread_sizes)
+        for position, msg_data in GmailPipe.iter_messages(service, message_ids, batch_size):
+            yield position, GmailPipe.parse_message(msg_data)
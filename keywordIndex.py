@@ -0,0 +1,85 @@
+# Single-pass keyword matcher used to calculate the keyword modifier
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import re
+from bisect import bisect_left
+
+class KeywordIndex:
+
+    """ Finds every user-defined keyword in a text with one combined regular expression, instead of one
+     search per keyword. Keywords match as whole words (between \\b boundaries), exactly as they would
+     with a separate search each. A combined search cannot report matches which overlap a match it has
+     already consumed (e.g. "urgent" inside "urgent!!"), so the few keywords which could be hidden that
+     way are re-checked on their own, only at the offsets inside a consumed match where they could start. """
+
+    def __init__(self, keywords):
+        """ Builds the index for a dictionary of keywords and their weights. """
+        self.keywords = dict(keywords) # a copy, so changes to the original can be detected
+        searchable = [word for word in self.keywords if word] # an empty keyword cannot be combined
+        self.fallback = [word for word in self.keywords if not word]
+
+        # Longest keywords first, so that a keyword is preferred over its own prefixes
+        searchable.sort(key=len, reverse=True)
+        self.pattern = re.compile("|".join(r'\b' + re.escape(word) + r'\b' for word in searchable)) if searchable else None
+
+        # For each keyword, the keywords which could be hidden by one of its matches (and where they would start)
+        self.hidden_by = KeywordIndex._find_overlaps(searchable)
+        self.single_patterns = {} # compiled on demand for the keywords which need re-checking
+
+    @staticmethod
+    def _find_overlaps(words):
+        """ Returns a dictionary mapping each word to a list of (other word, offsets) pairs, where a match of
+         the other word could start at each offset inside a match of the word. """
+        sorted_words = sorted(words)
+        word_set = set(words)
+        overlaps = {}
+        for word in words:
+            offsets = {}
+            for i in range(len(word)):
+                suffix = word[i:]
+                # Words which start with this suffix of the word
+                j = bisect_left(sorted_words, suffix)
+                while j < len(sorted_words) and sorted_words[j].startswith(suffix):
+                    offsets.setdefault(sorted_words[j], []).append(i)
+                    j = j + 1
+                # Words which are a prefix of this suffix of the word
+                for end in range(1, len(suffix)):
+                    if suffix[:end] in word_set:
+                        offsets.setdefault(suffix[:end], []).append(i)
+            offsets.pop(word, None) # a word cannot hide itself
+            overlaps[word] = list(offsets.items())
+        return overlaps
+
+    def _single_pattern(self, word):
+        """ Returns the compiled pattern which matches one keyword on its own. """
+        pattern = self.single_patterns.get(word)
+        if pattern is None:
+            pattern = re.compile(r'\b' + re.escape(word) + r'\b')
+            self.single_patterns[word] = pattern
+        return pattern
+
+    def find(self, text):
+        """ Returns the set of keywords which appear in the (lowercase) text. """
+        found = set()
+        if self.pattern is not None:
+            for match in self.pattern.finditer(text):
+                word = match.group()
+                found.add(word)
+                for other, offsets in self.hidden_by[word]:
+                    if other not in found:
+                        single_pattern = self._single_pattern(other)
+                        if any(single_pattern.match(text, match.start() + i) for i in offsets):
+                            found.add(other)
+        for word in self.fallback:
+            if self._single_pattern(word).search(text):
+                found.add(word)
+        return found
+
+    def modifier(self, subject, body):
+        """ Returns the sum of the weights of the keywords found in the subject or body (both lowercase). """
+        found = self.find(subject)
+        if len(found) < len(self.keywords): # the body only needs searching if some keywords are still missing
+            found.update(self.find(body))
+        # Add the weights in the order the keywords were defined, so the total is always the same
+        return sum((weight for word, weight in self.keywords.items() if word in found), 0.0)
@@ -0,0 +1,22 @@
+# Deferred imports for heavy dependencies, so startup only pays for what a run uses
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """ Returns the module called name without running it: the module is only executed the first time
+     one of its attributes is used. A missing module still raises ImportError here, at import time. """
+    if name in sys.modules: # Already imported by someone else
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,36 +1,179 @@
 # The top-level class for the ToneRank application
 # @author Rylan Ahmadi (Ry305)
-# Last updated 07/11/2025
+# Last updated 10/18/2026
 
-from groq import Groq
 import os
-from dotenv import load_dotenv
 from pathlib import Path
 import logging
 import time
+import re
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+from responseCache import ResponseCache
+from metrics import Metrics
 
 # Constants
 MAX_RETRIES = 3 # the maximum number of retries allowed if a failure occurs
 MAX_RESPONSE_LEN = 300 # the max length of a response from the model (in tokens)
 MAX_CACHE_SIZE = 1000 # the max length of the cache size
 TEMP = 0.0 # the temperature of the model
+MODEL = "llama3-8b-8192" # the model used for every query
+CONTEXT_WINDOW = 8192 # the max number of tokens (prompt and response) the model accepts
+CHARS_PER_TOKEN = 4 # the average number of characters per token of English text, for estimates
+ENV_FILE = Path(__file__).resolve().parent / ".gitignore" / ".env" # holds GROQ_API_KEY (found from any working directory)
+LOG_FILE_NAME = "llm_operations.log" # the log of the interactions with Llama3 (in the working directory)
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Rate limiting constants
+MAX_IN_FLIGHT = 8 # the maximum number of requests which may be in flight at once
+REQUESTS_PER_MINUTE = 30 # the starting request rate, until Groq's rate-limit headers say otherwise
+MIN_REQUESTS_PER_MINUTE = 1 # the request rate will never be throttled below this
+DEFAULT_RETRY_AFTER = 2.0 # seconds to back off after a 429 which did not include a retry-after header
+
+
+def parse_duration(value):
+    """ Parses a duration in the format used by Groq's rate-limit headers (e.g. "2m59.56s", "7.66s",
+     "120ms" or a plain number of seconds) into seconds. Returns None if the value cannot be parsed. """
+    if value is None:
+        return None
+    try:
+        return float(value) # plain seconds, as used by retry-after
+    except ValueError:
+        pass
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def estimate_tokens(text):
+    """ Estimates the number of tokens the model will count in the text, without a tokenizer. """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class RateLimiter:
+
+    """ Paces requests to the Groq API. A token bucket limits the request rate, and an adaptive cap
+     limits the number of requests in flight (halved on every 429, grown slowly back on success). Both
+     are tuned from the rate-limit headers Groq returns with each response. Safe to share between threads. """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, max_in_flight=MAX_IN_FLIGHT):
+        """ Creates a new RateLimiter which starts out allowing the specified rate and concurrency. """
+        self.rate = requests_per_minute / 60.0 # tokens added to the bucket per second
+        self.capacity = float(max_in_flight) # the largest burst of requests allowed
+        self.tokens = self.capacity
+        self.max_in_flight = max_in_flight
+        self.in_flight_limit = float(max_in_flight) # the current (adaptive) cap on requests in flight
+        self.in_flight = 0
+        self.blocked_until = 0.0 # no request may be sent before this time (set after a 429)
+        self.last_refill = time.monotonic()
+        self.condition = threading.Condition()
+
+    def _refill(self, now):
+        """ Adds the tokens earned since the last refill to the bucket. Must hold the condition. """
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """ Blocks until a request may be sent, then claims a token and an in-flight slot. """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.in_flight < int(self.in_flight_limit):
+                    if now >= self.blocked_until and self.tokens >= 1.0:
+                        self.tokens = self.tokens - 1.0
+                        self.in_flight = self.in_flight + 1
+                        return
+                    # Wait for the block to lift, or for the next token to arrive
+                    wait = max(self.blocked_until - now, (1.0 - self.tokens) / self.rate, 0.01)
+                    self.condition.wait(wait)
+                else:
+                    self.condition.wait() # wait for an in-flight request to finish
+
+    def release(self, success=True):
+        """ Frees an in-flight slot. Successful requests slowly raise the concurrency cap again. """
+        with self.condition:
+            self.in_flight = self.in_flight - 1
+            if success:
+                self.in_flight_limit = min(self.max_in_flight, self.in_flight_limit + 1.0 / self.in_flight_limit)
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """ Context manager which holds a token and in-flight slot for the duration of one request. """
+        self.acquire()
+        success = False
+        try:
+            yield
+            success = True
+        finally:
+            self.release(success)
+
+    def update_from_headers(self, headers):
+        """ Tunes the request rate from the x-ratelimit-* headers of a successful response, so the
+         remaining request budget is spread over the time until it resets. """
+        try:
+            remaining = int(headers.get("x-ratelimit-remaining-requests"))
+        except (TypeError, ValueError):
+            return # the headers were missing or malformed
+        reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        reset_tokens = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+            if reset and reset > 0.0:
+                self.rate = max(MIN_REQUESTS_PER_MINUTE / 60.0, remaining / reset)
+            if remaining <= 0 and reset:
+                self.blocked_until = max(self.blocked_until, now + reset)
+            if remaining_tokens is not None and remaining_tokens.isdigit() and int(remaining_tokens) <= 0 and reset_tokens:
+                self.blocked_until = max(self.blocked_until, now + reset_tokens)
+            self.condition.notify_all()
+
+    def on_rate_limited(self, headers=None):
+        """ Backs off after a 429: halves the concurrency cap, empties the bucket, and blocks all
+         requests until the retry-after period has passed. """
+        retry_after = parse_duration(headers.get("retry-after")) if headers is not None else None
+        with self.condition:
+            now = time.monotonic()
+            self.in_flight_limit = max(1.0, self.in_flight_limit / 2.0)
+            self.tokens = 0.0
+            self.last_refill = now
+            self.blocked_until = max(self.blocked_until, now + (retry_after or DEFAULT_RETRY_AFTER))
+            self.condition.notify_all()
+
 
 class GroqLlama:
 
     """ Provides methods through which Groq's API can be used to access the Llama3 LLM  """
 
-    def __init__(self):
-        """ Creates a new GroqLlama object. """
+    client_override = None # a Groq-compatible client to use instead of connecting to Groq (e.g. a local fake for benchmarks)
+    shared_client = None # the Groq client, shared by every GroqLlama in the process (it holds a connection pool)
+
+    def __init__(self, rate_limiter=None, cache=None):
+        """ Creates a new GroqLlama object. Requests are paced by the given RateLimiter (a new one is
+         created if none is specified), and responses are persisted to the given ResponseCache (if any). """
         self.client = self.setup_groq()
         self.logger = self.get_logger()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.cache = cache
+        self.budget = None # the ScoringBudget every query sent is counted against (if any)
 
     # Load the model
     def setup_groq(self):
-        """ Sets up the Groq API for use. """
-        load_dotenv(Path(".gitignore/.env"))
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        return client
+        """ Sets up the Groq API for use, or returns the client set up earlier in the process. """
+        if GroqLlama.client_override is not None:
+            return GroqLlama.client_override
+        if GroqLlama.shared_client is None:
+            from groq import Groq # imported here, as importing groq is slow and many runs never query Llama3
+            from dotenv import load_dotenv
+            load_dotenv(ENV_FILE)
+            GroqLlama.shared_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        return GroqLlama.shared_client
 
     # Configure logging
     def get_logger(self):
@@ -38,15 +181,27 @@ class GroqLlama:
         the interactions with Llama3 """
         logging.basicConfig(
             level=logging.INFO, 
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', 
-            handlers=[logging.FileHandler('llm_operations.log'), logging.StreamHandler()]
+            format=LOG_FORMAT, 
+            handlers=[logging.FileHandler(LOG_FILE_NAME), logging.StreamHandler()]
             )
         logger = logging.getLogger(__name__)
         return logger
     
+    @contextmanager
+    def budgeted(self, budget):
+        """ Context manager which counts every query sent (not answered from a cache) against a ScoringBudget
+         while it is held, so a query the budget does not allow raises BudgetExhausted instead. """
+        self.budget = budget
+        try:
+            yield
+        finally:
+            self.budget = None
+
     # Query Llama 3.2 (without caching the response)
     def get_llama_response( self, prompt, delay=1 ):
         """ Query Llama3 with retry logic. """
+        if self.budget is not None:
+            self.budget.spend() # raises BudgetExhausted if no query is left
         for attempt in range(MAX_RETRIES):
             try:
                 return self.prompt_llama(prompt)
@@ -54,20 +209,35 @@ class GroqLlama:
                 if attempt == (MAX_RETRIES - 1):
                     self.logger.error(f"Failed after {MAX_RETRIES} attempts: {e}")
                     print(f"\nQuery failed: {e}.\n")
+                    Metrics.active.count("llm_failures")
                     raise
                 self.logger.warning(f"Attempt {attempt + 1} failed {e}")
-                time.sleep(delay * (attempt + 1))
+                Metrics.active.record_sleep("llm", delay * (attempt + 1)) # sleeps, and counts the retry
 
     # Makes a single Llama 3.2 query with no protection or failsafes (not to be used externally)
     def prompt_llama( self, prompt ):
         """ Queries Llama3 for a response to the specified prompt. """
+        from groq import RateLimitError
         try:
-            chat_completion = self.client.chat.completions.create( 
-                    messages=[ { "role": "user", "content": prompt, } ],
-                model="llama3-8b-8192",
-                max_tokens = MAX_RESPONSE_LEN,
-                temperature=TEMP)
+            with self.rate_limiter.slot():
+                start = time.perf_counter() # the request is timed from when the rate limiter lets it go
+                raw_response = self.client.chat.completions.with_raw_response.create( 
+                        messages=[ { "role": "user", "content": prompt, } ],
+                    model=MODEL,
+                    max_tokens = MAX_RESPONSE_LEN,
+                    temperature=TEMP)
+                seconds = time.perf_counter() - start
+            self.rate_limiter.update_from_headers(raw_response.headers)
+            chat_completion = raw_response.parse()
+            usage = getattr(chat_completion, "usage", None) # the token counts Groq bills for
+            Metrics.active.record_llm_request(start, seconds, getattr(usage, "prompt_tokens", 0) or 0,
+                                              getattr(usage, "completion_tokens", 0) or 0)
             return chat_completion.choices[0].message.content
+        except RateLimitError as e:
+            Metrics.active.count("llm_rate_limited")
+            self.rate_limiter.on_rate_limited(e.response.headers)
+            self.logger.error(f"Rate limited in prompt_llama: {e}")
+            raise
         except Exception as e:
             self.logger.error(f"Error in prompt_llama: {e}")
             raise
@@ -75,6 +245,55 @@ class GroqLlama:
     # Query Llama 3.2 (with caching the response)
     @staticmethod
     @lru_cache(maxsize=MAX_CACHE_SIZE)
-    def get_cached_llama_response(client, prompt):
-        """ Queries Llama3 for a response to the specified prompt. Caches the response. """
-        return client.get_llama_response( prompt ) # call the uncached get_llama_response function
+    def get_cached_llama_response(client, prompt, parse=None, *parse_args):
+        """ Queries Llama3 for a response to the specified prompt, and returns parse(response, *parse_args)
+         (or the response itself if parse is None). Caches the result in memory, and the response on disk
+         if the client has a ResponseCache, but only once parse has accepted it: a response parse rejects
+         (by raising a ValueError) is not cached, so the next attempt queries Llama3 again. A cached response
+         parse rejects is evicted and queried again. parse and parse_args are part of the in-memory cache
+         key, so they must be hashable and the same for the same prompt (e.g. a function, not a lambda). """
+        if client.cache is None:
+            response = client.get_llama_response( prompt ) # call the uncached get_llama_response function
+            return response if parse is None else parse(response, *parse_args)
+        key = ResponseCache.make_key(prompt, MODEL, TEMP, MAX_RESPONSE_LEN)
+        response = client.cache.get(key)
+        if response is not None: # If the response was cached by a previous run
+            try:
+                return response if parse is None else parse(response, *parse_args)
+            except ValueError:
+                client.cache.remove(key) # cached before responses were parsed first, so ask again
+        response = client.get_llama_response( prompt )
+        result = response if parse is None else parse(response, *parse_args)
+        client.cache.put(key, response)
+        return result
+
+
+class ScoringEngine:
+
+    """ A bounded thread pool which keeps several Llama3 queries in flight at once. Work is returned as
+     futures in the order it was submitted, so callers see exactly what the serial path would have
+     produced (calling result() re-raises any exception the work raised). """
+
+    def __init__(self, client):
+        """ Creates a new ScoringEngine with one worker for each in-flight slot of the client's rate limiter. """
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=client.rate_limiter.max_in_flight)
+
+    def submit_all(self, func, items):
+        """ Submits func(item) for each item, and returns the list of futures in the same order. """
+        return [self.executor.submit(func, item) for item in items]
+
+    def shutdown(self):
+        """ Waits for any outstanding work, then stops the worker threads. If the wait is interrupted (e.g.
+         by Ctrl-C), the work not yet started is cancelled, so only the queries in flight are finished. """
+        try:
+            self.executor.shutdown(wait=True)
+        except BaseException:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
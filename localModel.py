@@ -0,0 +1,257 @@
+# A small local urgency model distilled from the scores Llama3 has already given
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from lazyImport import lazy_import
+
+np = lazy_import("numpy") # numpy is only loaded once a model or fingerprint is needed
+
+# Constants
+SCORE_LOG_FILE_NAME = "score_log.jsonl" # every (email text, category, Llama3 uscore) example seen so far
+MODEL_FILE_NAME = "local_model.npz" # the trained model
+N_FEATURES = 2 ** 11 # the number of hashed n-gram features (plus one per category)
+N_FOLDS = 5 # the number of models in the ensemble (each trained without one fold of the examples)
+RIDGE_PENALTY = 1.0 # the L2 penalty of the ridge regression
+MAX_TRAINING_EXAMPLES = 5000 # only the most recent examples are used for training (bounds memory)
+DEFAULT_MAX_UNCERTAINTY = 1.5 # in hybrid mode, the max uncertainty (in uscore points) before Llama3 is asked instead
+MIN_COVERAGE = 0.5 # the min share of an email's features seen in training for the model to trust itself
+MIN_USCORE = 0.0
+MAX_USCORE = 10.0
+SCORER_MODES = ["llm", "local", "hybrid"] # the values of --scorer
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def email_text(email):
+    """ Returns the text of an email the model learns from. """
+    return email.subject + "\n" + email.body
+
+def extract_features(text, category):
+    """ Returns (indices, values) of the hashed unigram and bigram features of a text, L2-normalised, plus a
+     feature for the category. crc32 is used instead of hash() so features are the same in every process. """
+    words = WORD_PATTERN.findall(text.lower())
+    counts = {}
+    for gram in words + [a + " " + b for a, b in zip(words, words[1:])]:
+        index = zlib.crc32(gram.encode('UTF-8')) % N_FEATURES
+        counts[index] = counts.get(index, 0) + 1
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.log1p(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+    norm = np.sqrt(np.dot(values, values))
+    if norm > 0.0:
+        values = values / norm
+    return np.append(indices, N_FEATURES + category), np.append(values, 1.0)
+
+def to_matrix(rows):
+    """ Returns the dense feature matrix of a list of (indices, values) rows. """
+    matrix = np.zeros((len(rows), N_FEATURES + 3))
+    for i, (indices, values) in enumerate(rows):
+        np.add.at(matrix[i], indices, values)
+    return matrix
+
+def spearman(a, b):
+    """ Returns the Spearman rank correlation of two sequences (ties get their average rank). """
+    def ranks(x):
+        x = np.asarray(x, dtype=np.float64)
+        order = np.argsort(x, kind="stable")
+        result = np.empty(len(x))
+        result[order] = np.arange(len(x), dtype=np.float64)
+        for value in np.unique(x): # average the ranks of tied values
+            tied = x == value
+            result[tied] = result[tied].mean()
+        return result
+    ra = ranks(a)
+    rb = ranks(b)
+    ra = ra - ra.mean()
+    rb = rb - rb.mean()
+    denominator = np.sqrt(np.dot(ra, ra) * np.dot(rb, rb))
+    return float(np.dot(ra, rb) / denominator) if denominator > 0.0 else 0.0
+
+
+class ScoreLog:
+
+    """ An append-only log of the uscores Llama3 has given, so they can be used as training data instead of
+     being thrown away. Each line holds the (preprocessed) email text, its category and its base uscore.
+     Safe to share between threads; new examples are written by flush(). """
+
+    def __init__(self, file_name=SCORE_LOG_FILE_NAME):
+        """ Creates a new ScoreLog stored in file_name. """
+        self.file_name = file_name
+        self.pending = [] # examples not yet written to the file
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text, category):
+        """ Returns the key which identifies an example (the same email scored twice is only kept once). """
+        return hashlib.sha256(json.dumps([text, category]).encode('UTF-8')).hexdigest()
+
+    def add(self, email, category, uscore):
+        """ Logs the base uscore Llama3 gave an email. """
+        with self.lock:
+            self.pending.append({"text": email_text(email), "category": category, "uscore": float(uscore)})
+
+    def flush(self):
+        """ Appends the pending examples to the log file. """
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+        if pending:
+            with open(self.file_name, 'a', encoding='utf-8') as file:
+                for example in pending:
+                    file.write(json.dumps(example) + "\n")
+
+    def load(self):
+        """ Returns the logged examples, oldest first, keeping only the latest uscore of each email. """
+        if not os.path.exists(self.file_name):
+            return []
+        examples = {}
+        with open(self.file_name, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    example = json.loads(line)
+                except ValueError:
+                    continue # a line cut short by a crash
+                key = ScoreLog.make_key(example["text"], example["category"])
+                examples.pop(key, None) # move it to the end
+                examples[key] = example
+        return list(examples.values())
+
+
+class LocalModel:
+
+    """ A ridge regression over hashed n-gram features, trained to predict Llama3's uscore. The model is
+     an ensemble of N_FOLDS regressions, each trained without one fold of the examples; their mean is
+     the prediction. Its uncertainty combines the (jackknife) spread of the ensemble for that email with
+     the error each regression made on the fold it left out, and an email made mostly of features never
+     seen in training is treated as completely uncertain. Scoring an email takes microseconds and needs
+     nothing but NumPy. """
+
+    def __init__(self, weights, bias, seen, error):
+        """ Creates a LocalModel from the weights of each regression (one row each), the bias, a mask of
+         the features seen in training, and the root mean squared error on the left out folds. """
+        self.weights = weights
+        self.bias = bias
+        self.seen = seen
+        self.error = error
+
+    @staticmethod
+    def train(examples, folds=N_FOLDS, penalty=RIDGE_PENALTY):
+        """ Trains a model on a list of examples from a ScoreLog. Returns None if there are too few. """
+        examples = examples[-MAX_TRAINING_EXAMPLES:]
+        if len(examples) < folds:
+            return None
+        rows = [extract_features(example["text"], example["category"]) for example in examples]
+        targets = np.array([example["uscore"] for example in examples])
+        bias = float(targets.mean())
+        x = to_matrix(rows)
+        y = targets - bias
+        fold_of = np.arange(len(examples)) % folds
+
+        # Solve each regression from the totals, minus the contribution of the fold it leaves out
+        gram = x.T @ x
+        moment = x.T @ y
+        identity = penalty * np.eye(x.shape[1])
+        weights = np.empty((folds, x.shape[1]))
+        squared_error = 0.0
+        for fold in range(folds):
+            held_out = fold_of == fold
+            x_fold = x[held_out]
+            weights[fold] = np.linalg.solve(gram - x_fold.T @ x_fold + identity, moment - x_fold.T @ y[held_out])
+            residuals = x_fold @ weights[fold] - y[held_out]
+            squared_error = squared_error + float(np.dot(residuals, residuals))
+        return LocalModel(weights, bias, np.diag(gram) > 0.0, np.sqrt(squared_error / len(examples)))
+
+    def predict(self, text, category):
+        """ Returns (uscore, uncertainty) for an email's text and category. """
+        indices, values = extract_features(text, category)
+        predictions = self.weights[:, indices] @ values + self.bias
+        uscore = float(np.clip(predictions.mean(), MIN_USCORE, MAX_USCORE))
+        words = values[:-1] # leave out the category feature
+        coverage = words[self.seen[indices[:-1]]].sum() / words.sum() if len(words) else 0.0
+        if coverage < MIN_COVERAGE:
+            return uscore, MAX_USCORE - MIN_USCORE
+        spread = (len(predictions) - 1) * predictions.var() # the jackknife variance of the prediction
+        return uscore, float(np.sqrt(spread + self.error ** 2))
+
+    def save(self, file_name=MODEL_FILE_NAME):
+        """ Saves the model to a file. """
+        with open(file_name, 'wb') as file:
+            np.savez(file, weights=self.weights, bias=self.bias, seen=self.seen, error=self.error, n_features=N_FEATURES)
+
+    @staticmethod
+    def load(file_name=MODEL_FILE_NAME):
+        """ Loads a model saved by save. Returns None if there is no model, or it used different features. """
+        if not os.path.exists(file_name):
+            return None
+        with np.load(file_name) as data:
+            if int(data["n_features"]) != N_FEATURES:
+                return None
+            return LocalModel(data["weights"], float(data["bias"]), data["seen"], float(data["error"]))
+
+    @staticmethod
+    def evaluate(examples, max_uncertainty=DEFAULT_MAX_UNCERTAINTY, folds=N_FOLDS):
+        """ Trains a model on most of the examples and tests it against the Llama3 uscores of the rest (one
+         email in folds, chosen by its key so the split is the same every time). Returns a dictionary with
+         the Spearman rank correlation, the mean absolute error, and the share of emails hybrid mode would
+         score locally (with the correlation on just those emails). Returns None if there are too few. """
+        held_out = []
+        training = []
+        for example in examples:
+            key = ScoreLog.make_key(example["text"], example["category"])
+            (held_out if int(key, 16) % folds == 0 else training).append(example)
+        model = LocalModel.train(training, folds)
+        if model is None or len(held_out) < 2:
+            return None
+
+        actual = np.array([example["uscore"] for example in held_out])
+        predicted = []
+        uncertainties = []
+        for example in held_out:
+            uscore, uncertainty = model.predict(example["text"], example["category"])
+            predicted.append(uscore)
+            uncertainties.append(uncertainty)
+        predicted = np.array(predicted)
+        confident = np.array(uncertainties) <= max_uncertainty
+        return {"training_examples": len(training), "held_out_examples": len(held_out),
+                "spearman": spearman(predicted, actual), "mean_absolute_error": float(np.abs(predicted - actual).mean()),
+                "hybrid_local_share": float(confident.mean()),
+                "hybrid_local_spearman": spearman(predicted[confident], actual[confident]) if confident.sum() >= 2 else None}
+
+
+class LocalScorer:
+
+    """ Decides which emails are scored by the LocalModel and which by Llama3, and logs every Llama3 uscore
+     to the ScoreLog. In "llm" mode every email goes to Llama3; in "local" mode the model scores every
+     email (while there is a trained model); in "hybrid" mode the model only scores the emails it is
+     sure about (uncertainty at most max_uncertainty). Safe to share between threads. """
+
+    def __init__(self, mode="llm", model=None, score_log=None, max_uncertainty=DEFAULT_MAX_UNCERTAINTY):
+        """ Creates a new LocalScorer. model may be None (nothing is scored locally), and so may score_log
+         (nothing is logged). """
+        self.mode = mode
+        self.model = model
+        self.score_log = score_log
+        self.max_uncertainty = max_uncertainty
+        self.local_scored = 0 # the number of emails scored by the model
+        self.lock = threading.Lock()
+
+    def score(self, email, category):
+        """ Returns the model's base uscore for an email, or None if it should be scored by Llama3. """
+        if self.mode == "llm" or self.model is None:
+            return None
+        uscore, uncertainty = self.model.predict(email_text(email), category)
+        if self.mode == "hybrid" and uncertainty > self.max_uncertainty:
+            return None
+        with self.lock:
+            self.local_scored = self.local_scored + 1
+        return uscore
+
+    def record(self, email, category, uscore):
+        """ Logs the base uscore Llama3 gave an email (before any keyword modifier). """
+        if self.score_log is not None:
+            self.score_log.add(email, category, uscore)
@@ -0,0 +1,177 @@
+# Run instrumentation: stage times, LLM latency, retries, tokens, cache hits and cost
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Constants
+PROMPT_TOKEN_PRICE = 0.05 / 1000000 # USD per prompt token (Groq's price for llama3-8b-8192)
+COMPLETION_TOKEN_PRICE = 0.08 / 1000000 # USD per completion token
+LATENCY_QUANTILES = [0.5, 0.9, 0.99] # the LLM latency percentiles reported
+MAX_TRACE_EVENTS = 200000 # trace events past this are dropped, so a huge run cannot use unbounded memory
+
+def percentile(sorted_values, quantile):
+    """ Returns the nearest-rank percentile of a sorted list (None if it is empty). """
+    if not sorted_values:
+        return None
+    rank = math.ceil(round(quantile * len(sorted_values), 9)) # rounded first, so 0.95 * 20 is rank 19, not 20
+    index = min(len(sorted_values) - 1, max(0, rank - 1))
+    return sorted_values[index]
+
+
+class Metrics:
+
+    """ Collects the measurements of one run: the wall time of each stage, the latency, token usage and
+     retries of every LLM request, cache hits, and a trace of timed spans which can be exported in the
+     Chrome trace event format (for chrome://tracing or Perfetto). Safe to share between threads.
+
+     Metrics.active is the collector the instrumented code records to; toneRank_main replaces it with a
+     fresh one at the start of each run. """
+
+    active = None # the collector in use (set below)
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {} # stage name -> seconds (summed if a stage runs more than once)
+        self.counters = {} # counter name -> value
+        self.llm_latencies = [] # seconds per successful LLM request
+        self.trace_events = []
+        self.lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        """ Adds amount to a counter. """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def _trace(self, name, category, start, seconds, args=None):
+        """ Adds a complete ("X") trace event. Must not hold the lock. """
+        event = {"name": name, "cat": category, "ph": "X", "ts": (start - self.start) * 1e6, "dur": seconds * 1e6,
+                 "pid": os.getpid(), "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        with self.lock:
+            if len(self.trace_events) < MAX_TRACE_EVENTS:
+                self.trace_events.append(event)
+
+    @contextmanager
+    def span(self, name, category="span", args=None):
+        """ Context manager which adds a trace event covering its body. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._trace(name, category, start, time.perf_counter() - start, args)
+
+    @contextmanager
+    def stage(self, name):
+        """ Context manager which adds the wall time of its body to a stage (and a trace event). """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self._trace(name, "stage", start, seconds)
+
+    def record_llm_request(self, start, seconds, prompt_tokens=0, completion_tokens=0):
+        """ Records a successful LLM request which started at start (a perf_counter time). """
+        with self.lock:
+            self.llm_latencies.append(seconds)
+            self.counters["llm_requests"] = self.counters.get("llm_requests", 0) + 1
+            self.counters["prompt_tokens"] = self.counters.get("prompt_tokens", 0) + prompt_tokens
+            self.counters["completion_tokens"] = self.counters.get("completion_tokens", 0) + completion_tokens
+        self._trace("llm_request", "llm", start, seconds, {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+
+    def record_sleep(self, name, seconds):
+        """ Sleeps for a number of seconds, counting it (and the retry it precedes) under name. """
+        start = time.perf_counter()
+        time.sleep(seconds)
+        self.count(name + "_retries")
+        self.count(name + "_sleep_seconds", seconds)
+        self._trace(name + "_backoff", "retry", start, time.perf_counter() - start)
+
+    def estimated_cost(self):
+        """ Returns the estimated cost (in USD) of the tokens used so far. """
+        return self.counters.get("prompt_tokens", 0) * PROMPT_TOKEN_PRICE + \
+            self.counters.get("completion_tokens", 0) * COMPLETION_TOKEN_PRICE
+
+    def to_dict(self):
+        """ Returns every measurement as a dictionary (the JSON export). """
+        with self.lock:
+            latencies = sorted(self.llm_latencies)
+            stages = dict(self.stages)
+            counters = dict(self.counters)
+        cache_lookups = counters.get("cache_hits", 0) + counters.get("cache_misses", 0)
+        return {"wall_seconds": time.perf_counter() - self.start, "stages": stages, "counters": counters,
+                "llm_latency_seconds": dict({f"p{int(q * 100)}": percentile(latencies, q) for q in LATENCY_QUANTILES},
+                                            max=latencies[-1] if latencies else None, count=len(latencies),
+                                            total=sum(latencies)),
+                "cache_hit_rate": counters.get("cache_hits", 0) / cache_lookups if cache_lookups else None,
+                "estimated_cost_usd": self.estimated_cost()}
+
+    def summary(self):
+        """ Returns the run summary as a list of lines. """
+        data = self.to_dict()
+        counters = data["counters"]
+        latency = data["llm_latency_seconds"]
+        lines = [f"Run time: {data['wall_seconds']:.2f}s (" +
+                 ", ".join(f"{name} {seconds:.2f}s" for name, seconds in data["stages"].items()) + ")"]
+        if latency["count"]:
+            lines.append(f"LLM requests: {latency['count']}, latency p50 {latency['p50'] * 1000:.0f}ms, "
+                         f"p90 {latency['p90'] * 1000:.0f}ms, p99 {latency['p99'] * 1000:.0f}ms, "
+                         f"max {latency['max'] * 1000:.0f}ms")
+        lines.append(f"LLM retries: {counters.get('llm_retries', 0)} ({counters.get('llm_sleep_seconds', 0):.1f}s asleep), "
+                     f"rate limited: {counters.get('llm_rate_limited', 0)}, failed: {counters.get('llm_failures', 0)}")
+        if counters.get("gmail_retries"):
+            lines.append(f"Gmail retries: {counters['gmail_retries']} ({counters['gmail_sleep_seconds']:.1f}s asleep)")
+        lines.append(f"Tokens: {counters.get('prompt_tokens', 0)} prompt, {counters.get('completion_tokens', 0)} completion "
+                     f"(estimated cost ${data['estimated_cost_usd']:.4f})")
+        if data["cache_hit_rate"] is not None:
+            lines.append(f"Cache hit rate: {100 * data['cache_hit_rate']:.1f}% "
+                         f"({counters.get('cache_hits', 0)} of {counters.get('cache_hits', 0) + counters.get('cache_misses', 0)})")
+        return lines
+
+    def to_prometheus(self):
+        """ Returns every measurement in the Prometheus text exposition format. """
+        data = self.to_dict()
+        counters = data["counters"]
+        latency = data["llm_latency_seconds"]
+        lines = ["# HELP tonerank_stage_seconds Wall time spent in each stage of the run.",
+                 "# TYPE tonerank_stage_seconds gauge"]
+        lines.extend(f'tonerank_stage_seconds{{stage="{name}"}} {seconds}' for name, seconds in data["stages"].items())
+        lines.extend(["# HELP tonerank_llm_latency_seconds Latency of successful LLM requests.",
+                      "# TYPE tonerank_llm_latency_seconds summary"])
+        for q in LATENCY_QUANTILES:
+            value = latency[f"p{int(q * 100)}"]
+            lines.append(f'tonerank_llm_latency_seconds{{quantile="{q}"}} {"NaN" if value is None else value}')
+        lines.append(f"tonerank_llm_latency_seconds_sum {latency['total']}")
+        lines.append(f"tonerank_llm_latency_seconds_count {latency['count']}")
+        for name, value in sorted(counters.items()):
+            metric = f"tonerank_{name}_total"
+            lines.extend([f"# TYPE {metric} counter", f"{metric} {value}"])
+        lines.extend(["# TYPE tonerank_estimated_cost_usd gauge", f"tonerank_estimated_cost_usd {data['estimated_cost_usd']}"])
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, file_name):
+        with open(file_name, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def write_prometheus(self, file_name):
+        with open(file_name, 'w', encoding='utf-8') as file:
+            file.write(self.to_prometheus())
+
+    def write_trace(self, file_name):
+        """ Writes the trace events in the Chrome trace event format. """
+        with self.lock:
+            events = list(self.trace_events)
+        with open(file_name, 'w', encoding='utf-8') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+Metrics.active = Metrics()
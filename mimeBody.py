@@ -0,0 +1,127 @@
+# Picks and decodes the text body of a Gmail message payload (its MIME tree), within a size cap
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import base64
+import binascii
+import re
+from preprocess import html_to_text
+
+# Constants
+MAX_BODY_BYTES = 64 * 1024 # the most bytes of body text kept from each message
+HTML_EXPANSION = 4 # how much more of an HTML part is decoded, since most of it is markup which html_to_text drops
+MAX_DEPTH = 16 # how deep the walk goes into nested multiparts (real mail rarely nests more than 4 deep)
+SNIPPET_BYTES = 200 # about the length of the snippet Gmail sends with every message
+DEFAULT_CHARSET = "utf-8" # used when a part does not declare its charset (a superset of the us-ascii default)
+CHARSET_PATTERN = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+
+
+def header_value(part, name):
+    """ Returns the value of the (lowercase) named header of a MIME part, or "" if it has none. """
+    for header in part.get('headers', []):
+        if header['name'].lower() == name:
+            return header['value']
+    return ""
+
+def part_charset(part):
+    """ Returns the charset a MIME part declares in its Content-Type header, or DEFAULT_CHARSET. """
+    match = CHARSET_PATTERN.search(header_value(part, "content-type"))
+    return match.group(1).strip("'").lower() if match else DEFAULT_CHARSET
+
+def is_attachment(part):
+    """ Returns True if a MIME part is an attachment (it has a file name, or says so in its disposition). """
+    if part.get('filename'):
+        return True
+    return header_value(part, "content-disposition").lstrip().lower().startswith("attachment")
+
+def walk_parts(payload):
+    """ Yields the leaf parts of a payload which are not attachments, in the order they appear. Attached
+     files (and anything nested inside them, like a forwarded .eml) are skipped without being looked at. """
+    stack = [(payload, 0)]
+    while stack:
+        part, depth = stack.pop()
+        if is_attachment(part):
+            continue
+        children = part.get('parts')
+        if children:
+            if depth < MAX_DEPTH:
+                stack.extend((child, depth + 1) for child in reversed(children)) # so the first child is next
+        else:
+            yield part
+
+def has_body(part):
+    """ Returns True if a leaf part has any content (inline, or stored separately by Gmail). """
+    body = part.get('body', {})
+    return bool(body.get('data') or body.get('attachmentId'))
+
+def needs_fetch(part):
+    """ Returns True if Gmail stored a part's content separately, so it must be fetched by attachmentId. """
+    body = part.get('body', {})
+    return not body.get('data') and bool(body.get('attachmentId'))
+
+def choose_body_part(payload):
+    """ Returns (part, is_html) for the part of a payload which best holds its body: the first non-empty
+     text/plain part, or else the first non-empty text/html part. Returns (None, False) if there is neither. """
+    html_part = None
+    for part in walk_parts(payload):
+        mime_type = part.get('mimeType', "").lower()
+        if not has_body(part):
+            continue
+        if mime_type == "text/plain":
+            return part, False
+        if mime_type == "text/html" and html_part is None:
+            html_part = part
+    return (html_part, True) if html_part is not None else (None, False)
+
+def trim_partial_character(raw):
+    """ Drops a UTF-8 character cut off at the end of raw (so a truncated body does not end in U+FFFD). """
+    end = len(raw) - 1
+    continuation = 0
+    while end >= 0 and continuation < 3 and raw[end] & 0xC0 == 0x80:
+        end = end - 1
+        continuation = continuation + 1
+    if end >= 0 and raw[end] >= 0xC0:
+        length = 2 if raw[end] < 0xE0 else 3 if raw[end] < 0xF0 else 4
+        if continuation + 1 < length:
+            return raw[:end]
+    return raw
+
+def decode_data(data, max_bytes, charset=DEFAULT_CHARSET):
+    """ Decodes at most max_bytes of a part's base64url data. Only the base64 needed is decoded, so a huge
+     part costs no more than a small one. Returns (raw bytes, True if the part was cut short). """
+    limit = (max_bytes + 2) // 3 * 4 # the base64 characters holding max_bytes bytes
+    truncated = len(data) > limit
+    data = data[:limit]
+    try:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (binascii.Error, ValueError):
+        return b"", False # not valid base64, so the part is treated as empty
+    if len(raw) > max_bytes:
+        raw = raw[:max_bytes]
+        truncated = True
+    if truncated and charset.replace("-", "").replace("_", "") == "utf8":
+        raw = trim_partial_character(raw)
+    return raw, truncated
+
+def extract_body(payload, max_bytes=MAX_BODY_BYTES):
+    """ Returns (body, charset, truncated) for a Gmail message payload. The body is the raw bytes of its
+     best text/plain part (in that part's charset), or the text of its best text/html part if it has no
+     plain text, cut to max_bytes either way. Parts Gmail stored separately must have been fetched into
+     their body's data first (see needs_fetch); until then they count as empty. """
+    part, is_html = choose_body_part(payload)
+    if part is None or not part.get('body', {}).get('data'):
+        return b"", DEFAULT_CHARSET, False
+    charset = part_charset(part)
+    if not is_html:
+        raw, truncated = decode_data(part['body']['data'], max_bytes, charset)
+        return raw, charset, truncated
+    raw, truncated = decode_data(part['body']['data'], max_bytes * HTML_EXPANSION, charset)
+    try:
+        markup = raw.decode(charset, errors="replace")
+    except LookupError: # an unknown charset
+        markup = raw.decode(DEFAULT_CHARSET, errors="replace")
+    text = html_to_text(markup)
+    if len(text) > max_bytes:
+        text = text[:max_bytes]
+        truncated = True
+    return text, DEFAULT_CHARSET, truncated
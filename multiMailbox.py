@@ -0,0 +1,124 @@
+# Runs ToneRank for many mailboxes at once, one process per mailbox, sharing a rate limiter and the response cache
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import contextlib
+import dataclasses
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.managers import BaseManager
+from gmailPipe import GmailPipe
+from llm import RateLimiter, REQUESTS_PER_MINUTE, MAX_IN_FLIGHT, LOG_FILE_NAME, LOG_FORMAT
+from metrics import Metrics
+from responseCache import CACHE_FILE_NAME
+from toneRank_io import ToneRank_IO
+
+# Constants
+PROFILES_DIR = "profiles" # the default directory holding one directory per mailbox profile
+TOKEN_FILE_NAME = "token.json" # a profile's Gmail credentials (a directory without one is not a profile)
+OUTPUT_FILE_NAME = "last_run.txt" # the priority report and metrics printed by a profile's last run
+DEFAULT_PROFILE_WORKERS = 8 # the default number of mailboxes run at once (each mostly waits on the network)
+
+
+class _LimiterManager(BaseManager):
+
+    """ Serves one RateLimiter to every worker process. """
+
+_LimiterManager.register("RateLimiter", RateLimiter)
+
+
+class SharedRateLimiter:
+
+    """ A RateLimiter served by another process, with the same interface, so every mailbox shares one
+     request rate and one cap on requests in flight (and a 429 seen by one backs them all off). Headers
+     are copied into plain dictionaries, as they are sent between processes. """
+
+    def __init__(self, proxy, max_in_flight=MAX_IN_FLIGHT):
+        """ Wraps a proxy for the shared RateLimiter. max_in_flight is the number of requests this process
+         keeps in flight (its share of the shared limiter's cap). """
+        self.proxy = proxy
+        self.max_in_flight = max_in_flight
+
+    def acquire(self):
+        self.proxy.acquire()
+
+    def release(self, success=True):
+        self.proxy.release(success)
+
+    @contextlib.contextmanager
+    def slot(self):
+        """ Context manager which holds a token and in-flight slot for the duration of one request. """
+        self.acquire()
+        success = False
+        try:
+            yield
+            success = True
+        finally:
+            self.release(success)
+
+    def update_from_headers(self, headers):
+        self.proxy.update_from_headers({name.lower(): value for name, value in headers.items()})
+
+    def on_rate_limited(self, headers=None):
+        self.proxy.on_rate_limited(None if headers is None else {name.lower(): value for name, value in headers.items()})
+
+
+def find_profiles(profiles_dir=PROFILES_DIR):
+    """ Returns the directories in profiles_dir which hold a profile (a TOKEN_FILE_NAME), sorted by name. """
+    if not os.path.isdir(profiles_dir):
+        return []
+    return sorted(os.path.join(profiles_dir, name) for name in os.listdir(profiles_dir)
+                  if os.path.isfile(os.path.join(profiles_dir, name, TOKEN_FILE_NAME)))
+
+def run_profile(profile_dir, run, options, limiter, max_in_flight, cache_file, max_body_bytes, prepare=None):
+    """ Runs ToneRank for one profile in a worker process: run(options, rate_limiter=...), with the RunOptions'
+     cache_file replaced by the shared cache_file, inside the profile's directory, so its credentials, state store (whitelist, keywords and report
+     settings), sync state, histories and logs are its own, with what it prints written to
+     OUTPUT_FILE_NAME there. prepare(profile_dir), if given, is called first (e.g. to set up fake
+     backends). Returns a summary of the run. """
+    started = time.perf_counter()
+    os.chdir(profile_dir)
+    GmailPipe.service = None # connect with this profile's credentials (a worker may have run another profile)
+    GmailPipe.max_body_bytes = max_body_bytes
+    if prepare is not None:
+        prepare(profile_dir)
+    ToneRank_IO.active = ToneRank_IO()
+    Metrics.active = Metrics()
+    # logging.basicConfig only configures a process once, so the profile's own log replaces whichever one the
+    # worker (or the process it was forked from) set up before
+    log_handler = logging.FileHandler(LOG_FILE_NAME)
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, handlers=[log_handler, logging.StreamHandler()], force=True)
+    error = None
+    try:
+        with open(OUTPUT_FILE_NAME, 'w', encoding='utf-8') as output, contextlib.redirect_stdout(output):
+            ToneRank_IO.active.load_remote_data()
+            run(dataclasses.replace(options, cache_file=cache_file), rate_limiter=SharedRateLimiter(limiter, max_in_flight))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        ToneRank_IO.active.save_local_data()
+        logging.getLogger().removeHandler(log_handler)
+        log_handler.close()
+    counters = Metrics.active.counters
+    return {"profile": os.path.basename(profile_dir), "seconds": time.perf_counter() - started,
+            "llm_requests": counters.get("llm_requests", 0), "cache_hits": counters.get("cache_hits", 0),
+            "error": error}
+
+def run_profiles(profile_dirs, run, options, workers=DEFAULT_PROFILE_WORKERS, cache_file=CACHE_FILE_NAME,
+                 requests_per_minute=REQUESTS_PER_MINUTE, max_in_flight=MAX_IN_FLIGHT, prepare=None):
+    """ Runs ToneRank for every profile directory at once, up to workers at a time, each in its own process
+     (see run_profile). Every profile shares one RateLimiter, served by a manager process, and one response
+     cache (cache_file). Each process keeps up to max_in_flight requests going, and the shared limiter
+     allows that many per worker in total, backing every process off together when Groq's rate-limit
+     headers or a 429 say so. Yields the summary of each run as it finishes. """
+    cache_file = os.path.abspath(cache_file) # the workers run inside their profiles' directories
+    workers = max(1, min(workers, len(profile_dirs)))
+    with _LimiterManager() as manager:
+        limiter = manager.RateLimiter(requests_per_minute, max_in_flight * workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_profile, os.path.abspath(profile_dir), run, options, limiter, max_in_flight,
+                                       cache_file, GmailPipe.max_body_bytes, prepare) for profile_dir in profile_dirs]
+            for future in as_completed(futures):
+                yield future.result()
@@ -1,28 +1,111 @@
 # Data utility class for storing emails
 # @author Rylan Ahmadi (Ry305)
-# Last updated 07/06/2025
+# Last updated 10/18/2026
 
+from functools import total_ordering
+from bodyStore import SpilledBody
+
+@total_ordering
 class Email:
     """ Represents an email and all of its fields.
-        fields: subject, sender, date, body """
-    
-    def __init__(self, subject, sender, date, body):
+        fields: subject, sender, date, body, msg_id, internal_date, headers, thread_id
+     Emails are ordered by urgency: a < b when a has the higher uscore, so sorting a list of emails puts
+     the most urgent first. Emails with the same uscore compare equal. """
+
+    # Fixed attributes (no per-email __dict__), which keeps tens of thousands of emails small
+    __slots__ = ("subject", "sender", "date", "_body", "_raw_body", "charset", "msg_id", "internal_date", "headers",
+                 "thread_id", "message_count", "thread_context", "uscore", "tokens_saved", "estimated", "fingerprint")
+
+    body_store = None # the BodyStore large bodies are spilled to (None keeps every body in memory)
+
+    def __init__(self, subject, sender, date, body, msg_id=None, internal_date=0, headers=None, thread_id=None,
+                 charset="utf-8"):
         """ Creates a new email object with specified parameters. Urgency score (uscore) is instantiated
-         at -1. """
+         at -1. The body may be text, or the raw bytes of the body in the specified charset (decoded the
+         first time it is read). msg_id is the Gmail message id and internal_date the time Gmail received
+         the message (in milliseconds since the epoch), if known. headers holds any extra headers kept from
+         the message (lowercase names), and thread_id the Gmail thread the message belongs to. If the email
+         stands for a whole thread, message_count is the number of messages in it and thread_context a
+         condensed summary of the earlier ones. """
         self.subject = subject
         self.sender = sender
         self.date = date
+        self.charset = charset
         self.body = body
+        self.msg_id = msg_id
+        self.internal_date = internal_date
+        self.headers = headers if headers is not None else {}
+        self.thread_id = thread_id
+        self.message_count = 1
+        self.thread_context = ""
         self.uscore = -1.0 # the urgency score will be set later, in toneRank
+        self.tokens_saved = 0 # the estimated tokens removed from the body by preprocessing
+        self.estimated = False # True if the uscore is a local estimate, because the scoring budget ran out
+        self.fingerprint = None # the SimHash of the subject and body, once nearDuplicates has needed it
+
+    @property
+    def body(self):
+        """ The text of the body. Raw bodies are decoded on first access (and kept decoded, unless they
+         were spilled to the body store, where they stay). """
+        body = self._body
+        if body is None:
+            raw = self._raw_body
+            spilled = raw.__class__ is SpilledBody
+            data = raw.read() if spilled else raw
+            try:
+                body = data.decode(self.charset, errors="replace")
+            except LookupError: # an unknown charset
+                body = data.decode("utf-8", errors="replace")
+            if not spilled:
+                self._body = body
+                self._raw_body = None
+        return body
+
+    @body.setter
+    def body(self, body):
+        """ Sets the body, as text or as raw bytes in the email's charset. Bodies over the body store's
+         threshold are spilled to it (if there is one). """
+        store = Email.body_store
+        self.fingerprint = None # computed again from the new body if it is needed
+        if isinstance(body, str):
+            if store is None or len(body) <= store.threshold:
+                self._body = body
+                self._raw_body = None
+                return
+            body = body.encode("utf-8")
+            self.charset = "utf-8"
+        self._body = None
+        self._raw_body = store.put(body) if store is not None and len(body) > store.threshold else body
+
+    def to_dict(self):
+        """ Returns the fields of the email as a dictionary (used to store emails locally). """
+        return {"subject": self.subject, "sender": self.sender, "date": self.date, "body": self.body,
+                "msg_id": self.msg_id, "internal_date": self.internal_date, "headers": self.headers,
+                "thread_id": self.thread_id, "message_count": self.message_count, "thread_context": self.thread_context}
+
+    @staticmethod
+    def from_dict(data):
+        """ Creates an email from a dictionary made by to_dict. """
+        email = Email(data["subject"], data["sender"], data["date"], data["body"], data.get("msg_id"),
+                      data.get("internal_date", 0), data.get("headers"), data.get("thread_id"))
+        email.message_count = data.get("message_count", 1)
+        email.thread_context = data.get("thread_context", "")
+        return email
 
     def __repr__(self):
-        return f"{self.sender}: {self.subject!r} | uscore: {self.uscore!r}"
-    
+        thread = f" ({self.message_count} messages)" if self.message_count > 1 else ""
+        if self.estimated:
+            return f"{self.sender}: {self.subject!r}{thread} | uscore: ~{self.uscore!r} (not scored)"
+        return f"{self.sender}: {self.subject!r}{thread} | uscore: {self.uscore!r}"
+
     def __eq__(self, other):
+        if not isinstance(other, Email):
+            return NotImplemented
         return self.uscore == other.uscore
-    
-    def __gt__(self, other):
-        return self.uscore < other.uscore
-    
+
     def __lt__(self, other):
+        if not isinstance(other, Email):
+            return NotImplemented
         return self.uscore > other.uscore
+
+    __hash__ = None # equal emails (by uscore) are not the same email, so emails cannot be dict keys or set members
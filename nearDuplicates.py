@@ -0,0 +1,152 @@
+# SimHash index which lets near-identical emails (alerts, notifications, mail merges) share one score
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from lazyImport import lazy_import
+from domainClassifier import sender_address
+
+np = lazy_import("numpy") # numpy is only loaded once a model or fingerprint is needed
+
+# Constants
+HISTORY_FILE_NAME = "score_history.json" # the fingerprints and uscores kept between runs
+DEFAULT_MAX_DISTANCE = 3 # the max number of differing fingerprint bits for two emails to count as near-duplicates
+MAX_DISTANCE_LIMIT = 15 # the largest max distance the index supports
+MIN_WORDS = 8 # emails shorter than this are too short to fingerprint reliably
+HISTORY_TTL = 7 * 24 * 60 * 60 # the number of seconds a stored score is reused for
+MAX_HISTORY_SIZE = 20000 # the max number of scores kept in the history (the oldest are dropped first)
+FINGERPRINT_BITS = 64
+NO_FINGERPRINT = -1 # kept in an email in place of the fingerprint it is too short to have
+
+WORD_PATTERN = re.compile(r"[a-z0-9#']+")
+NUMBER_PATTERN = re.compile(r"\d+") # numbers (order ids, counts, times) are what usually changes between copies
+
+
+def fingerprint(email):
+    """ Returns the 64-bit SimHash of an email's subject and body, or None if it is too short. Numbers are
+     masked, so copies which only differ in a figure or a date get the same fingerprint. """
+    text = NUMBER_PATTERN.sub("#", (email.subject + "\n" + email.body).lower())
+    words = WORD_PATTERN.findall(text)
+    if len(words) < MIN_WORDS:
+        return None
+    features = words + [a + " " + b for a, b in zip(words, words[1:])]
+    hashes = np.frombuffer(b"".join(hashlib.blake2b(feature.encode('UTF-8'), digest_size=8).digest()
+                                    for feature in features), dtype=np.uint8).reshape(len(features), 8)
+    votes = np.unpackbits(hashes, axis=1).sum(axis=0) * 2 > len(features) # each bit set by most features
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+def email_fingerprint(email):
+    """ Returns the fingerprint of an email (see fingerprint), computing it only the first time it is
+     needed and keeping it in the email until its body changes. """
+    if email.fingerprint is None:
+        fp = fingerprint(email)
+        email.fingerprint = NO_FINGERPRINT if fp is None else fp
+    return None if email.fingerprint == NO_FINGERPRINT else email.fingerprint
+
+def sender_key(email, category):
+    """ Returns who must have sent a near-duplicate of an email for it to share the email's score: anyone at
+     the sender's domain for a Category 1 (organisation) email, as one service often sends its alerts from
+     several addresses, or else the sender's own address (a public domain says nothing about the sender). """
+    address, domain = sender_address(email.sender)
+    return domain if category == 1 else address
+
+
+class NearDuplicateIndex:
+
+    """ Finds fingerprints within max_distance bits of one already stored. Fingerprints are split into
+     max_distance + 1 bands; two fingerprints within max_distance bits must agree on at least one whole
+     band, so only the entries sharing a band with the query are compared. Entries are only matched
+     within the same category, as each category is scored with a different prompt, and from the same
+     sender (see sender_key), so a score is never reused for another sender's email. Safe to share between
+     threads. """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, file_name=None):
+        """ Creates a new index. If file_name is given, the stored scores are loaded from it, and save()
+         writes them back; otherwise the index only lasts for this run. """
+        if not 0 <= max_distance <= MAX_DISTANCE_LIMIT:
+            raise ValueError(f"max_distance must be from 0 to {MAX_DISTANCE_LIMIT}")
+        self.max_distance = max_distance
+        self.file_name = file_name
+        bands = max_distance + 1
+        self.band_bits = [FINGERPRINT_BITS // bands + (1 if i < FINGERPRINT_BITS % bands else 0) for i in range(bands)]
+        self.buckets = {} # (category, sender, band, band value) -> list of entries
+        self.entries = [] # [fingerprint, category, sender, value, time stored]
+        self.reused = 0 # the number of emails which reused a stored score
+        self.lock = threading.Lock()
+        if file_name is not None and os.path.exists(file_name):
+            self._load()
+
+    def _band_keys(self, fp, category, sender):
+        """ Returns the bucket key of each band of a fingerprint. """
+        keys = []
+        shift = 0
+        for band, bits in enumerate(self.band_bits):
+            keys.append((category, sender, band, (fp >> shift) & ((1 << bits) - 1)))
+            shift = shift + bits
+        return keys
+
+    def _insert(self, entry):
+        self.entries.append(entry)
+        for key in self._band_keys(entry[0], entry[1], entry[2]):
+            self.buckets.setdefault(key, []).append(entry)
+
+    def find(self, fp, category, sender):
+        """ Returns the value stored for the nearest fingerprint within max_distance bits (in the same
+         category, from the same sender), or None. """
+        if fp is None:
+            return None
+        best = None
+        with self.lock:
+            for key in self._band_keys(fp, category, sender):
+                for entry in self.buckets.get(key, []):
+                    distance = bin(entry[0] ^ fp).count("1")
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, entry[3])
+        return None if best is None else best[1]
+
+    def add(self, fp, category, sender, value):
+        """ Stores a value (e.g. a uscore) for a fingerprint. """
+        if fp is not None:
+            with self.lock:
+                self._insert([fp, category, sender, value, time.time()])
+
+    def reuse(self, email, category):
+        """ Returns the stored uscore of a near-duplicate of an email, or None. Counts every reuse. """
+        uscore = self.find(email_fingerprint(email), category, sender_key(email, category))
+        if uscore is not None:
+            with self.lock:
+                self.reused = self.reused + 1
+        return uscore
+
+    def remember(self, email, category, uscore):
+        """ Stores the uscore of an email, for its near-duplicates to reuse. """
+        self.add(email_fingerprint(email), category, sender_key(email, category), uscore)
+
+    def _load(self):
+        """ Loads the stored scores which have not expired. A corrupt file is ignored, and so are scores
+         stored by earlier versions, which did not keep the sender. """
+        try:
+            with open(self.file_name, 'r', encoding='utf-8') as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+        cutoff = time.time() - HISTORY_TTL
+        for entry in entries[-MAX_HISTORY_SIZE:]:
+            if len(entry) == 5 and entry[4] >= cutoff:
+                self._insert(entry)
+
+    def save(self):
+        """ Writes the newest MAX_HISTORY_SIZE scores to the history file, replacing it atomically. """
+        if self.file_name is None:
+            return
+        with self.lock:
+            entries = self.entries[-MAX_HISTORY_SIZE:]
+        temp_file_name = self.file_name + ".tmp"
+        with open(temp_file_name, 'w', encoding='utf-8') as file:
+            json.dump(entries, file)
+        os.replace(temp_file_name, self.file_name)
@@ -0,0 +1,115 @@
+# Streaming fetch -> categorise -> score -> rank pipeline
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import heapq
+import queue
+import threading
+from ranking import Ranking, rank_key
+
+# Constants
+QUEUE_DEPTH = 32 # the max number of emails waiting between two stages (a full queue blocks the stage before it)
+
+class StreamingPipeline:
+
+    """ Runs the fetch, categorise, score and rank stages at the same time, connected by bounded queues.
+     Scoring starts as soon as the first batch of emails arrives, and a slow stage applies backpressure to
+     the stages before it, so the number of emails in flight is limited by the queue depth rather than the
+     size of the inbox. Once scored, only the bodies of the emails which may still be needed for the
+     to-do list are kept. """
+
+    END = object() # marks the end of a stream
+
+    def __init__(self, categorise, score, workers, keep_bodies, queue_depth=QUEUE_DEPTH):
+        """ Creates a new pipeline. categorise(email) returns an email's category (0, 1 or 2), and
+         score(email, category) sets its uscore and returns True if it contains keywords. workers is the
+         number of emails scored at once, and keep_bodies the number of top-ranked bodies kept. """
+        self.categorise = categorise
+        self.score = score
+        self.workers = workers
+        self.keep_bodies = keep_bodies
+        self.fetched = queue.Queue(maxsize=queue_depth) # fetched emails waiting to be categorised
+        self.categorised = queue.Queue(maxsize=queue_depth) # categorised emails waiting to be scored
+        self.scored = queue.Queue(maxsize=queue_depth) # scored emails waiting to be ranked
+        self.errors = [] # exceptions raised by the fetch and categorise stages
+
+    def _fetch_stage(self, stream):
+        """ Moves (position, email) pairs from the stream into the fetched queue. """
+        try:
+            for item in stream:
+                self.fetched.put(item)
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            self.fetched.put(StreamingPipeline.END)
+
+    def _categorise_stage(self):
+        """ Categorises each fetched email and passes it on to the scorers. """
+        try:
+            while True:
+                item = self.fetched.get()
+                if item is StreamingPipeline.END:
+                    break
+                position, email = item
+                self.categorised.put((position, email, self.categorise(email)))
+        except Exception as e:
+            self.errors.append(e)
+            while self.fetched.get() is not StreamingPipeline.END: # drain, so the fetch stage can finish
+                pass
+        finally:
+            for _ in range(self.workers): # one end marker for each scorer
+                self.categorised.put(StreamingPipeline.END)
+
+    def _score_stage(self):
+        """ Scores categorised emails until the end marker arrives. Failures are passed on to be flagged. """
+        while True:
+            item = self.categorised.get()
+            if item is StreamingPipeline.END:
+                self.scored.put(StreamingPipeline.END)
+                return
+            position, email, category = item
+            try:
+                has_keywords = self.score(email, category)
+                self.scored.put((position, email, category, has_keywords, None))
+            except Exception as e:
+                self.scored.put((position, email, category, False, e))
+
+    def run(self, stream):
+        """ Runs the pipeline over a stream of (position, email) pairs. Returns (emails_ranked, flagged_emails),
+         where emails_ranked is a Ranking in the same order as the batch path: category 0 with keywords,
+         category 0, category 1 with keywords, and so on, each by uscore (highest first) and then by position.
+         Emails enter the ranking as soon as they are scored. """
+        threads = [threading.Thread(target=self._fetch_stage, args=(stream,), daemon=True),
+                   threading.Thread(target=self._categorise_stage, daemon=True)]
+        threads.extend(threading.Thread(target=self._score_stage, daemon=True) for _ in range(self.workers))
+        for thread in threads:
+            thread.start()
+
+        ranked = Ranking()
+        flagged = [] # (position, email) pairs
+        best = [] # heap holding the keep_bodies best keys, worst on top (keys are negated)
+        finished = 0
+        while finished < self.workers:
+            item = self.scored.get()
+            if item is StreamingPipeline.END:
+                finished = finished + 1
+                continue
+            position, email, category, has_keywords, error = item
+            if error is not None:
+                email.body = "" # flagged emails are only listed by subject
+                flagged.append((position, email))
+                continue
+            ranked.add(email, category, has_keywords, position)
+            key = rank_key(category, has_keywords, email.uscore, position)
+            # Release the body of any email which can no longer make the to-do list sample
+            heapq.heappush(best, ((-key[0], email.uscore, -position), email))
+            if len(best) > self.keep_bodies:
+                heapq.heappop(best)[1].body = ""
+
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+        flagged.sort(key=lambda pair: pair[0])
+        return ranked, [email for _, email in flagged]
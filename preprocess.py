@@ -0,0 +1,135 @@
+# Cleans up email bodies before they are pasted into prompts
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import re
+import html
+from html.parser import HTMLParser
+from llm import estimate_tokens, CHARS_PER_TOKEN
+
+# Constants
+DEFAULT_BODY_TOKEN_BUDGET = 1000 # the max estimated number of tokens kept from each body
+TRUNCATION_MARKER = " [...]" # appended to a body which was cut to fit the budget
+
+# Lines which start a quoted reply chain (everything from here on is history)
+QUOTE_HEADER_PATTERNS = [
+    re.compile(r"^On .{0,200}wrote:\s*$", re.IGNORECASE | re.DOTALL), # Gmail / Apple Mail (may wrap over two lines)
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}", re.IGNORECASE), # Outlook / Yahoo
+    re.compile(r"^_{10,}\s*$"), # Outlook's separator line
+    re.compile(r"^From: .+\n(Sent|Date): ", re.IGNORECASE), # Outlook's quoted header block
+]
+
+# Lines which start a signature or a footer (everything from here on is dropped)
+SIGNATURE_PATTERNS = [
+    re.compile(r"^--\s*$"), # the standard signature delimiter
+    re.compile(r"^Sent from my \w+", re.IGNORECASE),
+    re.compile(r"^Get Outlook for \w+", re.IGNORECASE),
+    re.compile(r"^(CONFIDENTIALITY NOTICE|DISCLAIMER|LEGAL NOTICE)\b", re.IGNORECASE),
+    re.compile(r"^(This (e-?mail|message)( and any attachments)? (is|are|may be) (intended|confidential|privileged))", re.IGNORECASE),
+]
+
+
+class _TextExtractor(HTMLParser):
+
+    """ Collects the visible text of an HTML document, with line breaks at block elements. """
+
+    BLOCK_TAGS = {"p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "blockquote"}
+    SKIPPED_TAGS = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pieces = []
+        self.skipping = 0 # the depth of script/style elements we are inside
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _TextExtractor.SKIPPED_TAGS:
+            self.skipping = self.skipping + 1
+        elif tag in _TextExtractor.BLOCK_TAGS:
+            self.pieces.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _TextExtractor.SKIPPED_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in _TextExtractor.BLOCK_TAGS:
+            self.pieces.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.pieces.append(data)
+
+
+def html_to_text(body):
+    """ Converts an HTML body (the content of a text/html part) to plain text. """
+    extractor = _TextExtractor()
+    try:
+        extractor.feed(body)
+        extractor.close()
+    except Exception:
+        return html.unescape(re.sub(r"<[^>]*>", " ", body)) # Fall back to stripping the tags
+    return "".join(extractor.pieces)
+
+
+class Preprocessor:
+
+    """ Removes the parts of an email body which cost tokens without telling Llama3 anything about its
+     urgency: quoted reply chains, signatures, legal footers and extra whitespace. The result is then
+     truncated to a token budget. Bodies are expected as plain text (HTML parts are converted when they are
+     fetched, as only the MIME type can tell markup from text which merely looks like it). Preprocessing is
+     deterministic (the same body always produces the same text), so prompts, and therefore cache keys,
+     stay stable between runs. """
+
+    def __init__(self, token_budget=DEFAULT_BODY_TOKEN_BUDGET):
+        """ Creates a new Preprocessor which keeps at most token_budget (estimated) tokens of each body. """
+        self.token_budget = token_budget
+        self.tokens_before = 0 # the estimated tokens in every body before preprocessing
+        self.tokens_after = 0 # the estimated tokens in every body after preprocessing
+
+    @staticmethod
+    def _cut_at(lines, patterns):
+        """ Returns the lines before the first line (or pair of lines) matching one of the patterns. """
+        for i, line in enumerate(lines):
+            two_lines = line + "\n" + lines[i + 1] if i + 1 < len(lines) else line
+            for pattern in patterns:
+                if pattern.match(line) or pattern.match(two_lines):
+                    return lines[:i]
+        return lines
+
+    def clean(self, body):
+        """ Returns the cleaned and truncated version of a body. """
+        if body is None:
+            return ""
+        text = body.replace("\r\n", "\n").replace("\r", "\n")
+
+        lines = text.split("\n")
+        unquoted = Preprocessor._cut_at(lines, QUOTE_HEADER_PATTERNS) # Strip the quoted history
+        unquoted = [line for line in unquoted if not line.lstrip().startswith(">")] # and any inline quotes
+        if any(line.strip() for line in unquoted): # unless the email is nothing but a quote
+            lines = unquoted
+        lines = Preprocessor._cut_at(lines, SIGNATURE_PATTERNS) # Strip signatures and footers
+
+        # Collapse whitespace: single spaces within lines, and at most one blank line between paragraphs
+        text = "\n".join(re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in lines)
+        text = re.sub(r"\n{3,}", "\n\n", text).strip()
+
+        # Truncate to the token budget, at a word boundary where possible
+        if estimate_tokens(text) > self.token_budget:
+            limit = max(0, self.token_budget * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+            cut = text.rfind(" ", 0, limit + 1)
+            text = text[:cut if cut > limit // 2 else limit].rstrip() + TRUNCATION_MARKER
+        return text
+
+    def process(self, email):
+        """ Cleans an email's body in place. Returns the number of tokens saved (also stored in the email). """
+        before = estimate_tokens(email.body or "")
+        email.body = self.clean(email.body)
+        after = estimate_tokens(email.body)
+        self.tokens_before = self.tokens_before + before
+        self.tokens_after = self.tokens_after + after
+        email.tokens_saved = before - after
+        return email.tokens_saved
+
+    def summary(self):
+        """ Returns a one-line summary of the tokens saved so far. """
+        saved = self.tokens_before - self.tokens_after
+        percent = 100.0 * saved / self.tokens_before if self.tokens_before else 0.0
+        return f"Preprocessing saved {saved} of {self.tokens_before} body tokens ({percent:.1f}%)"
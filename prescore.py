@@ -0,0 +1,88 @@
+# Cheap local pre-scorer which lets obvious bulk mail skip the LLM
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import re
+import threading
+from domainClassifier import sender_address
+
+# Constants
+DEFAULT_THRESHOLD = 0.8 # the confidence needed before an email is scored locally
+LOW_USCORE = 0.0 # the uscore given to emails which are confidently bulk mail
+
+# The weight of each signal which marks an email as bulk or automated mail
+SIGNAL_WEIGHTS = {
+    "list-unsubscribe": 0.6, # mailing lists and marketing
+    "precedence": 0.6, # Precedence: bulk, list or junk
+    "auto-submitted": 0.5, # automatically generated messages (RFC 3834)
+    "list-id": 0.4, # mailing lists
+    "noreply": 0.6, # senders which cannot be replied to
+    "bulk-text": 0.3, # boilerplate found in newsletters and receipts
+}
+
+NOREPLY_PATTERN = re.compile(r"^(no[-_.]?reply|do[-_.]?not[-_.]?reply|notifications?|mailer-daemon|bounces?)\b", re.IGNORECASE)
+BULK_TEXT_PATTERN = re.compile(r"\b(unsubscribe|view (it |this email )?in (your|a) browser|manage (your )?preferences|"
+                               r"no longer wish to receive|order confirmation|your receipt|newsletter)\b", re.IGNORECASE)
+# Anything which hints at urgency sends the email to the LLM, however bulky it looks
+URGENT_TEXT_PATTERN = re.compile(r"\b(urgent|asap|as soon as possible|immediately|action required|deadline|overdue|"
+                                 r"final notice|cannot wait|security alert|suspicious|unusual (sign-in|activity))\b", re.IGNORECASE)
+
+class PreScorer:
+
+    """ Assigns a low uscore to emails which are confidently bulk or automated mail (newsletters, receipts,
+     notifications), so they do not need an LLM query. Header and text signals are combined into a
+     confidence (each signal independently raising it by its weight), and an email is only scored locally
+     if the confidence reaches the threshold and nothing in it hints at urgency. Safe to share between threads. """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        """ Creates a new PreScorer which scores emails locally once they reach the confidence threshold. """
+        self.threshold = threshold
+        self.calls_avoided = 0 # the number of emails scored without an LLM query
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def signals(email):
+        """ Returns the names of the bulk mail signals present in an email. """
+        found = []
+        headers = email.headers
+        if "list-unsubscribe" in headers:
+            found.append("list-unsubscribe")
+        if headers.get("precedence", "").strip().lower() in ("bulk", "list", "junk"):
+            found.append("precedence")
+        if headers.get("auto-submitted", "no").strip().lower() != "no":
+            found.append("auto-submitted")
+        if "list-id" in headers:
+            found.append("list-id")
+        address = sender_address(email.sender)[0]
+        if NOREPLY_PATTERN.match(address):
+            found.append("noreply")
+        if BULK_TEXT_PATTERN.search(email.body):
+            found.append("bulk-text")
+        return found
+
+    @staticmethod
+    def confidence(email):
+        """ Returns the confidence (from 0 to 1) that an email is bulk or automated mail. """
+        doubt = 1.0
+        for signal in PreScorer.signals(email):
+            doubt = doubt * (1.0 - SIGNAL_WEIGHTS[signal])
+        return 1.0 - doubt
+
+    @staticmethod
+    def is_uncertain(email, keyword_modifier):
+        """ Returns True if anything in the email suggests it could be urgent. """
+        if keyword_modifier > 0.0 or email.subject.lower().startswith("re:"): # keywords, or a reply to the user
+            return True
+        if URGENT_TEXT_PATTERN.search(email.subject) or URGENT_TEXT_PATTERN.search(email.body):
+            return True
+        letters = [c for c in email.subject if c.isalpha()]
+        return len(letters) >= 4 and sum(c.isupper() for c in letters) > 0.6 * len(letters) # a shouted subject
+
+    def prescore(self, email, keyword_modifier=0.0):
+        """ Returns LOW_USCORE if the email can confidently be scored without the LLM, or None if it should be
+         sent to the LLM. """
+        if self.is_uncertain(email, keyword_modifier) or self.confidence(email) < self.threshold:
+            return None
+        with self.lock:
+            self.calls_avoided = self.calls_avoided + 1
+        return LOW_USCORE
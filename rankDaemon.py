@@ -0,0 +1,163 @@
+# Persisted, age-decayed ranking and scheduling helpers for running ToneRank as a daemon
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import time
+from myEmail import Email
+from ranking import Ranking
+
+# Constants
+DEFAULT_INTERVAL = 300 # the default number of seconds between polls for new mail
+DEFAULT_HALF_LIFE = 12.0 # the default age (in hours) at which an email's uscore counts half as much
+WINDOW_HOURS = 24 # emails older than this drop out of the ranking, as they would from a one-shot run
+REPORT_FILE_NAME = "priority_report.txt" # the file the daemon keeps the latest priority report in
+HISTORY_SETTING = "daemon_history_id" # the Gmail historyId the daemon polls from (in the state store)
+TASKS_SETTING = "daemon_tasks" # the last to-do list and the emails it was made from (in the state store)
+TRIGGER_CHECK_SECONDS = 1.0 # how often the trigger file is checked while waiting
+
+
+def decay_factor(received, now, half_life):
+    """ Returns how much an email's uscore counts: 1 when it has just arrived, halving every half_life
+     hours. received and now are in milliseconds since the epoch. Emails of unknown age, and every email
+     when half_life is 0, are not decayed. """
+    if half_life <= 0 or received <= 0:
+        return 1.0
+    return 0.5 ** (max(0, now - received) / 3600000 / half_life)
+
+
+class DecayingRanking:
+
+    """ The daemon's ranking, kept between cycles (and between runs, in the state store) so each cycle only
+     scores the mail which arrived since the last one. Entries are keyed by thread (or by message, without
+     threads): a newer message in a thread replaces the thread's entry. When ranked, uscores are decayed by
+     age, so a fresh email can overtake an older one with a higher score; the scores shown are the ones the
+     emails were given. Emails which could not be scored are kept (with no uscore) and retried. """
+
+    def __init__(self, half_life=DEFAULT_HALF_LIFE, store=None, threads=True):
+        """ Creates the ranking, loading the entries kept in the store (a StateStore, if given). """
+        self.half_life = half_life
+        self.store = store
+        self.threads = threads
+        self.entries = {} # key -> [email, category, has_keywords, uscore (None if it could not be scored)]
+        self.changed = set() # the keys written or removed since the last save
+        if store is not None:
+            for key, category, has_keywords, uscore, data in store.ranked():
+                self.entries[key] = [Email.from_dict(data), category, has_keywords, uscore]
+
+    def key(self, email):
+        """ Returns the key of an email's entry. """
+        return (email.thread_id if self.threads else None) or email.msg_id
+
+    def is_new(self, email):
+        """ Returns True if an email is not in the ranking yet, and is newer than its thread's entry. """
+        entry = self.entries.get(self.key(email))
+        return entry is None or (entry[0].msg_id != email.msg_id and email.internal_date >= entry[0].internal_date)
+
+    def previous_messages(self, emails):
+        """ Returns a dictionary mapping the thread id of each of these emails already in the ranking to
+         the email its entry holds (the thread's latest message when it was last ranked), for group_threads. """
+        if not self.threads:
+            return {}
+        return {email.thread_id: self.entries[email.thread_id][0] for email in emails
+                if email.thread_id is not None and email.thread_id in self.entries}
+
+    def flagged(self):
+        """ Returns the emails which could not be scored. """
+        return [entry[0] for entry in self.entries.values() if entry[3] is None]
+
+    def merge(self, emails_ranked, flagged_emails):
+        """ Adds the emails of a cycle: the scored ones of a Ranking, and the (email, category, has_keywords)
+         triples of the ones which could not be scored. """
+        for email, category, has_keywords in emails_ranked.items():
+            self.entries[self.key(email)] = [email, category, has_keywords, email.uscore]
+            self.changed.add(self.key(email))
+        for email, category, has_keywords in flagged_emails:
+            self.entries[self.key(email)] = [email, category, has_keywords, None]
+            self.changed.add(self.key(email))
+
+    def remove(self, msg_ids):
+        """ Removes the entries of the messages with these ids (deleted, or moved to spam or trash). """
+        for key, entry in list(self.entries.items()):
+            if entry[0].msg_id in msg_ids:
+                del self.entries[key]
+                self.changed.add(key)
+
+    def expire(self, now):
+        """ Removes the emails received more than WINDOW_HOURS before now (in milliseconds). """
+        cutoff = now - WINDOW_HOURS * 3600000
+        for key, entry in list(self.entries.items()):
+            if 0 < entry[0].internal_date < cutoff:
+                del self.entries[key]
+                self.changed.add(key)
+
+    def ranking(self, now):
+        """ Returns the scored emails as a Ranking ordered by their decayed uscores at now (in milliseconds),
+         newest first where they tie. """
+        emails_ranked = Ranking()
+        for email, category, has_keywords, uscore in self.entries.values():
+            if uscore is None:
+                continue
+            email.uscore = uscore * decay_factor(email.internal_date, now, self.half_life)
+            emails_ranked.add(email, category, has_keywords, -email.internal_date)
+            email.uscore = uscore # the order is fixed when the email is added, so the given score is shown
+        return emails_ranked
+
+    def save(self):
+        """ Writes the entries changed since the last save to the store (if there is one). """
+        if self.store is None or not self.changed:
+            return
+        entries = [(key, *self.entries[key][1:3], self.entries[key][3], self.entries[key][0].to_dict())
+                   for key in self.changed if key in self.entries]
+        removed = [key for key in self.changed if key not in self.entries]
+        self.store.save_ranked(entries, removed, int(time.time() * 1000) - WINDOW_HOURS * 3600000)
+        self.changed.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def format_report(emails_ranked, flagged_emails, tasks, top_size):
+    """ Returns the priority report as plain text (the same sections print_priority_report prints). """
+    lines = ["PRIORITY REPORT", "", "To-Do List:", tasks, ""]
+    if len(emails_ranked) >= top_size:
+        lines.append(f"Top {top_size} emails to read Right Now:")
+        lines.extend(f"{count}. {e}" for count, e in enumerate(emails_ranked.top(top_size), start=1))
+        lines.append("")
+    lines.append("All emails by order of urgency:")
+    lines.extend(f"{count}. {e}" for count, e in enumerate(emails_ranked, start=1))
+    lines.append("")
+    if flagged_emails:
+        lines.append("Emails which could not be processed by the system (urgency unknown):")
+        lines.extend(f"{count}. {e}" for count, e in enumerate(flagged_emails, start=1))
+        lines.append("")
+    return "\n".join(lines)
+
+def write_report(file_name, text):
+    """ Replaces the report file atomically, so a reader never sees a half-written report. """
+    temp_file_name = file_name + ".tmp"
+    with open(temp_file_name, 'w', encoding='utf-8') as report_file:
+        report_file.write(text)
+    os.replace(temp_file_name, file_name)
+
+def trigger_mtime(trigger_file):
+    """ Returns the modification time of the trigger file, or None if there is none. """
+    try:
+        return os.stat(trigger_file).st_mtime_ns
+    except OSError:
+        return None
+
+def wait_for_trigger(interval, trigger_file=None, last_mtime=None):
+    """ Sleeps until the next cycle is due: after interval seconds, or as soon as the trigger file (if any)
+     is created or touched (a stand-in for a push notification, e.g. from a Gmail watch webhook). Returns
+     the trigger file's modification time, to pass in next time. """
+    deadline = time.monotonic() + interval
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return trigger_mtime(trigger_file) if trigger_file else None
+        time.sleep(min(remaining, TRIGGER_CHECK_SECONDS) if trigger_file else remaining)
+        if trigger_file:
+            mtime = trigger_mtime(trigger_file)
+            if mtime is not None and mtime != last_mtime:
+                return mtime
@@ -0,0 +1,55 @@
+# Priority order of scored emails, with cheap top-K queries and incremental insertion
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import heapq
+import itertools
+
+
+def rank_key(category, has_keywords, uscore, position):
+    """ Returns the sort key of an email: its tier (category 0 with keywords, category 0, category 1 with
+     keywords, and so on), then its uscore (highest first), then its position (earliest first). """
+    return (category * 2 + (0 if has_keywords else 1), -uscore, position)
+
+
+class Ranking:
+
+    """ The scored emails of a run in priority order. Emails can be added one at a time as their scores
+     arrive (in O(1)); the top k are found in O(n log k) without sorting everything, and iterating over the
+     ranking yields the full order lazily (so reading the first few emails only costs a heapify and a few
+     pops). Ties keep the order the emails were added in, unless a position is given. """
+
+    def __init__(self, emails=()):
+        """ Creates a new Ranking holding the (email, category, has_keywords) triples given (if any). """
+        self.entries = [] # key + (id(email), email) tuples, in the order they were added
+        self.counter = itertools.count() # the default positions, in the order emails are added
+        for email, category, has_keywords in emails:
+            self.add(email, category, has_keywords)
+
+    def add(self, email, category, has_keywords, position=None):
+        """ Adds a scored email. position orders emails with the same tier and uscore (lowest first). """
+        key = rank_key(category, has_keywords, email.uscore, position if position is not None else next(self.counter))
+        self.entries.append(key + (id(email), email)) # id(email) keeps entries unique, so emails are never compared
+
+    def top(self, k):
+        """ Returns the k highest-priority emails, in order. """
+        return [entry[-1] for entry in heapq.nsmallest(k, self.entries)]
+
+    def __iter__(self):
+        """ Yields every email in priority order, sorting only as far as the caller reads. """
+        heap = list(self.entries)
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[-1]
+
+    def items(self):
+        """ Yields (email, category, has_keywords) for every email, in the order they were added. """
+        for entry in self.entries:
+            yield entry[-1], entry[0] // 2, entry[0] % 2 == 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def to_list(self):
+        """ Returns every email in priority order. """
+        return [entry[-1] for entry in sorted(self.entries)]
@@ -0,0 +1,97 @@
+# Persistent on-disk cache for Llama3 responses
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import sqlite3
+import hashlib
+import json
+import threading
+import time
+
+# Constants
+CACHE_FILE_NAME = "llm_cache.sqlite3" # the name of the file used to store cached responses
+CACHE_TTL = 7 * 24 * 60 * 60 # how long a cached response stays valid (in seconds)
+MAX_CACHE_ENTRIES = 20000 # the max number of responses kept on disk before the oldest are evicted
+BUSY_TIMEOUT = 30.0 # how long (in seconds) to wait for another process writing to the cache
+
+class ResponseCache:
+
+    """ Stores Llama3 responses in a SQLite database so they survive between runs. Entries are keyed
+     by a hash of the prompt text and every model setting which can change the response, expire after
+     a time-to-live, and are evicted least-recently-used first once the cache is full. The file is in WAL
+     mode, so several processes (e.g. one per mailbox) can share it. """
+
+    def __init__(self, file_name=CACHE_FILE_NAME, ttl=CACHE_TTL, max_entries=MAX_CACHE_ENTRIES):
+        """ Opens (or creates) the cache file and drops any expired entries. """
+        self.file_name = file_name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0 # the number of lookups answered from the cache
+        self.misses = 0 # the number of lookups which had to go to the API
+        self.lock = threading.Lock() # the connection is shared between scoring threads
+        self.connection = sqlite3.connect(file_name, check_same_thread=False, timeout=BUSY_TIMEOUT)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL") # readers never wait for a writer
+            self.connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                                    "created REAL NOT NULL, last_used REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.evict()
+
+    @staticmethod
+    def make_key(prompt, model, temperature, max_tokens):
+        """ Returns the cache key for a prompt sent with the specified model settings. """
+        key_data = json.dumps([prompt, model, temperature, max_tokens])
+        return hashlib.sha256(key_data.encode('UTF-8')).hexdigest()
+
+    def get(self, key):
+        """ Returns the cached response for the key, or None if there is no valid entry. """
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ? AND created > ?",
+                                          (key, now - self.ttl)).fetchone()
+            if row is None:
+                self.misses = self.misses + 1
+                return None
+            self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits = self.hits + 1
+            return row[0]
+
+    def put(self, key, response):
+        """ Stores a response, evicting the least recently used entries if the cache is over capacity. """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now))
+            count = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self.connection.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                                        "ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+
+    def remove(self, key):
+        """ Removes the entry for the key, if there is one. """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def evict(self):
+        """ Removes expired entries, and the least recently used entries beyond the size limit. """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses WHERE created <= ?", (time.time() - self.ttl,))
+            count = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self.connection.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                                        "ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+
+    def clear(self):
+        """ Removes every entry from the cache. """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses")
+
+    def close(self):
+        """ Closes the cache file. """
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,132 @@
+# The options of a ToneRank run, chosen once on the command line, and the scorers built from them
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+from dataclasses import dataclass
+from typing import Optional
+from termcolor import colored
+from gmailPipe import BATCH_SIZE
+from llm import CONTEXT_WINDOW, MAX_RESPONSE_LEN
+from preprocess import Preprocessor, DEFAULT_BODY_TOKEN_BUDGET
+from prescore import PreScorer, DEFAULT_THRESHOLD as DEFAULT_PRESCORE_THRESHOLD
+from nearDuplicates import NearDuplicateIndex, HISTORY_FILE_NAME, DEFAULT_MAX_DISTANCE
+from localModel import LocalModel, LocalScorer, ScoreLog, DEFAULT_MAX_UNCERTAINTY, MODEL_FILE_NAME
+from budgetScoring import SenderHistory
+from responseCache import CACHE_FILE_NAME
+from checkpoint import CHECKPOINT_FILE_NAME
+
+# Constants
+DEFAULT_TOKEN_BUDGET = CONTEXT_WINDOW - MAX_RESPONSE_LEN - 500 # the estimated prompt size a batch may reach
+
+
+@dataclass
+class RunOptions:
+
+    """ How a ToneRank run fetches, scores and reports emails. The defaults are those of a plain
+     `python toneRank.py`; from_args builds the options selected on the command line, once, and every mode
+     (a single run, the daemon, batch jobs and mailbox profiles) reads the ones it needs from them. """
+
+    use_cache: bool = True # reuse Llama3 responses (and recent scores) kept on disk
+    cache_file: str = CACHE_FILE_NAME # the on-disk response cache
+    batch_size: int = BATCH_SIZE # the number of emails fetched per Gmail batch request
+    incremental: bool = False # only fetch the emails which changed since the last run
+    stream: bool = False # score emails while they are still being fetched
+    batch_scoring: bool = False # score several emails per prompt
+    token_budget: int = DEFAULT_TOKEN_BUDGET # the estimated max size of a batch prompt, in tokens
+    preprocess: bool = True # clean bodies before they are scored
+    body_token_budget: int = DEFAULT_BODY_TOKEN_BUDGET # the estimated max tokens kept from each body
+    show_tokens_saved: bool = False # list the tokens preprocessing saved per email
+    prescore: bool = False # score confidently bulk Category 1 mail without a query (it changes the ranking)
+    prescore_threshold: float = DEFAULT_PRESCORE_THRESHOLD # the confidence needed to prescore an email
+    scorer: str = "llm" # "llm", "local" or "hybrid" (see localModel.SCORER_MODES)
+    max_uncertainty: float = DEFAULT_MAX_UNCERTAINTY # in hybrid mode, the max uncertainty of a local score
+    score_log: bool = True # log every Llama3 score as training data for the local model
+    threads: bool = True # score and rank each Gmail thread once
+    dedupe: bool = True # reuse the score of a near-duplicate email
+    dedupe_distance: int = DEFAULT_MAX_DISTANCE # the max differing SimHash bits between near-duplicates
+    dedupe_history: bool = False # also reuse the scores of near-duplicates from the runs of the last 7 days
+    metrics_json: Optional[str] = None # the file the run's metrics are written to as JSON
+    metrics_prometheus: Optional[str] = None # the file the run's metrics are written to in the Prometheus text format
+    trace_file: Optional[str] = None # the file a Chrome trace of the run is written to
+    max_llm_calls: Optional[int] = None # the most scoring queries sent
+    deadline: Optional[float] = None # the seconds after which no scoring query is sent
+    spill_bodies: bool = False # keep large bodies in a memory-mapped temporary file
+    checkpoint: bool = True # journal the run's emails and scores, so it can be resumed
+    checkpoint_file: str = CHECKPOINT_FILE_NAME # the journal of the run
+    resume: bool = False # pick up the last run where it stopped
+    retry_flagged: bool = False # only query the emails of the last run which could not be processed
+
+    @classmethod
+    def from_args(cls, args):
+        """ Returns the options selected on the command line (the namespace returned by parse_args). """
+        return cls(use_cache=not args.no_cache, batch_size=args.batch_size, incremental=args.incremental,
+                   stream=args.stream, batch_scoring=args.batch_prompts, token_budget=args.token_budget,
+                   preprocess=not args.no_preprocess, body_token_budget=args.body_token_budget,
+                   show_tokens_saved=args.show_tokens_saved, prescore=args.prescore,
+                   prescore_threshold=args.prescore_threshold, scorer=args.scorer, max_uncertainty=args.max_uncertainty,
+                   score_log=not args.no_score_log, threads=not args.no_threads, dedupe=not args.no_dedupe,
+                   dedupe_distance=args.dedupe_distance, dedupe_history=args.dedupe_history, metrics_json=args.metrics_json,
+                   metrics_prometheus=args.metrics_prometheus, trace_file=args.trace,
+                   max_llm_calls=args.max_llm_calls, deadline=args.deadline, spill_bodies=args.spill_bodies,
+                   checkpoint=not args.no_checkpoint, resume=args.resume, retry_flagged=args.retry_flagged)
+
+    @property
+    def budgeted(self):
+        """ True if the scoring queries are limited (by max_llm_calls or a deadline). """
+        return self.max_llm_calls is not None or self.deadline is not None
+
+
+def make_local_scorer(scorer="llm", max_uncertainty=DEFAULT_MAX_UNCERTAINTY, score_log=True):
+    """ Returns the LocalScorer for a scorer mode, loading the trained model if the mode needs it. """
+    model = None
+    if scorer != "llm":
+        model = LocalModel.load()
+        if model is None:
+            print(colored(f"No local model in {MODEL_FILE_NAME} (run with --train-local-model), so Llama3 "
+                          f"will score every email.\n", "red"))
+    return LocalScorer(scorer, model, ScoreLog() if score_log else None, max_uncertainty)
+
+
+@dataclass
+class Scorers:
+
+    """ What a run uses to clean and score emails besides Llama3, and to learn from the scores Llama3 gives.
+     Any of them may be None, except the local scorer (whose "llm" mode scores nothing). """
+
+    preprocessor: Optional[Preprocessor] = None # cleans bodies before they are scored
+    prescorer: Optional[PreScorer] = None # scores obvious bulk mail
+    local_scorer: Optional[LocalScorer] = None # scores with the local model, and logs Llama3's scores
+    near_duplicates: Optional[NearDuplicateIndex] = None # reuses the scores of near-duplicate emails
+    sender_history: Optional[SenderHistory] = None # a running mean of each sender's scores
+
+    @classmethod
+    def from_options(cls, options, store=None):
+        """ Returns the scorers the options select. Scores are kept between runs (in the store, if given)
+         unless options.use_cache is False; near-duplicates only reuse the scores of earlier runs if
+         options.dedupe_history is True too. """
+        return cls(preprocessor=Preprocessor(options.body_token_budget) if options.preprocess else None,
+                   prescorer=PreScorer(options.prescore_threshold) if options.prescore else None,
+                   local_scorer=make_local_scorer(options.scorer, options.max_uncertainty, options.score_log),
+                   near_duplicates=NearDuplicateIndex(options.dedupe_distance, HISTORY_FILE_NAME
+                                                                      if options.dedupe_history and options.use_cache else None)
+                                   if options.dedupe else None,
+                   sender_history=SenderHistory(store if options.use_cache else None))
+
+    def record(self, email, category, uscore):
+        """ Keeps a base uscore Llama3 gave, so the local model can learn from it, near-duplicates can reuse it
+         and the sender history can estimate the next email from the same sender. """
+        if self.local_scorer is not None:
+            self.local_scorer.record(email, category, uscore)
+        if self.near_duplicates is not None:
+            self.near_duplicates.remember(email, category, uscore)
+        if self.sender_history is not None:
+            self.sender_history.record(email.sender, uscore)
+
+    def save(self):
+        """ Writes what was learned in this run (the histories and the score log) to disk. """
+        if self.sender_history is not None:
+            self.sender_history.save()
+        if self.near_duplicates is not None:
+            self.near_duplicates.save()
+        if self.local_scorer is not None and self.local_scorer.score_log is not None:
+            self.local_scorer.score_log.flush()
@@ -0,0 +1,192 @@
+# Transactional SQLite store for the user's preferences, sender history, run history and daemon ranking
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from whitelistIndex import normalise_entry
+
+# Constants
+STATE_FILE_NAME = "tonerank_state.sqlite3" # the name of the file used to store ToneRank's state
+MIGRATED_SETTING = "migrated_from_files" # set once the old CSV/JSON files have been imported
+MAX_RUNS = 1000 # the max number of runs kept in the run history (the oldest are dropped)
+
+class StateStore:
+
+    """ Keeps the whitelist, keywords, priority report settings, sender history, run history and the
+     daemon's ranking in one SQLite database in WAL mode. Every change is its own small transaction, written
+     when it is made, so nothing has to be rewritten on exit and a crash loses at most the change in
+     progress. Safe to share between threads. """
+
+    def __init__(self, file_name=STATE_FILE_NAME):
+        """ Opens (or creates) the state file. """
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_name, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL") # readers never wait for a writer
+            self.connection.execute("PRAGMA synchronous=NORMAL") # WAL stays consistent without a sync per commit
+            self.connection.execute("CREATE TABLE IF NOT EXISTS whitelist (entry TEXT PRIMARY KEY, kind TEXT NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS whitelist_kind ON whitelist (kind)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS keywords (keyword TEXT PRIMARY KEY, weight REAL NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS senders (address TEXT PRIMARY KEY, mean REAL NOT NULL, "
+                                    "weight INTEGER NOT NULL, last_seen REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS senders_last_seen ON senders (last_seen)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                    "started REAL NOT NULL, finished REAL NOT NULL, emails INTEGER NOT NULL, "
+                                    "flagged INTEGER NOT NULL, metrics TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS ranked (key TEXT PRIMARY KEY, category INTEGER NOT NULL, "
+                                    "keywords INTEGER NOT NULL, uscore REAL, received INTEGER NOT NULL, email TEXT NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS ranked_received ON ranked (received)")
+
+    # Whitelist
+
+    def whitelist(self):
+        """ Returns {entry: kind} for every whitelist entry. """
+        with self.lock:
+            return dict(self.connection.execute("SELECT entry, kind FROM whitelist").fetchall())
+
+    def add_whitelist_entry(self, entry, kind):
+        """ Adds (or replaces) a whitelist entry of the specified kind. """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO whitelist VALUES (?, ?)", (entry, kind))
+
+    def remove_whitelist_entry(self, entry):
+        """ Removes a whitelist entry, if it is present. """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM whitelist WHERE entry = ?", (entry,))
+
+    # Keywords
+
+    def keywords(self):
+        """ Returns {keyword: weight} for every keyword. """
+        with self.lock:
+            return dict(self.connection.execute("SELECT keyword, weight FROM keywords").fetchall())
+
+    def set_keyword(self, keyword, weight):
+        """ Adds (or reweights) a keyword. """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO keywords VALUES (?, ?)", (keyword, weight))
+
+    def remove_keyword(self, keyword):
+        """ Removes a keyword, if it is present. """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM keywords WHERE keyword = ?", (keyword,))
+
+    # Settings
+
+    def get_setting(self, name, default=None):
+        """ Returns the value of a setting (any JSON value), or default if it has not been set. """
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_setting(self, name, value):
+        """ Sets a setting to any JSON value. """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, json.dumps(value)))
+
+    # Sender history
+
+    def senders(self):
+        """ Returns {address: [mean uscore, weight, time last seen]} for every sender in the history. """
+        with self.lock:
+            rows = self.connection.execute("SELECT address, mean, weight, last_seen FROM senders").fetchall()
+        return {address: [mean, weight, last_seen] for address, mean, weight, last_seen in rows}
+
+    def save_senders(self, senders, max_senders):
+        """ Writes the {address: [mean, weight, last_seen]} entries given, then drops the least recently
+         seen senders beyond max_senders, in one transaction. """
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO senders VALUES (?, ?, ?, ?)",
+                                        [(address, *entry) for address, entry in senders.items()])
+            self.connection.execute("DELETE FROM senders WHERE address NOT IN (SELECT address FROM senders "
+                                    "ORDER BY last_seen DESC LIMIT ?)", (max_senders,))
+
+    # Run history
+
+    def record_run(self, started, emails, flagged, metrics):
+        """ Adds a run to the history: when it started, how many emails were ranked and flagged, and its
+         metrics (a dictionary, as made by Metrics.to_dict). """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO runs (started, finished, emails, flagged, metrics) VALUES (?, ?, ?, ?, ?)",
+                                    (started, time.time(), emails, flagged, json.dumps(metrics)))
+            self.connection.execute("DELETE FROM runs WHERE id <= (SELECT MAX(id) FROM runs) - ?", (MAX_RUNS,))
+
+    def runs(self, limit=10):
+        """ Returns the latest runs, newest first, as (started, finished, emails, flagged, metrics) tuples. """
+        with self.lock:
+            rows = self.connection.execute("SELECT started, finished, emails, flagged, metrics FROM runs "
+                                           "ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [(started, finished, emails, flagged, json.loads(metrics)) for started, finished, emails, flagged, metrics in rows]
+
+    # Daemon ranking
+
+    def ranked(self):
+        """ Returns every email in the daemon's ranking as (key, category, has_keywords, uscore, email data)
+         tuples, where the uscore is None for an email which could not be scored and the email data is a
+         dictionary made by Email.to_dict. """
+        with self.lock:
+            rows = self.connection.execute("SELECT key, category, keywords, uscore, email FROM ranked").fetchall()
+        return [(key, category, bool(keywords), uscore, json.loads(email)) for key, category, keywords, uscore, email in rows]
+
+    def save_ranked(self, entries, removed_keys, cutoff):
+        """ Writes the (key, category, has_keywords, uscore, email data) entries given, and deletes the
+         removed keys and every email received before cutoff (in milliseconds since the epoch), in one
+         transaction. """
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO ranked VALUES (?, ?, ?, ?, ?, ?)",
+                                        [(key, category, int(has_keywords), uscore, data.get("internal_date", 0),
+                                          json.dumps(data)) for key, category, has_keywords, uscore, data in entries])
+            self.connection.executemany("DELETE FROM ranked WHERE key = ?", [(key,) for key in removed_keys])
+            self.connection.execute("DELETE FROM ranked WHERE received < ?", (cutoff,))
+
+    # Migration
+
+    def migrate(self, keyword_file_name, whitelist_file_name, report_file_name, sender_history_file_name):
+        """ Imports the CSV files (and sender history JSON) earlier versions kept their state in, in one
+         transaction, the first time the store is opened. Invalid whitelist entries are dropped. The old
+         files are left in place but no longer used. Returns True if anything was imported. """
+        if self.get_setting(MIGRATED_SETTING, False):
+            return False
+        keywords, whitelist, report, senders = {}, {}, [], {}
+        if os.path.exists(keyword_file_name):
+            with open(keyword_file_name, 'r', newline='') as file:
+                for row in csv.reader(file):
+                    if len(row) >= 2: # skip empty rows
+                        keywords[row[0].strip().lower()] = float(row[1])
+        if os.path.exists(whitelist_file_name):
+            with open(whitelist_file_name, 'r', newline='', encoding='utf-8') as file:
+                for row in csv.reader(file):
+                    normalised = normalise_entry(row[0]) if row else None
+                    if normalised is not None:
+                        whitelist[normalised[0]] = normalised[1]
+        if os.path.exists(report_file_name):
+            with open(report_file_name, 'r', newline='', encoding='utf-8') as file:
+                report = [int(row[0]) for row in csv.reader(file) if row]
+        if os.path.exists(sender_history_file_name):
+            try:
+                with open(sender_history_file_name, 'r', encoding='utf-8') as file:
+                    senders = {address: list(entry) for address, entry in json.load(file).items()}
+            except (OSError, ValueError, AttributeError):
+                senders = {} # a corrupt history is not worth keeping
+
+        with self.lock, self.connection: # all or nothing
+            self.connection.executemany("INSERT OR REPLACE INTO keywords VALUES (?, ?)", keywords.items())
+            self.connection.executemany("INSERT OR REPLACE INTO whitelist VALUES (?, ?)", whitelist.items())
+            for name, value in zip(["top_email_size", "todo_list_sample_size"], report):
+                self.connection.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, json.dumps(value)))
+            self.connection.executemany("INSERT OR REPLACE INTO senders VALUES (?, ?, ?, ?)",
+                                        [(address, *entry) for address, entry in senders.items()])
+            self.connection.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (MIGRATED_SETTING, json.dumps(True)))
+        return bool(keywords or whitelist or report or senders)
+
+    def close(self):
+        """ Closes the state file. """
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,79 @@
+# Checks that batch requests go through the local batch endpoint and come back matched to their emails
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from batchJob import BatchJob, LocalBatchEndpoint
+from llm import MODEL
+from myEmail import Email
+
+
+@pytest.fixture
+def files(tmp_path):
+    """ Returns the names of the requests, results and emails files of a batch job. """
+    return [str(tmp_path / name) for name in ["requests.jsonl", "results.jsonl", "emails.json"]]
+
+def make_emails(count):
+    return [Email(f"Subject {i}", f"sender{i}@example.com", "Mon, 1 Jan 2024", f"Body {i}", msg_id=f"m{i}",
+                  internal_date=1000 + i, thread_id=f"t{i}") for i in range(count)]
+
+def respond(prompt):
+    """ Answers a prompt with its email number times two, failing for email 2. """
+    number = int(prompt.rsplit(" ", 1)[1])
+    if number == 2:
+        raise RuntimeError("Internal server error")
+    return str(number * 2)
+
+
+def test_custom_ids_are_stable_and_distinct():
+    assert BatchJob.make_custom_id("uscore", "m1") == BatchJob.make_custom_id("uscore", "m1")
+    assert BatchJob.make_custom_id("uscore", "m1") != BatchJob.make_custom_id("uscore", "m2")
+    assert BatchJob.make_custom_id("todo", "m1").startswith("todo-")
+
+def test_requests_round_trip_through_the_local_endpoint(files):
+    requests_file, results_file, emails_file = files
+    emails = make_emails(4)
+    custom_ids = [BatchJob.make_custom_id("uscore", e.msg_id) for e in emails]
+    BatchJob.write_jsonl(requests_file, [BatchJob.make_request(custom_id, f"Score email {i}")
+                                         for i, custom_id in enumerate(custom_ids)])
+    BatchJob.save_emails(emails_file, emails, custom_ids)
+    requests = BatchJob.read_jsonl(requests_file)
+    assert requests[0]["body"]["model"] == MODEL
+    assert requests[0]["body"]["messages"][0]["content"] == "Score email 0"
+
+    assert LocalBatchEndpoint(respond).run(requests_file, results_file) == 1
+    results = BatchJob.read_results([results_file])
+    loaded, loaded_ids = BatchJob.load_emails(emails_file)
+    assert loaded_ids == custom_ids
+    assert [e.to_dict() for e in loaded] == [e.to_dict() for e in emails]
+    assert [results[custom_id] for custom_id in loaded_ids if custom_id != custom_ids[2]] == ["0", "2", "6"]
+    assert isinstance(results[custom_ids[2]], Exception)
+    assert "Internal server error" in str(results[custom_ids[2]])
+
+def test_results_are_matched_by_custom_id_across_files(files, tmp_path):
+    requests_file, results_file, _ = files
+    BatchJob.write_jsonl(requests_file, [BatchJob.make_request("uscore-a", "Score email 1"),
+                                         BatchJob.make_request("uscore-b", "Score email 3")])
+    LocalBatchEndpoint(respond).run(requests_file, results_file)
+    lines = BatchJob.read_jsonl(results_file)
+    other_file = str(tmp_path / "results_2.jsonl")
+    BatchJob.write_jsonl(results_file, lines[1:]) # the results split over two files, out of order
+    BatchJob.write_jsonl(other_file, lines[:1])
+    assert BatchJob.read_results([results_file, other_file]) == {"uscore-a": "2", "uscore-b": "6"}
+
+def test_a_non_200_response_is_a_failure(files):
+    _, results_file, _ = files
+    BatchJob.write_jsonl(results_file, [{"custom_id": "uscore-a", "error": None,
+                                         "response": {"status_code": 429, "body": {"error": "rate limited"}}}])
+    result = BatchJob.read_results([results_file])["uscore-a"]
+    assert isinstance(result, Exception) and "rate limited" in str(result)
+
+def test_blank_lines_are_skipped(files):
+    requests_file = files[0]
+    with open(requests_file, 'w', encoding='utf-8') as file:
+        file.write('{"custom_id": "a"}\n\n  \n{"custom_id": "b"}\n')
+    assert [line["custom_id"] for line in BatchJob.read_jsonl(requests_file)] == ["a", "b"]
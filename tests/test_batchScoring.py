@@ -0,0 +1,88 @@
+# Checks that batch prompts are planned within their token budget and their responses are parsed strictly
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from llm import GroqLlama, estimate_tokens
+from myEmail import Email
+from toneRank import (parse_batch_scores, plan_score_batches, format_batch_email, urgency_prompt_batch,
+                      urgency_prompt_C1, MAX_EMAILS_PER_BATCH, PROMPTS_FILE_NAME)
+
+
+@pytest.fixture
+def prompt_data():
+    with open(PROMPTS_FILE_NAME, 'r') as f:
+        return json.load(f)
+
+def make_emails(count, body="Body"):
+    return [Email(f"Subject {i}", f"sender{i}@example.com", f"{body} {i}", "") for i in range(count)]
+
+
+@pytest.mark.parametrize("response, count, expected", [
+    ("[7, 3.5, 0]", 3, [7.0, 3.5, 0.0]),
+    ("Here are the scores:\n[1, 2]\nLet me know if you need more.", 2, [1.0, 2.0]),
+    ('["8", "2.5"]', 2, [8.0, 2.5]),
+    ("[]", 0, []),
+])
+def test_parse_batch_scores(response, count, expected):
+    assert parse_batch_scores(response, count) == expected
+
+@pytest.mark.parametrize("response, count", [
+    ("7, 3, 0", 3), # no array
+    ("] 7, 3 [", 2), # brackets the wrong way round
+    ("[7, 3", 2), # cut short
+    ("[7, 3, 0]", 2), # one score too many
+    ("[7]", 2), # one score too few
+    ('[7, "urgent"]', 2),
+    ("[7, null]", 2),
+    ("[[7], 3]", 2),
+])
+def test_parse_batch_scores_rejects_malformed_responses(response, count):
+    with pytest.raises(ValueError):
+        parse_batch_scores(response, count)
+
+
+def test_batches_are_capped_at_the_max_emails():
+    batches = plan_score_batches(make_emails(2 * MAX_EMAILS_PER_BATCH + 1), "Score these: {email_list}", 10 ** 6)
+    assert [len(batch) for batch in batches] == [MAX_EMAILS_PER_BATCH, MAX_EMAILS_PER_BATCH, 1]
+
+def test_batches_fit_the_token_budget_and_keep_the_email_order():
+    template = "Score these: {email_list}"
+    emails = make_emails(30, body="word " * 50)
+    token_budget = 400
+    batches = plan_score_batches(emails, template, token_budget)
+    assert [e for batch in batches for e in batch] == emails
+    for batch in batches:
+        tokens = estimate_tokens(template) + sum(estimate_tokens(format_batch_email(i + 1, e)) for i, e in enumerate(batch))
+        assert tokens <= token_budget
+    assert len(batches) > 1
+
+def test_an_email_too_long_to_share_a_prompt_gets_a_batch_of_its_own():
+    emails = make_emails(3)
+    emails[1].body = "word " * 2000
+    batches = plan_score_batches(emails, "Score these: {email_list}", 500)
+    assert [len(batch) for batch in batches] == [1, 1, 1]
+
+
+def test_a_malformed_batch_is_split_until_it_parses(monkeypatch, tmp_path, prompt_data):
+    monkeypatch.chdir(tmp_path) # for the Llama3 log
+    monkeypatch.setattr(GroqLlama, "client_override", object()) # never connect to Groq
+    GroqLlama.get_cached_llama_response.cache_clear()
+    client = GroqLlama()
+    sent = []
+    def prompt_llama(prompt):
+        sent.append(prompt)
+        emails = prompt.count("### Email ")
+        return "Sorry, too many emails." if emails > 2 else json.dumps([5] * emails) if emails else "6"
+    client.prompt_llama = prompt_llama
+    try:
+        assert urgency_prompt_batch(make_emails(5), client, prompt_data, 'uscore_batch_prompt_one',
+                                    urgency_prompt_C1) == [5.0, 5.0, 6.0, 5.0, 5.0]
+    finally:
+        GroqLlama.get_cached_llama_response.cache_clear()
+    assert len(sent) == 5 # 5 -> 2 + 3 -> 2 + (1 + 2), the single email scored with its own prompt
@@ -0,0 +1,86 @@
+# Checks that a ScoringBudget caps the Llama3 queries actually sent, batch retries included
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from budgetScoring import ScoringBudget, BudgetExhausted
+from llm import GroqLlama
+from myEmail import Email
+from toneRank import urgency_prompt_batch, urgency_prompt_C1, PROMPTS_FILE_NAME
+
+
+@pytest.fixture
+def prompt_data():
+    with open(PROMPTS_FILE_NAME, 'r') as f:
+        return json.load(f)
+
+@pytest.fixture
+def make_client(monkeypatch, tmp_path):
+    """ Returns a function making a GroqLlama whose queries are answered by respond(prompt), and which counts them. """
+    monkeypatch.chdir(tmp_path) # for the Llama3 log
+    monkeypatch.setattr(GroqLlama, "client_override", object()) # never connect to Groq
+    GroqLlama.get_cached_llama_response.cache_clear()
+    def make(respond):
+        client = GroqLlama()
+        client.sent = []
+        def prompt_llama(prompt):
+            client.sent.append(prompt)
+            return respond(prompt)
+        client.prompt_llama = prompt_llama
+        return client
+    yield make
+    GroqLlama.get_cached_llama_response.cache_clear()
+
+def make_emails(count):
+    return [Email(f"Subject {i}", f"sender{i}@example.com", f"Body {i}", "") for i in range(count)]
+
+
+def test_spend_stops_at_max_calls():
+    budget = ScoringBudget(max_calls=2)
+    budget.spend()
+    budget.spend()
+    with pytest.raises(BudgetExhausted):
+        budget.spend()
+    assert budget.calls == 2
+
+def test_spend_stops_after_the_deadline():
+    budget = ScoringBudget(deadline=0.0)
+    with pytest.raises(BudgetExhausted):
+        budget.spend()
+    assert budget.calls == 0 and budget.skipped_by_deadline == 1
+
+@pytest.mark.parametrize("max_calls", [1, 3, 6])
+def test_malformed_batches_stop_splitting_once_the_budget_is_spent(make_client, prompt_data, max_calls):
+    client = make_client(lambda prompt: "I cannot score these emails.")
+    budget = ScoringBudget(max_calls=max_calls)
+    with client.budgeted(budget):
+        results = urgency_prompt_batch(make_emails(8), client, prompt_data, 'uscore_batch_prompt_one', urgency_prompt_C1)
+    assert len(client.sent) == max_calls
+    assert budget.calls == max_calls
+    assert len(results) == 8
+    assert None in results # left to an estimate, not reported as failures
+    assert all(result is None or isinstance(result, Exception) for result in results)
+
+def test_cached_responses_do_not_count(make_client, prompt_data):
+    client = make_client(lambda prompt: "7")
+    budget = ScoringBudget(max_calls=1)
+    email = make_emails(1)[0]
+    with client.budgeted(budget):
+        assert urgency_prompt_C1(email, client, prompt_data) == 7.0
+        assert urgency_prompt_C1(email, client, prompt_data) == 7.0 # answered from memory
+        with pytest.raises(BudgetExhausted):
+            urgency_prompt_C1(make_emails(2)[1], client, prompt_data)
+    assert len(client.sent) == 1
+
+def test_queries_outside_the_budget_are_not_counted(make_client, prompt_data):
+    client = make_client(lambda prompt: "4")
+    budget = ScoringBudget(max_calls=0)
+    with client.budgeted(budget):
+        pass
+    assert urgency_prompt_C1(make_emails(1)[0], client, prompt_data) == 4.0
+    assert budget.calls == 0
@@ -0,0 +1,162 @@
+# Checks that a RunCheckpoint journals a run so it can be resumed and its failures retried
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from checkpoint import RunCheckpoint, NOT_SCORED_MESSAGE
+from myEmail import Email
+
+
+@pytest.fixture
+def journal_file(tmp_path):
+    return str(tmp_path / "run_checkpoint.jsonl")
+
+def make_emails(count):
+    return [Email(f"Subject {i}", f"sender{i}@example.com", "", f"Body {i}", msg_id=f"m{i}") for i in range(count)]
+
+def journal_run(file_name, emails):
+    """ Returns a RunCheckpoint which has journaled fetching the emails. """
+    checkpoint = RunCheckpoint(file_name)
+    checkpoint.start()
+    checkpoint.record_emails(emails)
+    checkpoint.mark_fetched()
+    return checkpoint
+
+
+def test_a_run_is_read_back_as_it_was_journaled(journal_file):
+    emails = make_emails(4)
+    checkpoint = journal_run(journal_file, emails)
+    checkpoint.record(emails[0], 7.5)
+    checkpoint.record(emails[1], ValueError("Query failed."))
+    checkpoint.record(emails[2], 3.0, estimated=True)
+
+    loaded = RunCheckpoint(journal_file)
+    assert loaded.load()
+    assert [e.msg_id for e in loaded.emails] == ["m0", "m1", "m2", "m3"]
+    assert loaded.scores == {"m0": 7.5, "m2": 3.0}
+    assert loaded.failures == {"m1": "Query failed."}
+    assert loaded.estimated == {"m2"}
+    assert [e.msg_id for e in loaded.pending()] == ["m1", "m3"] # the estimate is not pending
+    assert not loaded.finished
+
+def test_a_run_which_stopped_while_fetching_cannot_be_resumed(journal_file):
+    checkpoint = RunCheckpoint(journal_file)
+    checkpoint.start()
+    checkpoint.record_emails(make_emails(2))
+    assert not RunCheckpoint(journal_file).load()
+    assert not RunCheckpoint(str(journal_file) + ".missing").load()
+
+def test_a_line_cut_short_by_a_crash_is_skipped(journal_file):
+    emails = make_emails(2)
+    checkpoint = journal_run(journal_file, emails)
+    checkpoint.record(emails[0], 4.0)
+    with open(journal_file, 'a', encoding='utf-8') as journal:
+        journal.write('{"key": "m1", "usc')
+    loaded = RunCheckpoint(journal_file)
+    assert loaded.load()
+    assert loaded.scores == {"m0": 4.0}
+
+def test_a_later_score_replaces_a_failure_and_an_estimate(journal_file):
+    emails = make_emails(2)
+    checkpoint = journal_run(journal_file, emails)
+    checkpoint.record(emails[0], RuntimeError("Internal server error"))
+    checkpoint.record(emails[1], 5.0, estimated=True)
+    checkpoint.record(emails[0], 6.0)
+    checkpoint.record(emails[1], 8.0)
+    assert checkpoint.scores == {"m0": 6.0, "m1": 8.0}
+    assert not checkpoint.failures and not checkpoint.estimated
+    loaded = RunCheckpoint(journal_file)
+    loaded.load()
+    assert loaded.scores == {"m0": 6.0, "m1": 8.0}
+    assert not loaded.failures and not loaded.estimated
+
+def test_finish_and_reopen(journal_file):
+    checkpoint = journal_run(journal_file, make_emails(1))
+    checkpoint.finish()
+    loaded = RunCheckpoint(journal_file)
+    loaded.load()
+    assert loaded.finished
+    loaded.reopen()
+    reloaded = RunCheckpoint(journal_file)
+    reloaded.load()
+    assert not reloaded.finished
+
+def test_known_uscores_keep_estimates_marked(journal_file):
+    emails = make_emails(3)
+    checkpoint = journal_run(journal_file, emails)
+    checkpoint.record(emails[0], 9.0)
+    checkpoint.record(emails[1], 2.5, estimated=True)
+    loaded = RunCheckpoint(journal_file)
+    loaded.load()
+    known = loaded.known_uscores()
+    by_id = {e.msg_id: e for e in loaded.emails}
+    assert known == {id(by_id["m0"]): 9.0, id(by_id["m1"]): 2.5} # m2 is still to be scored
+    assert by_id["m1"].estimated and not by_id["m0"].estimated
+
+def test_retrying_flagged_emails_only_queries_the_failures(journal_file):
+    emails = make_emails(3)
+    checkpoint = journal_run(journal_file, emails)
+    checkpoint.record(emails[0], 9.0)
+    checkpoint.record(emails[1], RuntimeError("Query failed."))
+    loaded = RunCheckpoint(journal_file)
+    loaded.load()
+    known = loaded.known_uscores(retry_flagged=True)
+    by_id = {e.msg_id: e for e in loaded.emails}
+    assert known[id(by_id["m0"])] == 9.0
+    assert id(by_id["m1"]) not in known # queried again
+    assert str(known[id(by_id["m2"])]) == NOT_SCORED_MESSAGE # never scored, so reported as not processed
+
+def test_restart_carries_scores_over_by_message_id(journal_file):
+    emails = make_emails(3)
+    checkpoint = journal_run(journal_file, emails[:2]) # stopped while streaming, before the third email
+    checkpoint.record(emails[0], 7.0)
+    checkpoint.record(emails[1], 1.5, estimated=True)
+
+    loaded = RunCheckpoint(journal_file)
+    loaded.load()
+    refetched = make_emails(3) # the same messages, fetched again as new objects
+    known = loaded.restart(refetched)
+    assert known == {id(refetched[0]): 7.0, id(refetched[1]): 1.5}
+    assert refetched[1].estimated and not refetched[0].estimated
+
+    reloaded = RunCheckpoint(journal_file) # the new journal holds every email, and the carried scores
+    assert reloaded.load()
+    assert [e.msg_id for e in reloaded.emails] == ["m0", "m1", "m2"]
+    assert reloaded.scores == {"m0": 7.0, "m1": 1.5}
+    assert reloaded.estimated == {"m1"}
+
+def test_record_uscores_journals_estimates_as_estimates(journal_file):
+    from toneRank import make_future
+    emails = make_emails(3)
+    emails[1].estimated = True
+    checkpoint = journal_run(journal_file, emails)
+    checkpoint.record_uscores(emails, {id(emails[0]): make_future(4.0), id(emails[1]): make_future(6.0),
+                                       id(emails[2]): make_future(RuntimeError("Query failed."))})
+    loaded = RunCheckpoint(journal_file)
+    loaded.load()
+    assert loaded.scores == {"m0": 4.0, "m1": 6.0}
+    assert loaded.estimated == {"m1"}
+    assert loaded.failures == {"m2": "Query failed."}
+
+def test_journaled_jobs_record_results_but_not_budget_stops(journal_file):
+    emails = make_emails(4)
+    checkpoint = journal_run(journal_file, emails)
+    def score(job):
+        if job[0] is emails[1]:
+            raise RuntimeError("Query failed.")
+        return None if job[0] is emails[2] else 5.0
+    journaled = checkpoint.journaled(score)
+    assert journaled((emails[0],)) == 5.0
+    with pytest.raises(RuntimeError):
+        journaled((emails[1],))
+    assert journaled((emails[2],)) is None
+    batch = checkpoint.journaled(lambda job: [2.0, None], batch=True)
+    batch(([emails[3], emails[2]],))
+    loaded = RunCheckpoint(journal_file)
+    loaded.load()
+    assert loaded.scores == {"m0": 5.0, "m3": 2.0}
+    assert loaded.failures == {"m1": "Query failed."}
@@ -0,0 +1,82 @@
+# Checks that the DomainTrie matches subdomain and wildcard entries, and that lists are loaded from files
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from domainClassifier import DomainTrie, DomainClassifier, sender_address, PUBLIC, DISPOSABLE, ORGANISATION
+
+
+def make_trie(entries):
+    """ Returns a frozen DomainTrie holding the {entry: kind} entries. """
+    trie = DomainTrie()
+    for entry, kind in entries.items():
+        trie.add(entry, kind)
+    trie.freeze()
+    return trie
+
+
+def test_an_entry_covers_the_domain_and_its_subdomains():
+    trie = make_trie({"example.com": PUBLIC})
+    assert trie.lookup("example.com") == PUBLIC
+    assert trie.lookup("mail.example.com") == PUBLIC
+    assert trie.lookup("a.b.example.com") == PUBLIC
+    assert trie.lookup("com") is None
+    assert trie.lookup("badexample.com") is None
+    assert trie.lookup("example.org") is None
+
+def test_a_wildcard_covers_only_the_subdomains():
+    trie = make_trie({"*.edu": ORGANISATION})
+    assert trie.lookup("mit.edu") == ORGANISATION
+    assert trie.lookup("cs.mit.edu") == ORGANISATION
+    assert trie.lookup("edu") is None
+
+def test_the_most_specific_entry_wins():
+    trie = make_trie({"example.com": PUBLIC, "corp.example.com": ORGANISATION, "*.temp.example.com": DISPOSABLE})
+    assert trie.lookup("example.com") == PUBLIC
+    assert trie.lookup("www.example.com") == PUBLIC
+    assert trie.lookup("corp.example.com") == ORGANISATION
+    assert trie.lookup("eu.corp.example.com") == ORGANISATION
+    assert trie.lookup("temp.example.com") == PUBLIC # the wildcard does not cover temp.example.com itself
+    assert trie.lookup("x.temp.example.com") == DISPOSABLE
+
+def test_entries_can_be_added_in_any_order():
+    entries = {"mail.example.com": ORGANISATION, "example.com": PUBLIC, "*.example.com": DISPOSABLE}
+    forwards = make_trie(entries)
+    backwards = make_trie(dict(reversed(list(entries.items()))))
+    for domain in ["example.com", "mail.example.com", "x.mail.example.com", "other.example.com"]:
+        assert forwards.lookup(domain) == backwards.lookup(domain)
+    assert forwards.lookup("example.com") == PUBLIC
+    assert forwards.lookup("other.example.com") == DISPOSABLE
+    assert forwards.lookup("x.mail.example.com") == ORGANISATION
+
+@pytest.mark.parametrize("entry", ["", "example..com", "*.", "mail.*.example.com", "*example.com"])
+def test_invalid_entries_are_rejected(entry):
+    with pytest.raises(ValueError):
+        DomainTrie().add(entry, PUBLIC)
+
+def test_lists_are_loaded_by_kind_with_comments_and_invalid_lines_skipped(tmp_path):
+    (tmp_path / "public.txt").write_text("# Free providers\nmail.test\nExample.Test.  # trailing dot\n")
+    (tmp_path / "disposable_extra.txt").write_text("*.throwaway.test\nnot..valid\n\n")
+    (tmp_path / "organisation.txt").write_text("work.mail.test\n")
+    classifier = DomainClassifier(str(tmp_path))
+    assert classifier.classify("mail.test") == PUBLIC
+    assert classifier.classify("example.test") == PUBLIC
+    assert classifier.classify("x.throwaway.test") == DISPOSABLE
+    assert classifier.classify("work.mail.test") == ORGANISATION
+    assert classifier.is_personal("eu.mail.test")
+    assert not classifier.is_personal("work.mail.test")
+    assert not classifier.is_personal("throwaway.test")
+    assert classifier.invalid == 1
+
+@pytest.mark.parametrize("sender, expected", [
+    ("Alice <Alice@Example.com>", ("alice@example.com", "example.com")),
+    ('"Smith, Bob" <bob@mail.example.org>', ("bob@mail.example.org", "mail.example.org")),
+    ("carol@example.net", ("carol@example.net", "example.net")),
+    ("", ("", "")),
+])
+def test_sender_address(sender, expected):
+    assert sender_address(sender) == expected
@@ -0,0 +1,64 @@
+# Checks that a stream of emails is grouped by thread just as a full list is
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from emailThreads import group_threads, group_thread_stream
+from myEmail import Email
+
+
+def make_inbox(size, rnd):
+    """ Returns size emails in threads of 1-4 messages, newest first like a Gmail listing (some without a thread). """
+    emails = []
+    thread = 0
+    while len(emails) < size:
+        thread_id = f"t{thread}" if rnd.random() < 0.9 else None
+        for _ in range(rnd.randint(1, 4) if thread_id is not None else 1):
+            emails.append(Email(f"Subject {len(emails)}", f"sender{thread}@example.com", "", f"Body {len(emails)}",
+                                msg_id=f"m{len(emails)}", thread_id=thread_id))
+        thread = thread + 1
+    emails = emails[:size]
+    for i, e in enumerate(emails):
+        e.internal_date = 10 ** 6 - i
+    order = list(range(size))
+    rnd.shuffle(order)
+    positions = sorted(order[:size // 2]) + order[size // 2:] # the first half in order, then the rest shuffled
+    return emails, positions
+
+def summary(e):
+    return (e.msg_id, e.message_count, e.thread_context)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_a_stream_is_grouped_like_the_full_list(seed):
+    emails, arrival = make_inbox(60, random.Random(seed))
+    expected = [summary(e) for e in group_threads([Email.from_dict(e.to_dict()) for e in emails])]
+    thread_sizes = Counter(e.thread_id for e in emails)
+    streamed = sorted(group_thread_stream(((position, emails[position]) for position in arrival), thread_sizes),
+                      key=lambda pair: pair[0])
+    assert [summary(e) for _, e in streamed] == expected
+
+def test_a_thread_is_held_until_its_last_message_arrives():
+    latest, middle, first = [Email(f"Re: Plan {i}", "a@example.com", "", f"Message {i}", msg_id=f"m{i}", thread_id="t",
+                                   internal_date=3 - i) for i in range(3)]
+    alone = Email("Other", "b@example.com", "", "Alone", msg_id="m3", thread_id="u", internal_date=1)
+    stream = iter([(0, latest), (3, alone), (1, middle), (2, first)])
+    grouped = group_thread_stream(stream, {"t": 3, "u": 1})
+    assert next(grouped) == (3, alone) # the single message is passed on at once
+    position, e = next(grouped)
+    assert (position, e) == (0, latest)
+    assert e.message_count == 3 and "Message 1" in e.thread_context and "Message 2" in e.thread_context
+    assert list(grouped) == []
+
+def test_a_thread_missing_a_message_is_passed_on_when_the_stream_ends():
+    latest, first = [Email("Plan", "a@example.com", "", f"Message {i}", msg_id=f"m{i}", thread_id="t",
+                           internal_date=2 - i) for i in range(2)]
+    grouped = list(group_thread_stream(iter([(0, latest), (2, first)]), {"t": 3})) # one message could not be fetched
+    assert grouped == [(0, latest)]
+    assert latest.message_count == 2 and "Message 1" in latest.thread_context
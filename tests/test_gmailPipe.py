@@ -0,0 +1,103 @@
+# Checks how GmailPipe lists, streams and incrementally syncs messages, and its fallbacks to a full scan
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST_DIR))
+sys.path.insert(0, os.path.join(os.path.dirname(TEST_DIR), "benchmarks"))
+import pytest
+from googleapiclient.errors import HttpError
+from gmailPipe import GmailPipe, SYNC_STATE_FILE_NAME
+from fakeGmail import FakeGmailService
+from synthInbox import make_inbox
+
+
+class RecordingGmailService(FakeGmailService):
+
+    """ A FakeGmailService which counts full scans, and whose history can be made to fail with a status. """
+
+    def __init__(self, messages):
+        super().__init__(messages)
+        self.scans = 0 # the pages of messages().list served
+        self.history_status = None # the status history().list fails with (None to answer it)
+
+    def list(self, *args, **kwargs):
+        self.scans = self.scans + 1
+        return super().list(*args, **kwargs)
+
+    def _history_list(self, *args, **kwargs):
+        if self.history_status is not None:
+            raise FakeGmailService.make_error(self.history_status, "History unavailable")
+        return super()._history_list(*args, **kwargs)
+
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    """ Returns the fake Gmail service GmailPipe is pointed at, serving 20 messages (plus 5 to deliver later). """
+    monkeypatch.chdir(tmp_path) # for the sync state
+    inbox = make_inbox(25, seed=3)
+    service = RecordingGmailService(inbox[5:])
+    service.later = inbox[:5]
+    monkeypatch.setattr(GmailPipe, "service_override", service)
+    return service
+
+def msg_ids(emails):
+    return {e.msg_id for e in emails}
+
+
+def test_the_first_sync_scans_and_saves_the_history_id(service):
+    emails = GmailPipe.sync_emails_last_24_hours()
+    assert msg_ids(emails) == set(service.order)
+    assert service.scans == 1
+    assert os.path.exists(SYNC_STATE_FILE_NAME)
+    history_id, stored = GmailPipe.load_sync_state()
+    assert history_id == str(service.history_id) and msg_ids(stored) == msg_ids(emails)
+
+def test_a_later_sync_only_fetches_the_new_messages(service):
+    first = GmailPipe.sync_emails_last_24_hours()
+    service.deliver(service.later)
+    emails = GmailPipe.sync_emails_last_24_hours()
+    assert service.scans == 1 # no second scan
+    assert msg_ids(emails) == msg_ids(first) | {message['id'] for message in service.later}
+    assert [e.internal_date for e in emails] == sorted((e.internal_date for e in emails), reverse=True)
+
+def test_an_expired_history_falls_back_to_a_full_scan(service, capsys):
+    GmailPipe.sync_emails_last_24_hours()
+    service.deliver(service.later)
+    service.history_status = 404
+    emails = GmailPipe.sync_emails_last_24_hours()
+    assert "expired" in capsys.readouterr().out
+    assert service.scans == 2
+    assert msg_ids(emails) == set(service.order)
+    assert GmailPipe.load_sync_state()[0] == str(service.history_id) # the next sync starts from here
+
+def test_other_history_errors_are_raised(service):
+    GmailPipe.sync_emails_last_24_hours()
+    service.history_status = 500
+    with pytest.raises(HttpError):
+        GmailPipe.sync_emails_last_24_hours()
+
+def test_a_corrupt_sync_state_falls_back_to_a_full_scan(service):
+    with open(SYNC_STATE_FILE_NAME, 'w', encoding='utf-8') as state_file:
+        state_file.write('{"history_id": ')
+    emails = GmailPipe.sync_emails_last_24_hours()
+    assert service.scans == 1 and msg_ids(emails) == set(service.order)
+
+def test_streaming_counts_the_messages_of_each_thread_first(service):
+    thread_sizes = {}
+    stream = GmailPipe.iter_emails_last_24_hours(thread_sizes=thread_sizes)
+    position, e = next(stream)
+    assert sum(thread_sizes.values()) == len(service.order)
+    assert thread_sizes[e.thread_id] == sum(1 for msg_id in service.order if service.store[msg_id]['threadId'] == e.thread_id)
+    assert len(list(stream)) == len(service.order) - 1
+
+def test_a_snippet_body_is_cut_to_the_byte_cap_on_a_character_boundary(monkeypatch):
+    monkeypatch.setattr(GmailPipe, "max_body_bytes", 10)
+    msg_data = {'id': "m1", 'threadId': "t1", 'internalDate': "0", 'snippet': "Caf&eacute; &amp; naïve €5",
+                'payload': {'headers': [{'name': 'Subject', 'value': "Menu"}, {'name': 'From', 'value': "a@example.com"}]}}
+    body = GmailPipe.parse_message(msg_data).body
+    assert body == "Café & na" # "Café & naï" is 11 bytes, and half of "ï" is dropped
+    assert len(body.encode("utf-8")) <= 10
@@ -0,0 +1,29 @@
+# Checks the nearest-rank percentiles reported in the run metrics
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from metrics import percentile
+
+
+@pytest.mark.parametrize("values, quantile, expected", [
+    ([1, 2, 3, 4], 0.5, 2), # a whole-number rank picks that element, not the next
+    ([1, 2, 3, 4], 0.25, 1),
+    ([1, 2, 3, 4], 0.75, 3),
+    ([1, 2, 3, 4], 0.6, 3),
+    ([1, 2, 3, 4, 5], 0.5, 3),
+    (list(range(1, 21)), 0.95, 19),
+    (list(range(1, 101)), 0.99, 99),
+    ([7], 0.5, 7),
+    ([1, 2, 3], 0.0, 1),
+    ([1, 2, 3], 1.0, 3),
+])
+def test_nearest_rank(values, quantile, expected):
+    assert percentile(values, quantile) == expected
+
+def test_empty():
+    assert percentile([], 0.5) is None
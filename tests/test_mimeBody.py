@@ -0,0 +1,74 @@
+# Checks which MIME part of a Gmail payload is chosen as the body, and how much of it is decoded
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mimeBody import walk_parts, choose_body_part, decode_data, extract_body, MAX_DEPTH
+
+
+def encode(text, charset="utf-8"):
+    return base64.urlsafe_b64encode(text.encode(charset)).decode("ascii")
+
+def leaf(mime_type, text="", filename="", headers=None):
+    """ Returns a leaf part holding text inline. """
+    return {'mimeType': mime_type, 'filename': filename, 'headers': headers or [],
+            'body': {'data': encode(text)} if text else {}}
+
+def multipart(mime_type, *parts, headers=None):
+    return {'mimeType': mime_type, 'headers': headers or [], 'parts': list(parts), 'body': {}}
+
+
+def test_walk_parts_yields_leaves_in_order_and_skips_attachments():
+    forwarded = multipart("message/rfc822", leaf("text/plain", "Forwarded"), headers=[
+        {'name': 'Content-Disposition', 'value': 'attachment; filename="old.eml"'}])
+    payload = multipart("multipart/mixed",
+                        multipart("multipart/alternative", leaf("text/plain", "Plain"), leaf("text/html", "<p>Html</p>")),
+                        leaf("application/pdf", "%PDF", filename="invoice.pdf"),
+                        forwarded,
+                        leaf("text/plain", "Footer"))
+    assert [part['mimeType'] for part in walk_parts(payload)] == ["text/plain", "text/html", "text/plain"]
+
+def test_walk_parts_stops_at_the_max_depth():
+    payload = leaf("text/plain", "Deep")
+    for _ in range(MAX_DEPTH + 1):
+        payload = multipart("multipart/mixed", payload)
+    assert list(walk_parts(payload)) == []
+
+def test_plain_text_is_chosen_over_html():
+    payload = multipart("multipart/alternative", leaf("text/html", "<p>Html</p>"), leaf("text/plain", "Plain"))
+    part, is_html = choose_body_part(payload)
+    assert part['mimeType'] == "text/plain" and not is_html
+
+def test_html_is_chosen_when_there_is_no_plain_text():
+    payload = multipart("multipart/mixed", leaf("text/plain"), leaf("text/html", "<p>Html</p>"),
+                        leaf("text/plain", "Attached", filename="notes.txt"))
+    part, is_html = choose_body_part(payload)
+    assert part['mimeType'] == "text/html" and is_html
+
+def test_a_part_stored_separately_counts_as_a_body():
+    stored = {'mimeType': "text/plain", 'headers': [], 'body': {'attachmentId': "a1", 'size': 90000}}
+    assert choose_body_part(multipart("multipart/alternative", stored, leaf("text/html", "<p>Html</p>")))[0] is stored
+
+def test_no_text_part():
+    assert choose_body_part(multipart("multipart/mixed", leaf("image/png", "png"))) == (None, False)
+    assert choose_body_part(leaf("text/plain")) == (None, False)
+
+def test_decode_data_does_not_cut_a_utf8_character_in_half():
+    raw, truncated = decode_data(encode("abé€"), 4) # 'é' is 2 bytes, '€' is 3
+    assert truncated and raw == "abé".encode("utf-8")
+    assert decode_data(encode("abc"), 10) == (b"abc", False)
+    assert decode_data("not base64!", 10) == (b"", False)
+
+def test_extract_body_uses_the_declared_charset():
+    part = leaf("text/plain", headers=[{'name': 'Content-Type', 'value': 'text/plain; charset="ISO-8859-1"'}])
+    part['body'] = {'data': encode("café", "iso-8859-1")}
+    body, charset, truncated = extract_body(part)
+    assert body.decode(charset) == "café" and not truncated
+
+def test_extract_body_converts_html_and_caps_the_text():
+    body, charset, truncated = extract_body(leaf("text/html", "<p>" + "word " * 100 + "</p>"), max_bytes=20)
+    assert "<p>" not in body and len(body) == 20 and truncated
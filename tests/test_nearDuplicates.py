@@ -0,0 +1,103 @@
+# Checks that near-duplicate emails share a score only within a category and a sender
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+import nearDuplicates
+from myEmail import Email
+from nearDuplicates import NearDuplicateIndex, fingerprint, email_fingerprint, HISTORY_FILE_NAME, HISTORY_TTL
+from runOptions import RunOptions, Scorers
+from toneRank import find_near_duplicates
+
+ALERT = "Your build 4512 failed on branch main after 12 minutes. Open the pipeline to see the failing job and its logs."
+
+
+def make_email(sender, body=ALERT, subject="Build failed"):
+    return Email(subject, sender, "", body)
+
+
+def test_copies_which_only_differ_in_numbers_share_a_fingerprint():
+    original = make_email("ci@builds.example.com")
+    copy = make_email("ci@builds.example.com", ALERT.replace("4512", "4513").replace("12", "9"))
+    assert fingerprint(original) == fingerprint(copy)
+    assert fingerprint(make_email("ci@builds.example.com", "Too short to fingerprint")) is None
+
+def test_a_score_is_reused_for_a_near_duplicate_from_the_same_sender():
+    index = NearDuplicateIndex()
+    index.remember(make_email("ci@builds.example.com"), 1, 4.0)
+    assert index.reuse(make_email("ci@builds.example.com", ALERT.replace("4512", "977")), 1) == 4.0
+    assert index.reuse(make_email("ci@builds.example.com", "Your invoice for March is ready to download from the "
+                                                            "billing page of your account."), 1) is None
+    assert index.reused == 1
+
+def test_organisation_mail_is_matched_on_the_sender_domain():
+    index = NearDuplicateIndex()
+    index.remember(make_email("CI <ci@builds.example.com>"), 1, 4.0)
+    assert index.reuse(make_email("alerts@builds.example.com"), 1) == 4.0
+    assert index.reuse(make_email("ci@builds.example.org"), 1) is None
+
+@pytest.mark.parametrize("category", [0, 2])
+def test_other_mail_is_matched_on_the_sender_address(category):
+    index = NearDuplicateIndex()
+    index.remember(make_email("alice@gmail.com"), category, 7.0)
+    assert index.reuse(make_email("bob@gmail.com"), category) is None # a public domain says nothing about the sender
+    assert index.reuse(make_email("Alice <Alice@gmail.com>"), category) == 7.0
+
+def test_scores_are_not_shared_across_categories():
+    index = NearDuplicateIndex()
+    index.remember(make_email("ci@builds.example.com"), 1, 4.0)
+    assert index.reuse(make_email("ci@builds.example.com"), 0) is None
+
+def test_find_near_duplicates_only_groups_emails_from_the_same_sender():
+    first, copy, other = make_email("alice@gmail.com"), make_email("alice@gmail.com"), make_email("bob@gmail.com")
+    assert find_near_duplicates([(first, 2), (copy, 2), (other, 2)]) == {id(copy): first}
+
+def test_the_fingerprint_is_computed_once_per_body(monkeypatch):
+    calls = []
+    def counting_fingerprint(email):
+        calls.append(email)
+        return fingerprint(email)
+    monkeypatch.setattr(nearDuplicates, "fingerprint", counting_fingerprint)
+    email = make_email("ci@builds.example.com")
+    index = NearDuplicateIndex()
+    index.reuse(email, 1)
+    index.remember(email, 1, 4.0)
+    find_near_duplicates([(email, 1)])
+    assert len(calls) == 1
+    short = make_email("ci@builds.example.com", "Too short")
+    email_fingerprint(short)
+    assert email_fingerprint(short) is None and len(calls) == 2 # too short, which is kept too
+    email.body = "A different body with enough words in it to have a fingerprint of its own."
+    email_fingerprint(email)
+    assert len(calls) == 3
+
+
+def test_the_history_is_saved_and_loaded(tmp_path):
+    file_name = str(tmp_path / HISTORY_FILE_NAME)
+    index = NearDuplicateIndex(file_name=file_name)
+    index.remember(make_email("ci@builds.example.com"), 1, 4.0)
+    index.save()
+    assert NearDuplicateIndex(file_name=file_name).reuse(make_email("alerts@builds.example.com"), 1) == 4.0
+    assert NearDuplicateIndex(file_name=file_name).reuse(make_email("ci@example.net"), 1) is None
+
+def test_expired_and_old_format_history_entries_are_dropped(tmp_path):
+    file_name = str(tmp_path / HISTORY_FILE_NAME)
+    fp = fingerprint(make_email("ci@builds.example.com"))
+    with open(file_name, 'w', encoding='utf-8') as file:
+        json.dump([[fp, 1, 4.0, time.time()], # stored without a sender
+                   [fp, 1, "builds.example.com", 5.0, time.time() - HISTORY_TTL - 60]], file)
+    index = NearDuplicateIndex(file_name=file_name)
+    assert index.entries == []
+    assert index.reuse(make_email("ci@builds.example.com"), 1) is None
+
+def test_the_history_is_only_kept_when_asked_for(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path) # for the score history
+    assert Scorers.from_options(RunOptions(score_log=False)).near_duplicates.file_name is None
+    assert Scorers.from_options(RunOptions(score_log=False, dedupe_history=True)).near_duplicates.file_name == HISTORY_FILE_NAME
+    assert Scorers.from_options(RunOptions(score_log=False, dedupe_history=True, use_cache=False)).near_duplicates.file_name is None
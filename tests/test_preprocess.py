@@ -0,0 +1,43 @@
+# Checks that only text/html parts are converted from HTML, so plain text which looks like markup is kept
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from preprocess import Preprocessor
+from mimeBody import extract_body
+
+
+def make_part(mime_type, text):
+    """ Returns a Gmail payload part of the given MIME type holding text. """
+    data = base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+    return {"mimeType": mime_type, "headers": [{"name": "Content-Type", "value": f"{mime_type}; charset=utf-8"}],
+            "body": {"size": len(text), "data": data}}
+
+
+@pytest.mark.parametrize("body", [
+    "Is x <p and y >q in the new pricing model?",
+    "Use <br> between the lines, and 2<p<5 for the range.",
+    "The <div> in the header is misaligned, can you fix it before the demo?",
+])
+def test_plain_text_which_looks_like_markup_is_kept(body):
+    assert Preprocessor().clean(body) == body
+
+def test_plain_text_parts_are_not_converted():
+    body = "Please keep the <p> and <br> tags in the template."
+    raw, charset, truncated = extract_body(make_part("text/plain", body))
+    assert raw.decode(charset) == body
+    assert not truncated
+
+def test_html_parts_are_converted_to_text():
+    payload = {"mimeType": "multipart/mixed", "headers": [], "body": {"size": 0},
+               "parts": [make_part("text/html", "<html><body><p>The server is <b>down</b>.</p><p>Call me.</p></body></html>")]}
+    text, _, truncated = extract_body(payload)
+    cleaned = Preprocessor().clean(text)
+    assert "<" not in cleaned
+    assert "The server is down." in cleaned and "Call me." in cleaned
+    assert not truncated
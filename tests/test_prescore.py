@@ -0,0 +1,52 @@
+# Checks that bulk mail is only pre-scored when asked for, and only when nothing hints at urgency
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from myEmail import Email
+from prescore import PreScorer, LOW_USCORE
+from runOptions import RunOptions, Scorers
+from toneRank import parse_args, score_locally
+
+
+def make_newsletter(subject="This week's deals", body="See our offers. Unsubscribe or manage preferences here."):
+    return Email(subject, "Shop <noreply@shop.example.com>", "", body,
+                 headers={"list-unsubscribe": "<mailto:leave@shop.example.com>", "precedence": "bulk"})
+
+@pytest.fixture
+def args(monkeypatch):
+    """ Returns a function parsing the command line options given. """
+    def parse(*argv):
+        monkeypatch.setattr(sys, "argv", ["toneRank.py", *argv])
+        return RunOptions.from_args(parse_args())
+    return parse
+
+
+def test_prescoring_is_off_unless_asked_for(args, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    assert not RunOptions().prescore and not args().prescore
+    assert Scorers.from_options(RunOptions(score_log=False)).prescorer is None
+    assert score_locally(make_newsletter(), 1, 0.0, Scorers.from_options(RunOptions(score_log=False))) is None
+    assert args("--prescore").prescore
+    assert Scorers.from_options(RunOptions(prescore=True, score_log=False)).prescorer is not None
+
+def test_bulk_mail_is_prescored():
+    prescorer = PreScorer()
+    assert prescorer.prescore(make_newsletter()) == LOW_USCORE
+    assert score_locally(make_newsletter(), 1, 0.0, Scorers(prescorer=prescorer)) == LOW_USCORE
+    assert score_locally(make_newsletter(), 2, 0.0, Scorers(prescorer=prescorer)) is None # only Category 1
+    assert prescorer.calls_avoided == 2
+
+@pytest.mark.parametrize("email, keyword_modifier", [
+    (make_newsletter(), 1.0), # has keywords
+    (make_newsletter(subject="Re: your order"), 0.0),
+    (make_newsletter(body="Action required: your payment is overdue. Unsubscribe here."), 0.0),
+    (make_newsletter(subject="LAST CHANCE TO SAVE"), 0.0),
+    (Email("Lunch?", "friend@example.com", "", "Are you free at noon?"), 0.0), # not bulk mail
+])
+def test_anything_which_could_be_urgent_is_sent_to_llama3(email, keyword_modifier):
+    assert PreScorer().prescore(email, keyword_modifier) is None
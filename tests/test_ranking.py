@@ -0,0 +1,81 @@
+# Checks that Ranking gives the priority order the report intends
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from myEmail import Email
+from ranking import Ranking
+
+
+def make_scored(size, rnd):
+    """ Returns size (email, category, has_keywords) triples with uscores on a coarse grid, so many tie. """
+    scored = []
+    for i in range(size):
+        e = Email(f"Subject {i}", f"sender{i}@example.com", "", "")
+        e.uscore = rnd.randint(0, 20) / 2.0 + (rnd.choice([0.0, 0.5, 1.5]) if rnd.random() < 0.3 else 0.0)
+        scored.append((e, rnd.choice([0, 1, 2]), rnd.random() < 0.3))
+    return scored
+
+def reference_order(scored):
+    """ The order rank_emails intends: six tiers (category 0 with keywords, category 0, category 1 with
+     keywords, ...), each sorted with Email's comparisons (highest uscore first, ties in input order). """
+    tiers = [[] for _ in range(6)]
+    for e, category, has_keywords in scored:
+        tiers[category * 2 + (0 if has_keywords else 1)].append(e)
+    return [e for tier in tiers for e in sorted(tier)]
+
+def ids(emails):
+    return [id(e) for e in emails]
+
+
+@pytest.mark.parametrize("size", [0, 1, 10, 100, 1000])
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_reference_order(size, seed):
+    scored = make_scored(size, random.Random(seed))
+    expected = reference_order(scored)
+    ranking = Ranking(scored)
+    assert ids(ranking.to_list()) == ids(expected)
+    assert ids(ranking) == ids(expected)
+    assert len(ranking) == size
+    for k in (0, 1, 5, 10, size + 1):
+        assert ids(ranking.top(k)) == ids(expected[:k])
+
+@pytest.mark.parametrize("seed", range(5))
+def test_streamed_insertion_keeps_original_positions(seed):
+    rnd = random.Random(seed)
+    scored = make_scored(500, rnd)
+    shuffled = list(enumerate(scored))
+    rnd.shuffle(shuffled)
+    streamed = Ranking()
+    for position, (e, category, has_keywords) in shuffled:
+        streamed.add(e, category, has_keywords, position)
+    expected = reference_order(scored)
+    assert ids(streamed) == ids(expected)
+    assert ids(streamed.top(10)) == ids(expected[:10])
+
+def test_tiers_come_before_uscores():
+    scored = []
+    for category, has_keywords, uscore in [(2, False, 10.0), (2, True, 9.0), (1, False, 8.0), (1, True, 7.0),
+                                           (0, False, 6.0), (0, True, 0.0)]:
+        e = Email(f"C{category}{'K' if has_keywords else ''}", "sender@example.com", "", "")
+        e.uscore = uscore
+        scored.append((e, category, has_keywords))
+    assert [e.subject for e in Ranking(scored)] == ["C0K", "C0", "C1K", "C1", "C2K", "C2"]
+
+def test_ties_keep_the_order_emails_were_added_in():
+    emails = [Email(f"Subject {i}", "sender@example.com", "", "") for i in range(5)]
+    for e in emails:
+        e.uscore = 5.0
+    ranking = Ranking((e, 1, False) for e in emails)
+    assert ids(ranking) == ids(emails)
+    assert ids(ranking.top(3)) == ids(emails[:3])
+
+def test_items_yield_what_was_added():
+    scored = make_scored(50, random.Random(0))
+    assert [(id(e), category, has_keywords) for e, category, has_keywords in Ranking(scored).items()] == \
+        [(id(e), category, has_keywords) for e, category, has_keywords in scored]
@@ -0,0 +1,87 @@
+# Checks that the RateLimiter paces requests and backs off as Groq's rate-limit headers say
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from llm import RateLimiter, parse_duration, MIN_REQUESTS_PER_MINUTE, DEFAULT_RETRY_AFTER
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("2m59.56s", 179.56), ("7.66s", 7.66), ("120ms", 0.12), ("1h", 3600.0), ("1h2m3s", 3723.0),
+    ("30", 30.0), ("0.5", 0.5),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+@pytest.mark.parametrize("value", [None, "", "soon", "ms"])
+def test_parse_duration_rejects_what_it_cannot_read(value):
+    assert parse_duration(value) is None
+
+
+def test_a_burst_is_capped_at_the_in_flight_limit():
+    limiter = RateLimiter(requests_per_minute=6000, max_in_flight=2)
+    limiter.acquire()
+    limiter.acquire()
+    third = threading.Thread(target=limiter.acquire)
+    third.start()
+    third.join(0.1)
+    assert third.is_alive() # waiting for a slot
+    limiter.release()
+    third.join(1.0)
+    assert not third.is_alive()
+    assert limiter.in_flight == 2
+
+def test_the_headers_spread_the_remaining_requests_over_the_reset_time():
+    limiter = RateLimiter()
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "120", "x-ratelimit-reset-requests": "1m"})
+    assert limiter.rate == pytest.approx(2.0)
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m"})
+    assert limiter.rate == pytest.approx(MIN_REQUESTS_PER_MINUTE / 60.0)
+    assert limiter.blocked_until >= time.monotonic() + 59.0
+
+def test_malformed_headers_are_ignored():
+    limiter = RateLimiter(requests_per_minute=60)
+    limiter.update_from_headers({})
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "many"})
+    assert limiter.rate == pytest.approx(1.0) and limiter.blocked_until == 0.0
+
+def test_running_out_of_tokens_blocks_until_they_reset():
+    limiter = RateLimiter()
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "10", "x-ratelimit-reset-requests": "10s",
+                                 "x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "7.5s"})
+    assert limiter.blocked_until >= time.monotonic() + 7.0
+
+def test_a_429_halves_the_concurrency_and_backs_off():
+    limiter = RateLimiter(max_in_flight=8)
+    limiter.on_rate_limited({"retry-after": "3"})
+    assert limiter.in_flight_limit == 4.0 and limiter.tokens == 0.0
+    assert limiter.blocked_until >= time.monotonic() + 2.9
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    assert limiter.in_flight_limit == 1.0 # never below one request
+    assert limiter.blocked_until >= time.monotonic() + DEFAULT_RETRY_AFTER - 0.1
+
+def test_successes_grow_the_concurrency_back_slowly():
+    limiter = RateLimiter(requests_per_minute=60000, max_in_flight=4)
+    limiter.on_rate_limited()
+    limiter.blocked_until = 0.0
+    limiter.tokens = limiter.capacity
+    for _ in range(3):
+        with limiter.slot():
+            pass
+    assert 2.0 < limiter.in_flight_limit < 4.0
+    with pytest.raises(RuntimeError):
+        with limiter.slot():
+            raise RuntimeError("Request failed")
+    assert limiter.in_flight == 0
+    for _ in range(50):
+        with limiter.slot():
+            pass
+    assert limiter.in_flight_limit == 4.0
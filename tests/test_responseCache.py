@@ -0,0 +1,87 @@
+# Checks that only Llama3 responses which parse are cached, in memory and on disk
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from llm import GroqLlama, MODEL, TEMP, MAX_RESPONSE_LEN
+from myEmail import Email
+from responseCache import ResponseCache
+from toneRank import urgency_prompt_C1, urgency_prompt_C2, urgency_prompt_batch, uscore_prompt, PROMPTS_FILE_NAME
+
+
+@pytest.fixture
+def prompt_data():
+    with open(PROMPTS_FILE_NAME, 'r') as f:
+        return json.load(f)
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    yield cache
+    cache.close()
+
+@pytest.fixture
+def make_client(monkeypatch, tmp_path, cache):
+    """ Returns a function making a GroqLlama using the cache, whose queries are answered by the responses
+     given (in turn), and which records them. The in-memory cache is cleared, as it would be in a new run. """
+    monkeypatch.chdir(tmp_path) # for the Llama3 log
+    monkeypatch.setattr(GroqLlama, "client_override", object()) # never connect to Groq
+    def make(*responses):
+        GroqLlama.get_cached_llama_response.cache_clear()
+        client = GroqLlama(cache=cache)
+        client.sent = []
+        def prompt_llama(prompt):
+            client.sent.append(prompt)
+            return responses[min(len(client.sent), len(responses)) - 1]
+        client.prompt_llama = prompt_llama
+        return client
+    yield make
+    GroqLlama.get_cached_llama_response.cache_clear()
+
+def make_emails(count):
+    return [Email(f"Subject {i}", f"sender{i}@example.com", f"Body {i}", "") for i in range(count)]
+
+
+@pytest.mark.parametrize("prompt_function", [urgency_prompt_C1, urgency_prompt_C2])
+def test_a_malformed_response_is_not_cached(make_client, prompt_data, prompt_function):
+    email = make_emails(1)[0]
+    client = make_client("I would rate this email a seven.", "7")
+    with pytest.raises(Exception):
+        prompt_function(email, client, prompt_data)
+    assert prompt_function(email, client, prompt_data) == 7.0 # asked again in the same run
+    rerun = make_client("3")
+    assert prompt_function(email, rerun, prompt_data) == 7.0 # the response which parsed was kept
+    assert len(client.sent) == 2 and rerun.sent == []
+
+def test_a_malformed_response_cached_earlier_is_evicted(make_client, prompt_data, cache):
+    email = make_emails(1)[0]
+    key = ResponseCache.make_key(uscore_prompt(email, prompt_data, 'uscore_prompt_one'), MODEL, TEMP, MAX_RESPONSE_LEN)
+    cache.put(key, "Seven.")
+    client = make_client("7")
+    assert urgency_prompt_C1(email, client, prompt_data) == 7.0
+    assert len(client.sent) == 1
+    assert cache.get(key) == "7"
+
+def test_a_malformed_batch_response_is_not_cached(make_client, prompt_data):
+    emails = make_emails(2)
+    client = make_client("Here are the scores: 4 and 5", "4", "5")
+    assert urgency_prompt_batch(emails, client, prompt_data, 'uscore_batch_prompt_one', urgency_prompt_C1) == [4.0, 5.0]
+    assert len(client.sent) == 3 # the batch, then each email on its own
+    rerun = make_client("[6, 8]")
+    assert urgency_prompt_batch(emails, rerun, prompt_data, 'uscore_batch_prompt_one', urgency_prompt_C1) == [6.0, 8.0]
+    assert len(rerun.sent) == 1 # the batch was asked again, as its malformed response was not kept
+    again = make_client("[1, 1]")
+    assert urgency_prompt_batch(emails, again, prompt_data, 'uscore_batch_prompt_one', urgency_prompt_C1) == [6.0, 8.0]
+    assert again.sent == []
+
+def test_unparsed_responses_are_cached_as_they_are(make_client, cache):
+    client = make_client("1. Reply to the landlord")
+    assert GroqLlama.get_cached_llama_response(client, "To-do list") == "1. Reply to the landlord"
+    rerun = make_client("Something else")
+    assert GroqLlama.get_cached_llama_response(rerun, "To-do list") == "1. Reply to the landlord"
+    assert rerun.sent == []
@@ -0,0 +1,47 @@
+# Checks that a run which fails or is interrupted leaves no body store or response cache open
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+import toneRank
+from llm import GroqLlama
+from myEmail import Email
+from responseCache import ResponseCache
+from runOptions import RunOptions
+
+
+class RecordingCache(ResponseCache):
+
+    """ A ResponseCache which remembers every instance opened, and whether it was closed. """
+
+    opened = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.closed = False
+        RecordingCache.opened.append(self)
+
+    def close(self):
+        super().close()
+        self.closed = True
+
+
+@pytest.mark.parametrize("error", [RuntimeError("Gmail is unavailable"), KeyboardInterrupt()])
+def test_a_stopped_run_closes_what_it_opened(monkeypatch, tmp_path, error):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(GroqLlama, "client_override", object()) # never connect to Groq
+    monkeypatch.setattr(toneRank, "ResponseCache", RecordingCache)
+    RecordingCache.opened = []
+    def stop(*args, **kwargs):
+        assert Email.body_store is not None # the run was spilling bodies
+        raise error
+    monkeypatch.setattr(toneRank, "get_emails", stop)
+
+    with pytest.raises(type(error)):
+        toneRank.toneRank_main(RunOptions(spill_bodies=True, checkpoint=False, score_log=False))
+    assert Email.body_store is None
+    assert len(RecordingCache.opened) == 1 and RecordingCache.opened[0].closed
@@ -0,0 +1,77 @@
+# Checks that the state store imports the CSV and JSON files earlier versions kept their state in
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from stateStore import StateStore
+
+
+@pytest.fixture
+def old_files(tmp_path):
+    """ Returns the names of the keyword, whitelist, report and sender history files, none of which exist yet. """
+    return [str(tmp_path / name) for name in ["keywords.csv", "email_whitelist.csv", "priority_report.csv",
+                                              "sender_history.json"]]
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / "state.sqlite3"))
+    yield store
+    store.close()
+
+def write(file_name, text):
+    with open(file_name, 'w', newline='', encoding='utf-8') as file:
+        file.write(text)
+
+
+def test_the_old_files_are_imported(store, old_files):
+    keyword_file, whitelist_file, report_file, history_file = old_files
+    write(keyword_file, " Urgent ,3\n\nInvoice,1.5\n")
+    write(whitelist_file, "Boss@Example.com\n@partner.org\nnot an address\n\n")
+    write(report_file, "7\n3\n")
+    write(history_file, json.dumps({"boss@example.com": [8.0, 2, 1000.0]}))
+
+    assert store.migrate(*old_files)
+    assert store.keywords() == {"urgent": 3.0, "invoice": 1.5}
+    whitelist = store.whitelist()
+    assert "boss@example.com" in whitelist and "not an address" not in whitelist
+    assert len(whitelist) == 2
+    assert store.get_setting("top_email_size") == 7
+    assert store.get_setting("todo_list_sample_size") == 3
+    assert store.senders() == {"boss@example.com": [8.0, 2, 1000.0]}
+
+def test_the_files_are_only_imported_once(store, old_files):
+    keyword_file = old_files[0]
+    write(keyword_file, "urgent,3\n")
+    assert store.migrate(*old_files)
+    store.remove_keyword("urgent")
+    write(keyword_file, "urgent,3\nlate,2\n")
+    assert not store.migrate(*old_files)
+    assert store.keywords() == {}
+
+def test_a_first_run_without_old_files_imports_nothing(store, old_files):
+    assert not store.migrate(*old_files)
+    assert store.keywords() == {} and store.whitelist() == {}
+    write(old_files[0], "urgent,3\n") # files appearing later are not imported
+    assert not store.migrate(*old_files)
+
+def test_a_corrupt_sender_history_is_dropped(store, old_files):
+    write(old_files[0], "urgent,3\n")
+    write(old_files[3], '{"boss@example.com": [8.0, ')
+    assert store.migrate(*old_files)
+    assert store.keywords() == {"urgent": 3.0}
+    assert store.senders() == {}
+
+def test_a_migrated_store_keeps_its_state_when_reopened(tmp_path, old_files):
+    write(old_files[0], "urgent,3\n")
+    store = StateStore(str(tmp_path / "state.sqlite3"))
+    store.migrate(*old_files)
+    store.close()
+    reopened = StateStore(str(tmp_path / "state.sqlite3"))
+    assert not reopened.migrate(*old_files)
+    assert reopened.keywords() == {"urgent": 3.0}
+    reopened.close()
@@ -1,15 +1,41 @@
 # The top-level class for the ToneRank application
 # @author Rylan Ahmadi (Ry305)
-# Last updated 07/16/2025
-# TODO: add email chain context
+# Last updated 10/18/2026
 # TODO: possibly add manual processing by keyword for the flagged emails, just in case.
 
-from gmailPipe import GmailPipe
-from llm import GroqLlama
+from gmailPipe import GmailPipe, BATCH_SIZE
+from mimeBody import MAX_BODY_BYTES
+from llm import GroqLlama, ScoringEngine, estimate_tokens
 from toneRank_io import ToneRank_IO
+from responseCache import ResponseCache
+from pipeline import StreamingPipeline
+from preprocess import Preprocessor, DEFAULT_BODY_TOKEN_BUDGET
+from batchJob import BatchJob, LocalBatchEndpoint, BATCH_REQUESTS_FILE_NAME, BATCH_EMAILS_FILE_NAME
+from prescore import DEFAULT_THRESHOLD as DEFAULT_PRESCORE_THRESHOLD
+from emailThreads import group_threads, group_thread_stream
+from nearDuplicates import NearDuplicateIndex, DEFAULT_MAX_DISTANCE
+from localModel import LocalModel, ScoreLog, SCORER_MODES, DEFAULT_MAX_UNCERTAINTY, MODEL_FILE_NAME
+from metrics import Metrics
+from ranking import Ranking
+from budgetScoring import ScoringBudget, BudgetExhausted
+from runOptions import RunOptions, Scorers, make_local_scorer, DEFAULT_TOKEN_BUDGET
+from whitelistIndex import normalise_entry, ADDRESS
+from domainClassifier import DomainClassifier, sender_address
+from myEmail import Email
+from bodyStore import BodyStore
+from rankDaemon import (DecayingRanking, format_report, write_report, wait_for_trigger, trigger_mtime, DEFAULT_INTERVAL,
+                        DEFAULT_HALF_LIFE, REPORT_FILE_NAME, HISTORY_SETTING, TASKS_SETTING)
+from multiMailbox import run_profiles, find_profiles, DEFAULT_PROFILE_WORKERS
+from checkpoint import RunCheckpoint, CHECKPOINT_FILE_NAME
 import re
 from termcolor import colored
 import json
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import Future
+from collections import Counter
 
 # Number constants for the main menu options
 OPTION_1 = 1
@@ -23,41 +49,36 @@ OPTION_8 = 8
 OPTION_9 = 9
 OPTION_10 = 10
 
-# A list of the top 100 public domain email addresses, accounting for approx. 75.83% of active emails
-# Source: email-verify.my-addr.com/list-of-most-popular-email-domains.php
-public_email_domains = {
-    "gmail.com", "yahoo.com", "hotmail.com", "aol.com", "hotmail.co.uk", "hotmail.fr", 
-    "msn.com", "yahoo.fr", "wanadoo.fr", "orange.fr", "comcast.net", "yahoo.co.uk", 
-    "yahoo.com.br", "yahoo.co.in", "live.com", "rediffmail.com", "free.fr", "gmx.de", 
-    "web.de", "yandex.ru", "ymail.com", "libero.it", "outlook.com", "uol.com.br", "bol.com.br", 
-    "mail.ru", "cox.net", "hotmail.it", "sbcglobal.net", "sfr.fr", "live.fr", "verizon.net", 
-    "live.co.uk", "googlemail.com", "yahoo.es", "ig.com.br", "live.nl", "bigpond.com", 
-    "terra.com.br", "yahoo.it", "neuf.fr", "yahoo.de", "alice.it", "rocketmail.com", 
-    "att.net", "laposte.net", "facebook.com", "bellsouth.net", "yahoo.in", "hotmail.es", 
-    "charter.net", "yahoo.ca", "yahoo.com.au", "rambler.ru", "hotmail.de", "tiscali.it", 
-    "shaw.ca", "yahoo.co.jp", "sky.com", "earthlink.net", "optonline.net", "freenet.de", 
-    "t-online.de", "aliceadsl.fr", "virgilio.it", "home.nl", "qq.com", "telenet.be", "me.com", 
-    "yahoo.com.ar", "tiscali.co.uk", "yahoo.com.mx", "voila.fr", "gmx.net", "mail.com", 
-    "planet.nl", "tin.it", "live.it", "ntlworld.com", "arcor.de", "yahoo.co.id", "frontiernet.net", 
-    "hetnet.nl", "live.com.au", "yahoo.com.sg", "zonnet.nl", "club-internet.fr", "juno.com", 
-    "optusnet.com.au", "blueyonder.co.uk", "bluewin.ch", "skynet.be", "sympatico.ca", 
-    "windstream.net", "mac.com", "centurytel.net", "chello.nl", "live.ca", "aim.com", 
-    "bigpond.net.au"
-}
+PROMPTS_FILE_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts.json") # the prompt templates
+
+# Constants for scoring several emails per prompt
+MAX_EMAILS_PER_BATCH = 20 # the max number of emails scored by a single batch prompt (bounded by the response length)
 
 
 ####################################################################################################################
 
 
+def thread_context(email):
+    """ Returns the summary of the earlier messages in an email's thread to add to its prompt (if any). """
+    if not email.thread_context:
+        return ""
+    return f"Earlier messages in this thread ({email.message_count - 1}):\n{email.thread_context}\n"
+
+def uscore_prompt(email, prompt_data, prompt_id):
+    """ Returns the full urgency score prompt for an email, using the prompt prompt_id from prompts.json. """
+    return prompt_data['prompts'][prompt_id]['prompt'] + "Email subject: " + email.subject + "\n" + "Email body: " + email.body + "\n" + \
+        thread_context(email)
+
 def urgency_prompt_C1(email, client, prompt_data):
     """ Uses the GroqLlama class to prompt Llama3 to calculate an urgency score for a specific Category 1 email. """
 
-    prompt3 = prompt_data['prompts']['uscore_prompt_one']['prompt'] + "Email subject: " + email.subject + "\n" + "Email body: " + email.body + "\n"
+    prompt3 = uscore_prompt(email, prompt_data, 'uscore_prompt_one')
     
     # Attempt to query Llama3, and let the calling method know if this fails
     try:
-        response = GroqLlama.get_cached_llama_response(client, prompt3)
-        return float(response) # Return uscore
+        return GroqLlama.get_cached_llama_response(client, prompt3, float) # Return uscore
+    except BudgetExhausted:
+        raise # Not a failure: the email is ranked on an estimate
     except Exception as e:
         raise Exception(f"Query failed: {e}.")
 
@@ -65,14 +86,131 @@ def urgency_prompt_C2(email, client, prompt_data):
     """ Uses the GroqLlama class to prompt Llama3 to calculate an urgency score for a specific Category 2 email. """
 
     # Prompt with examples (potential bias)
-    prompt = prompt_data['prompts']['uscore_prompt_two']['prompt'] + "Email subject: " + email.subject + "\n" + "Email body: " + email.body + "\n"
+    prompt = uscore_prompt(email, prompt_data, 'uscore_prompt_two')
     
     # Attempt to query Llama3, and let the calling method know if this fails
     try:
-        response = GroqLlama.get_cached_llama_response(client, prompt)
+        return GroqLlama.get_cached_llama_response(client, prompt, float) # Return uscore
+    except BudgetExhausted:
+        raise # Not a failure: the email is ranked on an estimate
     except Exception as e:
         raise Exception("Query failed.")
-    return float(response) # Return uscore
+
+def format_batch_email(number, email):
+    """ Formats an email as one numbered entry of a batch prompt. """
+    return f"### Email {number}\nEmail subject: {email.subject}\nEmail body: {email.body}\n{thread_context(email)}\n"
+
+def plan_score_batches(emails, prompt_template, token_budget=DEFAULT_TOKEN_BUDGET):
+    """ Splits a list of emails into batches of up to MAX_EMAILS_PER_BATCH emails, each small enough that its
+     batch prompt is estimated to fit within token_budget tokens. An email too long to share a prompt
+     gets a batch of its own. """
+    batches = []
+    batch = []
+    preamble_tokens = estimate_tokens(prompt_template)
+    used_tokens = preamble_tokens
+    for e in emails:
+        email_tokens = estimate_tokens(format_batch_email(len(batch) + 1, e))
+        if batch and (used_tokens + email_tokens > token_budget or len(batch) >= MAX_EMAILS_PER_BATCH):
+            batches.append(batch) # Start a new batch
+            batch = []
+            used_tokens = preamble_tokens
+        batch.append(e)
+        used_tokens = used_tokens + email_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def parse_batch_scores(response, count):
+    """ Parses the response to a batch prompt into a list of count uscores. Raises a ValueError if the
+     response is not a JSON array of count numbers. """
+    start = response.find("[")
+    end = response.rfind("]")
+    if start == -1 or end < start:
+        raise ValueError(f"No JSON array in response: {response!r}")
+    try:
+        scores = [float(score) for score in json.loads(response[start:end + 1])]
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Malformed JSON array in response: {e}")
+    if len(scores) != count:
+        raise ValueError(f"Expected {count} scores but got {len(scores)}")
+    return scores
+
+def urgency_prompt_batch(emails, client, prompt_data, prompt_id, single_prompt):
+    """ Uses the GroqLlama class to prompt Llama3 to calculate the urgency scores of several emails at once,
+     using the batch prompt prompt_id. Returns a list holding each email's uscore, the exception which
+     stopped it from being scored, or None if the client's ScoringBudget had no query left for it. If the
+     response is malformed, the batch is split in half and each half is retried (every retry counting
+     against the budget); a single email is scored on its own with single_prompt (urgency_prompt_C1 or C2). """
+
+    if len(emails) == 1:
+        try:
+            return [single_prompt(emails[0], client, prompt_data)]
+        except BudgetExhausted:
+            return [None]
+        except Exception as e:
+            return [e]
+
+    email_list = "".join(format_batch_email(i + 1, e) for i, e in enumerate(emails))
+    prompt = prompt_data['prompts'][prompt_id]['prompt'].replace("{email_list}", email_list)
+
+    # Attempt to query Llama3 (a malformed response is not cached), and let the calling method know if this fails
+    try:
+        return list(GroqLlama.get_cached_llama_response(client, prompt, parse_batch_scores, len(emails))) # Return uscores
+    except BudgetExhausted:
+        return [None] * len(emails) # Stop splitting, and leave the rest to an estimate
+    except ValueError:
+        pass # The response was malformed
+    except Exception as e:
+        return [Exception(f"Query failed: {e}.")] * len(emails)
+
+    middle = len(emails) // 2 # Retry each half of the batch
+    return urgency_prompt_batch(emails[:middle], client, prompt_data, prompt_id, single_prompt) + \
+        urgency_prompt_batch(emails[middle:], client, prompt_data, prompt_id, single_prompt)
+
+def make_future(result):
+    """ Returns a finished future holding a result, or raising it from result() if it is an exception. """
+    future = Future()
+    if isinstance(result, Exception):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
+    return future
+
+def score_in_batches(c1_emails, c2_emails, client, prompt_data, token_budget=DEFAULT_TOKEN_BUDGET, budget=None,
+                     checkpoint=None):
+    """ Scores Category 0/1 and Category 2 emails with batch prompts, several batches in flight at once.
+     Returns a dictionary mapping id(email) to a future holding its base uscore (result() re-raises failures).
+     If a ScoringBudget is given, only the first batches it allows are sent (the emails should be in
+     priority order), and the emails it stops from being queried (including the retries of a malformed
+     batch) are left out of the dictionary. The results of each batch are journaled in the RunCheckpoint
+     (if any) as soon as it finishes. """
+
+    jobs = []
+    for emails, prompt_id, single_prompt in [(c1_emails, 'uscore_batch_prompt_one', urgency_prompt_C1),
+                                             (c2_emails, 'uscore_batch_prompt_two', urgency_prompt_C2)]:
+        prompt_template = prompt_data['prompts'][prompt_id]['prompt']
+        for batch in plan_score_batches(emails, prompt_template, token_budget):
+            jobs.append((batch, prompt_id, single_prompt))
+
+    score_batch = lambda job: urgency_prompt_batch(job[0], client, prompt_data, job[1], job[2])
+    if budget is not None:
+        if budget.max_calls is not None:
+            jobs = jobs[:max(0, budget.max_calls)] # Category 0/1 batches come first, as they rank first
+        score_batch = budget.guard(score_batch)
+    if checkpoint is not None:
+        score_batch = checkpoint.journaled(score_batch, batch=True)
+    with ScoringEngine(client) as engine:
+        futures = engine.submit_all(score_batch, jobs)
+
+    # Hand each email its own future, so batch and single scoring look the same to the caller
+    base_uscores = {}
+    for job, future in zip(jobs, futures):
+        if future.result() is None: # Stopped by the budget's deadline
+            continue
+        for e, result in zip(job[0], future.result()):
+            if result is not None: # Not stopped by the budget
+                base_uscores[id(e)] = make_future(result)
+    return base_uscores
 
 def generate_todo_list(top_ten_email_list, client, prompt_data):
 
@@ -91,34 +229,31 @@ def get_keyword_modifier(email):
 
     """ Utilizes the list of user-specified keywords to generate a modifier for the urgency score. For each keyword
      present, a specific weight will be added (by default, 1) """
-    
-    uscore_modifier = 0.0
 
     subject = email.subject.lower()
     body = email.body.lower()
 
-    for word in ToneRank_IO.keywords.keys():
-        pattern = r'\b' + re.escape(word) + r'\b'
-        if re.findall(pattern, subject) or word in re.findall(pattern, body):
-            uscore_modifier = uscore_modifier + ToneRank_IO.keywords[word]
-
-    return uscore_modifier
+    # Search for every keyword at once
+    return ToneRank_IO.active.get_keyword_index().modifier(subject, body)
 
 
 ####################################################################################################################
 
 
 def whitelist_emails():
-    """ Adds user-specified emails to a whitelist which composes Category 0. """
+    """ Adds user-specified emails to a whitelist which composes Category 0. An entry can also be a whole
+     domain (@company.com), every subdomain of one (*.company.com) or a wildcard address (alerts-*@company.com). """
 
-    emails = input("Enter emails in a space-separated list (e.g. \"johndoe@gmail.com janedoe@yahoo.com\"):\n")
+    emails = input("Enter emails in a space-separated list (e.g. \"johndoe@gmail.com @company.com *.company.com\"):\n")
     email_list = emails.split()
     # For each email
     for e in email_list:
-        if re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", e) is None: # If email is invalid
+        normalised = normalise_entry(e)
+        if normalised is None or (normalised[1] == ADDRESS and \
+                                  re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", e) is None): # If email is invalid
             print(colored(f"Invalid email: {e}", "red"))
         else: # If email is valid
-            ToneRank_IO.add_email_to_whitelist(e) # Add the email to the whitelist
+            ToneRank_IO.active.add_email_to_whitelist(e) # Add the email to the whitelist
     print() # Add newline
 
 def remove_whitelisted_emails():
@@ -127,7 +262,7 @@ def remove_whitelisted_emails():
     email_list = emails.split()
     # For each email
     for e in email_list:
-        ToneRank_IO.remove_email(e) # Add the email to the whitelist
+        ToneRank_IO.active.remove_email(e) # Add the email to the whitelist
     print() # Add newline
 
 def add_keywords():
@@ -143,7 +278,7 @@ def add_keywords():
                 break
             except: # Error message
                 print( colored("Please enter an decimal number.", "red") )
-        ToneRank_IO.add_keyword(w, weight) # Add the word to the keywords list
+        ToneRank_IO.active.add_keyword(w, weight) # Add the word to the keywords list
     print() # Add newline
 
 def remove_keywords():
@@ -153,7 +288,7 @@ def remove_keywords():
     keyword_list = keywords.split()
     # For each keyword
     for w in keyword_list: 
-        ToneRank_IO.remove_keyword(w) # Add the word to the keywords list
+        ToneRank_IO.active.remove_keyword(w) # Add the word to the keywords list
     print() # Add newline
 
 def update_priority_report():
@@ -165,7 +300,6 @@ def update_priority_report():
                                 "How many emails do you want in this list (default 5)? "))
             if (top_email_size < ToneRank_IO.MIN_TOP_EMAIL_SIZE or top_email_size > ToneRank_IO.MAX_TOP_EMAIL_SIZE):
                 raise ValueError
-            ToneRank_IO.top_email_size = top_email_size
             break
         except Exception as e:
             print(colored(f"\nPlease enter an integer number from {ToneRank_IO.MIN_TOP_EMAIL_SIZE} to {ToneRank_IO.MAX_TOP_EMAIL_SIZE} (inclusive)", "red"))
@@ -175,7 +309,7 @@ def update_priority_report():
                                 "How many emails do you want to be used when making this list (default 10)? "))
             if (todo_sample_size < ToneRank_IO.MIN_TODO_SAMPLE_SIZE or todo_sample_size > ToneRank_IO.MAX_TODO_SAMPLE_SIZE):
                 raise ValueError
-            ToneRank_IO.todo_list_sample_size = todo_sample_size
+            ToneRank_IO.active.set_report_settings(top_email_size, todo_sample_size) # Saved straight away
             print() # For the newline
             break
         except Exception as e:
@@ -185,15 +319,174 @@ def update_priority_report():
 ####################################################################################################################
 
 
-def toneRank_main():
-    """ Handles the main flow, from email retrieval to priority report. """
+def categorise_email(e):
+    """ Returns the category of an email: 0 if the sender is whitelisted, 2 if the sender uses a public
+     (or disposable) email domain, and 1 otherwise. """
 
-    emails = GmailPipe.get_emails_last_24_hours() # get emails
+    email_address, domain = sender_address(e.sender) # parse the From header
 
-    # If there were no emails to rank
-    if len(emails) == 0:
-        print(colored("No emails found from the past 24 hours.\n"))
-        return
+    if ToneRank_IO.active.is_whitelisted(email_address):
+        return 0 # If the email is whitelisted
+    elif DomainClassifier.shared().is_personal(domain):
+        return 2 # If the email is a public domain
+    else:
+        return 1 # If the email is NOT a public domain
+
+def score_locally(e, category, uscore_modifier, scorers):
+    """ Returns the base uscore of an email if it can be scored without querying Llama3, or None. Category 1
+     emails the pre-scorer is confident about come first, then near-duplicates of an email scored before,
+     then any email the local model can score. """
+    uscore = None
+    if scorers.prescorer is not None and category == 1:
+        uscore = scorers.prescorer.prescore(e, uscore_modifier) # Obvious bulk mail
+    if uscore is None and scorers.near_duplicates is not None:
+        uscore = scorers.near_duplicates.reuse(e, category)
+    if uscore is None and scorers.local_scorer is not None:
+        uscore = scorers.local_scorer.score(e, category)
+    return uscore
+
+def prescore_emails(categorised_emails, scorers):
+    """ Scores the (email, category) pairs which need no query. Returns a dictionary mapping id(email) to
+     a future holding the base uscore of each of them. """
+    base_uscores = {}
+    if scorers.prescorer is not None or scorers.local_scorer is not None or scorers.near_duplicates is not None:
+        for e, category in categorised_emails:
+            uscore = score_locally(e, category, get_keyword_modifier(e), scorers)
+            if uscore is not None:
+                base_uscores[id(e)] = make_future(uscore)
+    return base_uscores
+
+def find_near_duplicates(categorised_emails, max_distance=DEFAULT_MAX_DISTANCE):
+    """ Finds the (email, category) pairs which are near-duplicates of an earlier one in the list, so only
+     the first of them needs a query. Returns a dictionary mapping id(email) to the email it duplicates. """
+    run_index = NearDuplicateIndex(max_distance)
+    duplicate_of = {}
+    for e, category in categorised_emails:
+        original = run_index.reuse(e, category)
+        if original is not None:
+            duplicate_of[id(e)] = original
+        else:
+            run_index.remember(e, category, e)
+    return duplicate_of
+
+def score_email(e, category, client, prompt_data, scorers=None, checkpoint=None):
+    """ Calculates the urgency score of an email in the specified category and stores it in the email.
+     Emails the pre-scorer, the near-duplicate index or the local scorer of the Scorers (if any) can score
+     are not sent to Llama3; the scores Llama3 gives are kept by the Scorers. The base uscore (or the
+     failure to get one) is journaled in the RunCheckpoint (if any). Returns True if the email contains
+     keywords (in which case a star is added to its subject). """
+
+    scorers = scorers if scorers is not None else Scorers()
+    uscore_modifier = get_keyword_modifier(e) # use helper method to get a modifier for the uscore
+    uscore = score_locally(e, category, uscore_modifier, scorers)
+    if uscore is None:
+        try:
+            if category == 2:
+                uscore = urgency_prompt_C2(e, client, prompt_data) # get the base urgency score using helper method
+            else:
+                uscore = urgency_prompt_C1(e, client, prompt_data)
+        except Exception as error:
+            if checkpoint is not None:
+                checkpoint.record(e, error)
+            raise
+        scorers.record(e, category, uscore)
+    if checkpoint is not None:
+        checkpoint.record(e, uscore)
+
+    if uscore_modifier > 0.0: # If keywords were found
+        e.subject = e.subject + " ☆" # Add a star to indicate keyword presence
+
+    e.uscore = uscore + uscore_modifier # set uscore
+    return uscore_modifier > 0.0
+
+def query_uscores(c1_emails, c2_emails, llama3, prompt_data, options, budget=None, checkpoint=None):
+    """ Queries Llama3 for the base uscores of Category 0/1 and Category 2 emails, keeping several requests
+     in flight (and scoring several emails per prompt if options.batch_scoring is True). Returns a dictionary
+     mapping id(email) to a future holding its base uscore (result() re-raises failures). Every query sent
+     counts against the ScoringBudget (if any); an email it stops from being queried is left out, or holds
+     None. Each result is journaled in the RunCheckpoint (if any) as soon as it is known. """
+    with llama3.budgeted(budget):
+        if options.batch_scoring:
+            return score_in_batches(c1_emails, c2_emails, llama3, prompt_data, options.token_budget, budget, checkpoint)
+        scoring_jobs = [(e, urgency_prompt_C1) for e in c1_emails] + [(e, urgency_prompt_C2) for e in c2_emails]
+        score_job = lambda job: job[1](job[0], llama3, prompt_data)
+        if budget is not None:
+            score_job = budget.guard(score_job)
+        if checkpoint is not None:
+            score_job = checkpoint.journaled(score_job)
+        with ScoringEngine(llama3) as engine:
+            futures = engine.submit_all(score_job, scoring_jobs)
+        return {id(job[0]): future for job, future in zip(scoring_jobs, futures)}
+
+def estimate_unqueried(budget, emails, base_uscores, duplicate_of):
+    """ Ranks each of the emails the ScoringBudget stopped from being queried (it has no base uscore, or one
+     of None) on an estimate, and marks it as estimated, along with its near-duplicates (duplicate_of maps
+     the id of each near-duplicate to the email whose score it shares). """
+    for e in emails:
+        future = base_uscores.get(id(e))
+        if id(e) not in duplicate_of and (future is None or (future.exception() is None and future.result() is None)):
+            base_uscores[id(e)] = make_future(budget.mark_estimated(e))
+    for e in emails:
+        if id(e) in duplicate_of and duplicate_of[id(e)].estimated:
+            budget.mark_estimated(e) # A copy of an estimated email is estimated too
+
+def score_categories(cat0_emails, cat1_emails, cat2_emails, llama3, prompt_data, options, scorers, budget=None,
+                     known_uscores=None, checkpoint=None):
+    """ Finds the base uscore of every email in the three categories. Returns (base_uscores, locally_scored,
+     duplicate_of): a dictionary mapping id(email) to a future holding its base uscore, the part of it which
+     needed no query (known_uscores included), and a dictionary mapping the id of each near-duplicate of
+     another email in the lists to the email whose score it shares. See rank_emails. """
+    categorised_emails = [(e, 0) for e in cat0_emails] + [(e, 1) for e in cat1_emails] + [(e, 2) for e in cat2_emails]
+    known = {email_id: make_future(uscore) for email_id, uscore in (known_uscores or {}).items()}
+    locally_scored = prescore_emails([(e, category) for e, category in categorised_emails if id(e) not in known],
+                                     scorers) # These need no query
+    if checkpoint is not None:
+        checkpoint.record_uscores([e for e, _ in categorised_emails if id(e) in locally_scored], locally_scored)
+    duplicate_of = {}
+    if scorers.near_duplicates is not None: # Emails scored before the run was resumed can be the originals too
+        duplicate_of = find_near_duplicates([(e, category) for e, category in categorised_emails
+                                             if id(e) not in locally_scored], scorers.near_duplicates.max_distance)
+        duplicate_of = {duplicate_id: original for duplicate_id, original in duplicate_of.items()
+                        if duplicate_id not in known}
+    locally_scored.update(known)
+
+    # Query the rest, keeping several requests in flight (only as many as the budget allows, most promising first)
+    base_uscores = dict(locally_scored)
+    to_query = [(e, category) for e, category in categorised_emails
+                if id(e) not in locally_scored and id(e) not in duplicate_of]
+    if budget is not None:
+        to_query, _ = budget.select(to_query, get_keyword_modifier, MAX_EMAILS_PER_BATCH if options.batch_scoring else 1)
+    base_uscores.update(query_uscores([e for e, category in to_query if category != 2],
+                                      [e for e, category in to_query if category == 2],
+                                      llama3, prompt_data, options, budget, checkpoint))
+    if budget is not None:
+        estimate_unqueried(budget, [e for e, _ in categorised_emails], base_uscores, duplicate_of)
+    for duplicate_id, original in duplicate_of.items():
+        base_uscores[duplicate_id] = base_uscores[id(original)] # Share the original's score
+    if scorers.near_duplicates is not None:
+        scorers.near_duplicates.reused = scorers.near_duplicates.reused + len(duplicate_of)
+    if checkpoint is not None: # Journal the copies, and the estimates (so they are not taken for failures)
+        checkpoint.record_uscores([e for e, _ in categorised_emails
+                                   if id(e) not in known and (e.estimated or id(e) in duplicate_of)], base_uscores)
+    return base_uscores, locally_scored, duplicate_of
+
+def rank_emails(emails, llama3, prompt_data, options=None, scorers=None, base_uscores=None, budget=None,
+                known_uscores=None, checkpoint=None):
+    """ Categorises and scores a list of emails. Returns (emails_ranked, flagged_emails), where emails_ranked
+     is a Ranking (iterate over it for the full order, or use top(k)). If options.batch_scoring is True,
+     several emails are scored per prompt, with prompts kept within options.token_budget tokens. If
+     base_uscores (a dictionary mapping id(email) to a future holding its base uscore) is given, no
+     queries are made. Emails the Scorers (if any) can score without Llama3 are not queried: Category 1
+     emails the prescorer is confident about, near-duplicates of an email scored before (or of another
+     email in the list) and emails the local scorer is sure about; the Scorers keep every score Llama3
+     gives. If a ScoringBudget is given, only the emails most likely to rank near the top are queried
+     within its limits, and the rest are ranked on an estimate (and marked as estimated). If known_uscores
+     (a dictionary mapping id(email) to a base uscore, or to the exception which stopped it from being
+     scored) is given, those emails are not scored again, e.g. when resuming a run. Every other base
+     uscore (or failure) is journaled in the RunCheckpoint (if any) as soon as it is known. """
+
+    options = options if options is not None else RunOptions()
+    scorers = scorers if scorers is not None else Scorers()
 
     # split into their categories
     cat0_emails = []
@@ -201,16 +494,10 @@ def toneRank_main():
     cat2_emails = []
 
     for e in emails:
-        
-        e_split = e.sender.split("<") # extract the email address
-        email_address = e_split[len(e_split) - 1]
-        if (email_address[len(email_address) - 1] == '>'):
-            email_address = email_address[0:len(email_address)-1] # remove the closing '>', if there is one
-        domain = email_address.split("@")[1] # get the part of the sender data after the '@'
-
-        if email_address in ToneRank_IO.email_whitelist:
+        category = categorise_email(e)
+        if category == 0:
             cat0_emails.append(e) # If the email is whitelisted
-        elif domain in public_email_domains: 
+        elif category == 2: 
             cat2_emails.append(e) # If the email is a public domain
         else:
             cat1_emails.append(e) # If the email is NOT a public domain
@@ -218,114 +505,662 @@ def toneRank_main():
     # Print number of messages
     # print(f"Found {len(emails)} messages from the past 24 hours ({len(cat0_emails)} from C0, {len(cat1_emails)} from C1, {len(cat2_emails)} from C2).")
 
-    # Use llm.py to get a Llama3 client
-    llama3 = GroqLlama()
+    flagged_emails = [] # Declare a list used to hold all Category 1 emails which could not be processed
+    emails_ranked = Ranking() # Category 0 emails with keywords first, then Category 0, Category 1 with keywords...
 
-    # Open prompts.json
-    with open('prompts.json', 'r') as f:
-        prompt_data = json.load(f)
+    # Find the base urgency scores for all three categories at once, querying only the ones which need it
+    locally_scored = {} # the base uscores which did not need a query
+    duplicate_of = {} # the emails which share the score of a near-duplicate in this run
+    if base_uscores is None: # Unless the scores are already known
+        with Metrics.active.stage("score"):
+            base_uscores, locally_scored, duplicate_of = score_categories(cat0_emails, cat1_emails, cat2_emails, llama3,
+                                                                          prompt_data, options, scorers, budget,
+                                                                          known_uscores, checkpoint)
 
-    flagged_emails = [] # Declare a list used to hold all Category 1 emails which could not be processed
-    cat0_key_emails = [] # Declare a list to hold Category 0 emails which include keywords
-    cat1_key_emails = [] # Declare a list to hold Category 1 emails which include keywords
-    cat2_key_emails = [] # Declare a list to hold Category 2 emails which include keywords
+    # Keep the scores Llama3 gave, so the local model can learn from them, near-duplicates can reuse them and
+    # the sender history can estimate the next email from the same sender
+    for category, category_emails in enumerate([cat0_emails, cat1_emails, cat2_emails]):
+        for e in category_emails:
+            if id(e) in locally_scored or id(e) in duplicate_of or e.estimated or base_uscores[id(e)].exception() is not None:
+                continue
+            scorers.record(e, category, base_uscores[id(e)].result())
 
-    # Calculate urgency score for each email in category 1
-    for e in cat0_emails:
-        try:
-            uscore = urgency_prompt_C1(e, llama3, prompt_data) # get the base urgency score using helper method
-            uscore_modifier = get_keyword_modifier(e) # use helper method to get a modifier for the uscore
-            
-            if uscore_modifier > 0.0: # If keywords were found
-                e.subject = e.subject + " ☆" # Add a star to indicate keyword presence
-                cat0_emails.remove(e) # Remove from main list
-                cat0_key_emails.append(e) # Move to keyword sub-list
-
-            uscore = uscore + uscore_modifier
-            e.uscore = uscore # set uscore
-        except Exception:
-            flagged_emails.append(e) # if email failed to be processed
-    for e in cat1_emails:
-        try:
-            uscore = urgency_prompt_C1(e, llama3, prompt_data) # get the base urgency score using helper method
-            uscore_modifier = get_keyword_modifier(e) # use helper method to get a modifier for the uscore
-            
-            if uscore_modifier > 0.0: # If keywords were found
-                e.subject = e.subject + " ☆" # Add a star to indicate keyword presence
-                cat1_emails.remove(e) # Remove from main list
-                cat1_key_emails.append(e) # Move to keyword sub-list
-
-            uscore = uscore + uscore_modifier
-            e.uscore = uscore # set uscore
-        except Exception:
-            flagged_emails.append(e) # if email failed to be processed
-    # Calculate urgency score for each email in category 2
-    for e in cat2_emails:
-        try:
-            uscore = urgency_prompt_C2(e, llama3, prompt_data) # get the base urgency score using helper method
-            uscore_modifier = get_keyword_modifier(e) # use helper method to get a modifier for the uscore
-            
-            if uscore_modifier > 0.0: # If keywords were found
-                e.subject = e.subject + " ☆" # Add a star to indicate keyword presence
-                cat2_emails.remove(e) # Remove from main list
-                cat2_key_emails.append(e) # Move to keyword sub-list
-
-            uscore = uscore + uscore_modifier
-            e.uscore = uscore # set uscore
-        except Exception:
-            flagged_emails.append(e) # if email failed to be processed
-
-    # Create overall email ranking
-    emails_ranked = sorted(cat0_key_emails) + sorted(cat0_emails) + sorted(cat1_key_emails) + \
-        sorted(cat1_emails) + sorted(cat2_key_emails) + sorted(cat2_emails)
-    
-    # Generate a to-do list from top-priority emails
+    # Calculate the urgency score of each email, and add it to the ranking
+    with Metrics.active.stage("rank"):
+        for category, category_emails in enumerate([cat0_emails, cat1_emails, cat2_emails]):
+            for e in category_emails:
+                try:
+                    uscore = base_uscores[id(e)].result() # get the base urgency score
+                    uscore_modifier = get_keyword_modifier(e) # use helper method to get a modifier for the uscore
+
+                    if uscore_modifier > 0.0: # If keywords were found
+                        e.subject = e.subject + " ☆" # Add a star to indicate keyword presence
+
+                    e.uscore = uscore + uscore_modifier # set uscore
+                    emails_ranked.add(e, category, uscore_modifier > 0.0)
+                except Exception:
+                    flagged_emails.append(e) # if email failed to be processed
+
+    return emails_ranked, flagged_emails
+
+def preprocess_stream(stream, preprocessor):
+    """ Cleans the body of each email in a stream of (position, email) pairs as it passes through. """
+    for position, e in stream:
+        preprocessor.process(e)
+        yield position, e
+
+def checkpoint_stream(stream, checkpoint):
+    """ Journals each email in a stream of (position, email) pairs as it passes through, then marks the
+     fetch as finished once the stream ends. """
+    for position, e in stream:
+        checkpoint.record_emails([e])
+        yield position, e
+    checkpoint.mark_fetched()
+
+def rank_emails_streaming(llama3, prompt_data, options=None, scorers=None, checkpoint=None):
+    """ Fetches, categorises and scores emails through a StreamingPipeline, so scoring starts as soon as
+     the first batch of emails arrives. Bodies are cleaned by the preprocessor of the Scorers (if any) as
+     they arrive. If options.threads is True, each thread is scored once all of its messages have arrived, on
+     its latest message with a summary of the earlier ones (as in rank_emails).
+     Emails and their base uscores are journaled in the RunCheckpoint (if any) as they go. Returns
+     (emails_ranked, flagged_emails) in the same order as rank_emails. """
+
+    options = options if options is not None else RunOptions()
+    scorers = scorers if scorers is not None else Scorers()
+    thread_sizes = {} # thread id -> the number of its messages being fetched
+    if options.incremental: # The sync already holds every email, so it is streamed from the list
+        emails = GmailPipe.sync_emails_last_24_hours(options.batch_size)
+        thread_sizes = Counter(e.thread_id for e in emails)
+        stream = enumerate(emails)
+    else:
+        stream = GmailPipe.iter_emails_last_24_hours(options.batch_size, thread_sizes)
+    if options.threads:
+        stream = group_thread_stream(stream, thread_sizes)
+    if scorers.preprocessor is not None:
+        stream = preprocess_stream(stream, scorers.preprocessor)
+    if checkpoint is not None:
+        stream = checkpoint_stream(stream, checkpoint)
+    pipeline = StreamingPipeline(categorise_email, lambda e, category: score_email(e, category, llama3, prompt_data, scorers,
+                                                                                 checkpoint),
+                                 llama3.rate_limiter.max_in_flight, ToneRank_IO.active.todo_list_sample_size)
+    with Metrics.active.stage("fetch_and_score"): # the stages overlap, so they are timed together
+        return pipeline.run(stream)
+
+def make_todo_list_sample(emails_ranked):
+    """ Returns the string of top-priority emails (from a Ranking) used to generate the to-do list. """
 
     todo_list_sample_emails = ""
-    for i in range(ToneRank_IO.todo_list_sample_size): # For up to the first 10 emails
-        if len(emails_ranked) > i:
-            # Make a string representing the email's contents
-            todo_list_sample_emails = todo_list_sample_emails + f"Subject #{i+1}: " + \
-                emails_ranked[i].subject + f"\nBody #{i+1}: " + emails_ranked[i].body + "\n"
-    tasks = generate_todo_list(todo_list_sample_emails, llama3, prompt_data) # generate the tasks
+    for i, e in enumerate(emails_ranked.top(ToneRank_IO.active.todo_list_sample_size)): # For up to the first 10 emails
+        # Make a string representing the email's contents
+        todo_list_sample_emails = todo_list_sample_emails + f"Subject #{i+1}: " + \
+            e.subject + f"\nBody #{i+1}: " + e.body + "\n"
+    return todo_list_sample_emails
+
+def print_priority_report(emails_ranked, flagged_emails, llama3, prompt_data, tasks=None):
+    """ Generates the to-do list (unless the tasks are given) and prints the priority report. """
+
+    # Generate a to-do list from top-priority emails
+    if tasks is None:
+        with Metrics.active.stage("todo_list"):
+            tasks = generate_todo_list(make_todo_list_sample(emails_ranked), llama3, prompt_data) # generate the tasks
 
     # Print Priority Report
+    with Metrics.active.stage("report"):
+        print(colored("\n=====================================", attrs=["bold"]))
+        print(colored("          PRIORITY REPORT            ", attrs=["bold"]))
+        print(colored("=====================================\n", attrs=["bold"]))
 
-    print(colored("\n=====================================", attrs=["bold"]))
-    print(colored("          PRIORITY REPORT            ", attrs=["bold"]))
-    print(colored("=====================================\n", attrs=["bold"]))
+        # Print to-do list
+        print(colored("To-Do List:", attrs=["bold", "underline"]))
+        print(colored(tasks + "\n"))
 
-    # Print to-do list
-    print(colored("To-Do List:", attrs=["bold", "underline"]))
-    print(colored(tasks + "\n"))
+        # Print top 5 most urgent emails (if there were more than 5 total)
+        if len(emails_ranked) >= ToneRank_IO.active.top_email_size:
+            print(colored(f"Top {ToneRank_IO.active.top_email_size} emails to read Right Now:", attrs=["bold", "underline"]))
+            count = 1
+            for e in emails_ranked.top(ToneRank_IO.active.top_email_size):
+                print(f"{count}. {e}")
+                count = count + 1
+            print("")
 
-    # Print top 5 most urgent emails (if there were more than 5 total)
-    if len(emails_ranked) >= ToneRank_IO.top_email_size:
-        print(colored(f"Top {ToneRank_IO.top_email_size} emails to read Right Now:", attrs=["bold", "underline"]))
+        # Print total email ranking
+        print(colored("All emails by order of urgency:", attrs=["bold", "underline"]))
         count = 1
-        for i in range(ToneRank_IO.top_email_size):
-            print(f"{count}. {emails_ranked[i]}")
+        for e in emails_ranked:
+            print(f"{count}. {e}")
             count = count + 1
         print("")
 
-    # Print total email ranking
-    print(colored("All emails by order of urgency:", attrs=["bold", "underline"]))
+        # If some emails could not be processed, print them
+        if len(flagged_emails) > 0:
+            print(colored("Emails which could not be processed by the system (urgency unknown):", attrs=["bold", "underline"]))
+            count = 1
+            for e in flagged_emails:
+                print(f"{count}. {e}")
+                count = count + 1
+            print("")
+
+def get_emails(options=None, preprocessor=None):
+    """ Gets the emails from the past 24 hours (only fetching the changes since the last run if
+     options.incremental is True), and cleans their bodies with the preprocessor (if any). If
+     options.threads is True, each thread is returned as one email: its latest message, with a summary of
+     the earlier ones. """
+    options = options if options is not None else RunOptions()
+    with Metrics.active.stage("fetch"):
+        if options.incremental:
+            emails = GmailPipe.sync_emails_last_24_hours(options.batch_size)
+        else:
+            emails = GmailPipe.get_emails_last_24_hours(options.batch_size)
+    if preprocessor is not None:
+        with Metrics.active.stage("preprocess"):
+            for e in emails:
+                preprocessor.process(e)
+    if options.threads:
+        with Metrics.active.stage("threads"):
+            emails = group_threads(emails)
+    return emails
+
+def print_tokens_saved(emails):
+    """ Prints the estimated number of tokens preprocessing removed from each email. """
+    print(colored("Tokens saved by preprocessing:", attrs=["bold", "underline"]))
     count = 1
-    for e in emails_ranked:
-        print(f"{count}. {e}")
+    for e in emails:
+        print(f"{count}. {e.sender}: {e.subject!r} | {e.tokens_saved} tokens")
         count = count + 1
     print("")
 
-    # If some emails could not be processed, print them
-    if len(flagged_emails) > 0:
-        print(colored("Emails which could not be processed by the system (urgency unknown):", attrs=["bold", "underline"]))
-        count = 1
-        for e in flagged_emails:
-            print(f"{count}. {e}")
-            count = count + 1
-        print("")
+def pick_up_run(options):
+    """ Returns (run_checkpoint, known_uscores) for a run: the RunCheckpoint to journal it in (None if
+     options.checkpoint is False and nothing is picked up), and, if the run picks up the emails of the
+     journaled one (options.resume or options.retry_flagged), a dictionary mapping id(email) to the base
+     uscore of each of them which needs no query (see RunCheckpoint.known_uscores), or None otherwise. A
+     journaled run which stopped while fetching keeps its scores in the checkpoint, to be carried over once
+     its emails are fetched again. """
+    run_checkpoint = RunCheckpoint(options.checkpoint_file) if options.checkpoint or options.resume or options.retry_flagged else None
+    if not (options.resume or options.retry_flagged):
+        return run_checkpoint, None
+    if run_checkpoint.load() and (options.retry_flagged or not run_checkpoint.finished):
+        known_uscores = run_checkpoint.known_uscores(options.retry_flagged)
+        to_score = len(run_checkpoint.failures) if options.retry_flagged else len(run_checkpoint.pending())
+        print(colored(f"Picking up the last run: {len(run_checkpoint.emails) - len(run_checkpoint.pending())} emails "
+                      f"already scored, {to_score} to score.\n"))
+        Metrics.active.count("checkpoint_scores_reused", len(run_checkpoint.scores))
+        run_checkpoint.reopen()
+        return run_checkpoint, known_uscores
+    if options.resume and not run_checkpoint.fetched and run_checkpoint.scores: # It stopped while fetching, so its emails are fetched again
+        print(colored(f"Picking up the last run: {len(run_checkpoint.scores)} emails already scored, the rest "
+                      f"are fetched again.\n"))
+        Metrics.active.count("checkpoint_scores_reused", len(run_checkpoint.scores))
+        return run_checkpoint, None
+    print(colored(f"There is no {'earlier' if options.retry_flagged else 'unfinished'} run in {options.checkpoint_file}, "
+                  f"so a new run is started.\n", "red"))
+    return RunCheckpoint(options.checkpoint_file), None # Nothing is carried over
+
+def toneRank_main(options=None, rate_limiter=None):
+    """ Handles the main flow, from email retrieval to priority report, as the RunOptions select (the
+     defaults if None). Emails are fetched options.batch_size at a time (only the changes since the last run
+     if incremental is True), and Llama3 responses are reused from the on-disk response cache (cache_file)
+     unless use_cache is False. If stream is True, emails are scored while they are still being fetched;
+     otherwise, if batch_scoring is True, several emails are scored per prompt (each prompt kept within
+     token_budget tokens). Unless preprocess is False, bodies are cleaned and cut to body_token_budget
+     tokens before scoring. If prescore is True, Category 1 emails which are confidently bulk mail (at
+     least prescore_threshold) are scored without a query. scorer selects whether the local model scores
+     every email ("local"), only the ones it is sure about ("hybrid", uncertainty at most max_uncertainty) or
+     none ("llm"). Unless score_log is False, every Llama3 score is logged as training data for the local
+     model. Unless threads is False, each Gmail thread is scored and ranked once. Unless dedupe is False,
+     emails within dedupe_distance bits of one from the same sender scored in this run (or, if
+     dedupe_history is True, in a recent one, kept in the score history unless use_cache is False) reuse
+     its score. The run's metrics are printed after the report,
+     and written as JSON to metrics_json, in the Prometheus text format to metrics_prometheus and as a
+     Chrome trace to trace_file (if given), and the run is added to the run history in the state store. If
+     max_llm_calls or deadline (in seconds from now) is given, at most that many scoring queries are sent,
+     or sent before the deadline, on the emails most likely to reach the top of the report; the rest are
+     ranked on an estimate from their sender's history and marked as not scored. If spill_bodies is True,
+     large bodies are kept in a memory-mapped temporary file instead of in memory. Queries are paced by
+     rate_limiter (e.g. one shared by several mailboxes; a new RateLimiter if None). Unless checkpoint is
+     False, the fetched emails and each base uscore are journaled in checkpoint_file as the run goes. If
+     resume is True, the emails of a journaled run which stopped partway through are ranked again without
+     being fetched, and only the ones it had not scored are queried; if retry_flagged is True, only the
+     emails of the last run which could not be scored are queried. Either starts a new run if there is none. """
+
+    options = options if options is not None else RunOptions()
+    Metrics.active = Metrics() # measure this run on its own
+    started = time.time()
+    lru_info = GroqLlama.get_cached_llama_response.cache_info() # the in-memory cache is shared between runs
+
+    # Use llm.py to get a Llama3 client
+    cache = ResponseCache(options.cache_file) if options.use_cache else None
+    Email.body_store = BodyStore() if options.spill_bodies else None # until the end of the run
+    try:
+        llama3 = GroqLlama(rate_limiter, cache)
+
+        # Open prompts.json
+        with open(PROMPTS_FILE_NAME, 'r') as f:
+            prompt_data = json.load(f)
+
+        # get and rank emails
+        scorers = Scorers.from_options(options, ToneRank_IO.active.store)
+        budget = ScoringBudget(options.max_llm_calls, options.deadline, scorers.sender_history) if options.budgeted else None
+        stream = options.stream
+        if stream and budget is not None:
+            print(colored("A scoring budget needs every email before choosing which to score, so --stream is ignored.\n", "red"))
+            stream = False
+
+        # Pick up the journaled run, if asked to and there is one
+        run_checkpoint, known_uscores = pick_up_run(options)
+        if known_uscores is not None or (run_checkpoint is not None and run_checkpoint.scores):
+            stream = False # The scores can only be matched up with the emails once they are all fetched
+        if known_uscores is not None:
+            scorers.preprocessor = None # The journaled emails were cleaned before they were journaled
+
+        try:
+            if stream:
+                if run_checkpoint is not None:
+                    run_checkpoint.start() # Emails are journaled as they arrive
+                emails_ranked, flagged_emails = rank_emails_streaming(llama3, prompt_data, options, scorers, run_checkpoint)
+            else:
+                if known_uscores is not None:
+                    emails = run_checkpoint.emails
+                else:
+                    emails = get_emails(options, scorers.preprocessor)
+                    if run_checkpoint is not None: # Only replace the last journal once this run has its emails
+                        known_uscores = run_checkpoint.restart(emails)
+                emails_ranked, flagged_emails = rank_emails(emails, llama3, prompt_data, options, scorers, budget=budget,
+                                                            known_uscores=known_uscores, checkpoint=run_checkpoint)
+        except (Exception, KeyboardInterrupt):
+            if run_checkpoint is not None and run_checkpoint.emails:
+                print(colored(f"\nThe run stopped before it finished. Run ToneRank with --resume to pick up where it left off "
+                              f"(from {options.checkpoint_file}).\n", "red"))
+            raise
+        scorers.save()
+
+        # If there were no emails to rank
+        if len(emails_ranked) == 0 and len(flagged_emails) == 0:
+            print(colored("No emails found from the past 24 hours.\n"))
+        else:
+            print_priority_report(emails_ranked, flagged_emails, llama3, prompt_data)
+            if scorers.preprocessor is not None:
+                if options.show_tokens_saved:
+                    print_tokens_saved(emails_ranked.to_list() + flagged_emails)
+                print(colored(scorers.preprocessor.summary() + "\n"))
+            if scorers.prescorer is not None:
+                print(colored(f"Pre-scorer: {scorers.prescorer.calls_avoided} Llama3 queries avoided\n"))
+            if scorers.near_duplicates is not None:
+                print(colored(f"Near-duplicates: {scorers.near_duplicates.reused} emails reused an earlier score\n"))
+            if options.scorer != "llm":
+                print(colored(f"Local model: {scorers.local_scorer.local_scored} emails scored without Llama3\n"))
+            if budget is not None:
+                print(colored(budget.summary() + "\n"))
+            if run_checkpoint is not None and flagged_emails:
+                print(colored(f"Run ToneRank with --retry-flagged to query only the {len(flagged_emails)} emails which could "
+                              f"not be processed again.\n"))
+        if run_checkpoint is not None:
+            run_checkpoint.finish()
+
+        # Report how many queries were answered by the response cache
+        if cache is not None:
+            print(colored(f"Response cache: {cache.hits} hits, {cache.misses} misses\n"))
+
+        # Queries answered from memory never reach the disk cache, so both are counted as hits
+        lru_now = GroqLlama.get_cached_llama_response.cache_info()
+        Metrics.active.count("cache_hits", lru_now.hits - lru_info.hits + (cache.hits if cache is not None else 0))
+        Metrics.active.count("cache_misses", cache.misses if cache is not None else lru_now.misses - lru_info.misses)
+        report_metrics(Metrics.active, options.metrics_json, options.metrics_prometheus, options.trace_file)
+        if ToneRank_IO.active.store is not None:
+            ToneRank_IO.active.store.record_run(started, len(emails_ranked), len(flagged_emails), Metrics.active.to_dict())
+    finally: # Also when the run fails or is interrupted, so nothing is left open for the next run in this process
+        if cache is not None:
+            cache.close()
+        if Email.body_store is not None:
+            Email.body_store.close()
+            Email.body_store = None
+
+def report_metrics(metrics, metrics_json=None, metrics_prometheus=None, trace_file=None):
+    """ Prints the run summary, and writes the metrics to any of the files given. """
+    print(colored("Run metrics:", attrs=["bold", "underline"]))
+    print(colored("\n".join(metrics.summary()) + "\n"))
+    if metrics_json:
+        metrics.write_json(metrics_json)
+    if metrics_prometheus:
+        metrics.write_prometheus(metrics_prometheus)
+    if trace_file:
+        metrics.write_trace(trace_file)
+        print(colored(f"Wrote the trace to {trace_file} (open it in chrome://tracing or ui.perfetto.dev).\n"))
+
+def toneRank_train_local_model():
+    """ Trains the local model on every logged Llama3 score and saves it. """
+    examples = ScoreLog().load()
+    model = LocalModel.train(examples)
+    if model is None:
+        print(colored(f"Not enough logged scores to train the local model ({len(examples)}).\n", "red"))
+        return
+    model.save()
+    print(colored(f"Trained the local model on {len(examples)} logged scores and saved it to {MODEL_FILE_NAME}.\n"))
+
+def toneRank_evaluate_local_model(max_uncertainty=DEFAULT_MAX_UNCERTAINTY):
+    """ Evaluates the local model against held-out Llama3 scores and prints the results. """
+    examples = ScoreLog().load()
+    results = LocalModel.evaluate(examples, max_uncertainty)
+    if results is None:
+        print(colored(f"Not enough logged scores to evaluate the local model ({len(examples)}).\n", "red"))
+        return
+    hybrid_spearman = results['hybrid_local_spearman']
+    print(colored(f"Trained on {results['training_examples']} scores, tested on {results['held_out_examples']} held-out "
+                  f"Llama3 scores:\n"
+                  f"  Spearman rank correlation: {results['spearman']:.3f}\n"
+                  f"  Mean absolute error: {results['mean_absolute_error']:.2f}\n"
+                  f"  Hybrid mode (max uncertainty {max_uncertainty}) would score {100 * results['hybrid_local_share']:.1f}% "
+                  f"locally, with a rank correlation of "
+                  f"{'n/a' if hybrid_spearman is None else f'{hybrid_spearman:.3f}'} on those emails\n"))
+
+def toneRank_batch_submit(options=None):
+    """ Fetches emails and writes an urgency score request for each of them to a batch input file for Groq's
+     batch API, instead of querying Llama3 now. The emails are saved so toneRank_batch_ingest can finish the
+     ranking once the batch results are available. The emails are fetched and cleaned as the RunOptions
+     select. """
+
+    options = options if options is not None else RunOptions()
+    emails = get_emails(options, Preprocessor(options.body_token_budget) if options.preprocess else None)
+
+    with open(PROMPTS_FILE_NAME, 'r') as f:
+        prompt_data = json.load(f)
+
+    requests = []
+    custom_ids = []
+    for e in emails:
+        prompt_id = 'uscore_prompt_two' if categorise_email(e) == 2 else 'uscore_prompt_one'
+        prompt = uscore_prompt(e, prompt_data, prompt_id)
+        custom_ids.append(BatchJob.make_custom_id("uscore", e.msg_id or prompt)) # stable between runs
+        requests.append(BatchJob.make_request(custom_ids[-1], prompt))
+
+    BatchJob.write_jsonl(BATCH_REQUESTS_FILE_NAME, requests)
+    BatchJob.save_emails(BATCH_EMAILS_FILE_NAME, emails, custom_ids)
+    print(colored(f"Wrote {len(requests)} requests to {BATCH_REQUESTS_FILE_NAME}. Submit it as a Groq batch job, then "
+                  f"run again with --batch-ingest and the results file.\n"))
+
+def toneRank_batch_ingest(results_file_names, options=None):
+    """ Reads the results of a batch job written by toneRank_batch_submit, then ranks the emails and prints
+     the priority report. The to-do list is taken from the results if it was part of the batch; otherwise
+     its request is written to a new batch input file, to be ingested along with these results. Unless
+     options.score_log is False, the scores are logged as training data for the local model. """
+
+    options = options if options is not None else RunOptions()
+
+    emails, custom_ids = BatchJob.load_emails(BATCH_EMAILS_FILE_NAME)
+    results = BatchJob.read_results(results_file_names)
+
+    with open(PROMPTS_FILE_NAME, 'r') as f:
+        prompt_data = json.load(f)
+
+    # Turn each result into the base uscore the query would have returned
+    base_uscores = {}
+    for e, custom_id in zip(emails, custom_ids):
+        try:
+            result = results.get(custom_id, Exception("No result in the batch output"))
+            if isinstance(result, Exception):
+                raise result
+            base_uscores[id(e)] = make_future(float(result))
+        except Exception as ex:
+            base_uscores[id(e)] = make_future(Exception(f"Query failed: {ex}."))
+
+    scorers = Scorers(local_scorer=make_local_scorer(score_log=options.score_log))
+    emails_ranked, flagged_emails = rank_emails(emails, None, prompt_data, options, scorers, base_uscores=base_uscores)
+    scorers.save()
+    if len(emails_ranked) == 0 and len(flagged_emails) == 0:
+        print(colored("No emails found from the past 24 hours.\n"))
+        return
+
+    # Find the to-do list, or request it in a follow-up batch
+    todo_prompt = prompt_data['prompts']['todo_prompt']['prompt'] + make_todo_list_sample(emails_ranked)
+    todo_id = BatchJob.make_custom_id("todo", todo_prompt)
+    tasks = results.get(todo_id)
+    if tasks is None or isinstance(tasks, Exception):
+        BatchJob.write_jsonl(BATCH_REQUESTS_FILE_NAME, [BatchJob.make_request(todo_id, todo_prompt)])
+        tasks = f"(Pending: submit {BATCH_REQUESTS_FILE_NAME}, then ingest its results together with these ones.)"
+
+    print_priority_report(emails_ranked, flagged_emails, None, prompt_data, tasks)
+
+def toneRank_batch_run_local(results_file_name, options=None):
+    """ Answers the requests in the batch input file with interactive Llama3 queries through the
+     LocalBatchEndpoint, writing a results file in the batch API's format (for when the batch API is not
+     available). Responses are cached unless options.use_cache is False. """
+
+    options = options if options is not None else RunOptions()
+    cache = ResponseCache(options.cache_file) if options.use_cache else None
+    try:
+        llama3 = GroqLlama(cache=cache)
+        endpoint = LocalBatchEndpoint(lambda prompt: GroqLlama.get_cached_llama_response(llama3, prompt))
+        failures = endpoint.run(BATCH_REQUESTS_FILE_NAME, results_file_name)
+        print(colored(f"Wrote the results to {results_file_name} ({failures} requests failed).\n"))
+    finally:
+        if cache is not None:
+            cache.close()
+
+def toneRank_daemon(options=None, interval=DEFAULT_INTERVAL, trigger_file=None, half_life=DEFAULT_HALF_LIFE,
+                    report_file=REPORT_FILE_NAME, cycles=None):
+    """ Keeps the priority report up to date until interrupted (or for the specified number of cycles).
+     Every interval seconds, or as soon as trigger_file is touched, Gmail is polled for the mail which
+     arrived since the last cycle; only that mail (and any email which could not be scored before) is
+     scored, and it is merged into a ranking kept in the state store, whose uscores decay with a half-life
+     of half_life hours. The report is written atomically to report_file whenever it changes, and the
+     to-do list is only regenerated when new mail changes the emails it is made from, so a cycle without
+     new mail makes no Llama3 queries. Mail is fetched and scored as the RunOptions select (as in
+     toneRank_main; the options of a single run, such as streaming, budgets and checkpoints, do not apply). """
+
+    options = options if options is not None else RunOptions()
+    with open(PROMPTS_FILE_NAME, 'r') as f:
+        prompt_data = json.load(f)
+    store = ToneRank_IO.active.store
+    scorers = Scorers.from_options(options, store)
+    ranking = DecayingRanking(half_life, store, options.threads)
+    history_id = store.get_setting(HISTORY_SETTING) if store is not None else None
+    tasks_sample, tasks = store.get_setting(TASKS_SETTING, [None, None]) if store is not None else [None, None]
+    last_report = None
+    last_mtime = trigger_mtime(trigger_file) if trigger_file else None
+    print(colored(f"ToneRank daemon started: {len(ranking)} emails ranked, polling every {interval} seconds"
+                  f"{f' or when {trigger_file} is touched' if trigger_file else ''}. Press Ctrl-C to stop.\n"))
+
+    cache = ResponseCache(options.cache_file) if options.use_cache else None # closed when the daemon stops, however it stops
+    cycle = 0
+    try:
+        llama3 = GroqLlama(cache=cache)
+        while True:
+            Metrics.active = Metrics() # measure each cycle on its own
+            started = time.time()
+            try:
+                new_emails, removed_ids, history_id = GmailPipe.poll_new_emails(history_id, options.batch_size)
+                now = int(time.time() * 1000)
+                ranking.remove(removed_ids)
+                ranking.expire(now)
+                new_emails = [e for e in new_emails if ranking.is_new(e)]
+
+                # Score only the new mail (and retry the emails which could not be scored before)
+                if new_emails:
+                    if scorers.preprocessor is not None:
+                        for e in new_emails:
+                            scorers.preprocessor.process(e)
+                    if options.threads: # New messages of a thread already ranked are grouped with its entry
+                        new_emails = group_threads(new_emails, ranking.previous_messages(new_emails))
+                    new_keys = {ranking.key(e) for e in new_emails}
+                    retried = [e for e in ranking.flagged() if ranking.key(e) not in new_keys] # replaced by newer messages otherwise
+                    emails_ranked, flagged_emails = rank_emails(new_emails + retried, llama3, prompt_data, options, scorers)
+                    ranking.merge(emails_ranked, [(e, categorise_email(e), get_keyword_modifier(e) > 0.0)
+                                                  for e in flagged_emails])
+                    scorers.save()
+
+                # Refresh the report, regenerating the to-do list only if new mail changed its emails
+                emails_ranked = ranking.ranking(now)
+                sample = [ranking.key(e) for e in emails_ranked.top(ToneRank_IO.active.todo_list_sample_size)]
+                if tasks is None or (new_emails and sample != tasks_sample):
+                    tasks = generate_todo_list(make_todo_list_sample(emails_ranked), llama3, prompt_data) if sample else ""
+                    tasks_sample = sample
+                    if store is not None:
+                        store.set_setting(TASKS_SETTING, [tasks_sample, tasks])
+                report = format_report(emails_ranked, ranking.flagged(), tasks, ToneRank_IO.active.top_email_size)
+                if report != last_report:
+                    write_report(report_file, report)
+                    last_report = report
+
+                ranking.save()
+                if store is not None:
+                    store.set_setting(HISTORY_SETTING, history_id)
+                if new_emails:
+                    print(colored(f"[{time.strftime('%H:%M:%S')}] Scored {len(new_emails)} new emails "
+                                  f"({Metrics.active.counters.get('llm_requests', 0)} Llama3 queries); "
+                                  f"{len(ranking)} ranked, report written to {report_file}"))
+                    if store is not None:
+                        store.record_run(started, len(emails_ranked), len(ranking.flagged()), Metrics.active.to_dict())
+            except Exception as e: # keep running through network and API failures, and try again next cycle
+                print(colored(f"❌ Error: the cycle failed, retrying in the next one: {e}", "red"))
+
+            cycle = cycle + 1
+            if cycles is not None and cycle >= cycles:
+                break
+            last_mtime = wait_for_trigger(interval, trigger_file, last_mtime)
+    except KeyboardInterrupt:
+        print(colored("\nStopping the ToneRank daemon.\n"))
+    finally:
+        ranking.save()
+        if cache is not None:
+            cache.close()
+
+def toneRank_profiles(profiles_dir, options=None, workers=DEFAULT_PROFILE_WORKERS):
+    """ Runs toneRank_main (with the RunOptions given) for every mailbox profile in profiles_dir at once, each
+     in its own process, sharing one rate limiter and one response cache (options.cache_file). Each profile is a directory
+     holding its own Gmail credentials (token.json) and state store; its report is written to last_run.txt
+     there. Prints a line as each profile finishes, then the total time. """
+    profile_dirs = find_profiles(profiles_dir)
+    if not profile_dirs:
+        print(colored(f"No profiles found in {profiles_dir} (each needs its own directory with a token.json).\n", "red"))
+        return
+    print(colored(f"Running ToneRank for {len(profile_dirs)} profiles, {min(workers, len(profile_dirs))} at a time...\n"))
+    start = time.perf_counter()
+    options = options if options is not None else RunOptions()
+    for result in run_profiles(profile_dirs, toneRank_main, options, workers, options.cache_file):
+        if result["error"] is not None:
+            print(colored(f"❌ {result['profile']}: failed after {result['seconds']:.1f}s: {result['error']}", "red"))
+        else:
+            print(colored(f"✅ {result['profile']}: {result['seconds']:.1f}s, {result['llm_requests']} Llama3 requests, "
+                          f"{result['cache_hits']} cache hits"))
+    print(colored(f"\nAll profiles done in {time.perf_counter() - start:.1f}s. Each report is in its profile's last_run.txt.\n"))
+
+def parse_args():
+    """ Parses the command line options. """
+    parser = argparse.ArgumentParser(description="Ranks the emails from the past 24 hours by urgency.")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the on-disk Llama3 response cache")
+    parser.add_argument("--clear-cache", action="store_true", help="delete every cached Llama3 response on startup")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"the number of emails fetched per Gmail batch request, up to 100 (default {BATCH_SIZE})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch the emails which changed since the last run (stored in sync_state.json)")
+    parser.add_argument("--stream", action="store_true", help="score emails while they are still being fetched")
+    parser.add_argument("--batch-prompts", action="store_true", help="score several emails with each Llama3 prompt")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f"the estimated max size of a batch prompt, in tokens (default {DEFAULT_TOKEN_BUDGET})")
+    parser.add_argument("--no-preprocess", action="store_true",
+                        help="paste email bodies into prompts as they are, without stripping quotes, signatures and footers")
+    parser.add_argument("--body-token-budget", type=int, default=DEFAULT_BODY_TOKEN_BUDGET,
+                        help=f"the estimated max tokens kept from each email body (default {DEFAULT_BODY_TOKEN_BUDGET})")
+    parser.add_argument("--show-tokens-saved", action="store_true", help="list the tokens preprocessing saved per email")
+    parser.add_argument("--no-threads", action="store_true",
+                        help="score and list every message on its own, instead of once per Gmail thread")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="query Llama3 for near-duplicate emails instead of reusing the score of an earlier copy")
+    parser.add_argument("--dedupe-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help=f"the max number of differing SimHash bits (of 64) between near-duplicates (default {DEFAULT_MAX_DISTANCE})")
+    parser.add_argument("--dedupe-history", action="store_true",
+                        help="also reuse the scores of near-duplicates from the same sender scored in the last 7 days of runs")
+    parser.add_argument("--prescore", action="store_true",
+                        help="give obvious bulk mail (newsletters, receipts, notifications) a low score without querying Llama3")
+    parser.add_argument("--prescore-threshold", type=float, default=DEFAULT_PRESCORE_THRESHOLD,
+                        help=f"the confidence (0-1) needed to score bulk mail without a query (default {DEFAULT_PRESCORE_THRESHOLD})")
+    parser.add_argument("--scorer", choices=SCORER_MODES, default="llm",
+                        help="score emails with Llama3, the local model trained on its past scores, or the local model "
+                             "only where it is confident (default llm)")
+    parser.add_argument("--max-uncertainty", type=float, default=DEFAULT_MAX_UNCERTAINTY,
+                        help=f"in hybrid mode, the max uncertainty (in uscore points) of a local score (default {DEFAULT_MAX_UNCERTAINTY})")
+    parser.add_argument("--no-score-log", action="store_true", help="do not log Llama3 scores as training data for the local model")
+    parser.add_argument("--train-local-model", action="store_true", help="train the local model on the logged scores, then exit")
+    parser.add_argument("--evaluate-local-model", action="store_true",
+                        help="report how well the local model ranks held-out logged scores, then exit")
+    parser.add_argument("--max-llm-calls", type=int, default=None,
+                        help="make at most N scoring queries, on the emails most likely to reach the top of the report; "
+                             "the rest are ranked on an estimate and marked as not scored")
+    parser.add_argument("--deadline", type=float, default=None, metavar="SECONDS",
+                        help="start no scoring queries after this many seconds; unscored emails are ranked on an estimate")
+    parser.add_argument("--spill-bodies", action="store_true",
+                        help="keep large email bodies in a memory-mapped temporary file instead of in memory")
+    parser.add_argument("--profiles", metavar="DIR",
+                        help="run for every mailbox profile in DIR at once (one directory each, with its own token.json), then exit")
+    parser.add_argument("--profile-workers", type=int, default=DEFAULT_PROFILE_WORKERS, metavar="N",
+                        help=f"with --profiles, the number of mailboxes run at once (default {DEFAULT_PROFILE_WORKERS})")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running, scoring new mail as it arrives and writing the report to --report-file")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, metavar="SECONDS",
+                        help=f"in daemon mode, the seconds between polls for new mail (default {DEFAULT_INTERVAL})")
+    parser.add_argument("--trigger-file", metavar="FILE",
+                        help="in daemon mode, also poll as soon as this file is created or touched (e.g. by a push webhook)")
+    parser.add_argument("--decay-half-life", type=float, default=DEFAULT_HALF_LIFE, metavar="HOURS",
+                        help=f"in daemon mode, the age at which an email's uscore counts half (default {DEFAULT_HALF_LIFE}; 0 for no decay)")
+    parser.add_argument("--report-file", default=REPORT_FILE_NAME, metavar="FILE",
+                        help=f"in daemon mode, the file the priority report is written to (default {REPORT_FILE_NAME})")
+    parser.add_argument("--cycles", type=int, default=None, help="in daemon mode, stop after N cycles")
+    parser.add_argument("--resume", action="store_true",
+                        help="pick up the last run where it stopped, only scoring the emails it had not scored")
+    parser.add_argument("--retry-flagged", action="store_true",
+                        help="rank the emails of the last run again, only querying the ones which could not be processed")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help=f"do not journal the run's emails and scores in {CHECKPOINT_FILE_NAME} (so it cannot be resumed)")
+    parser.add_argument("--max-body-bytes", type=int, default=MAX_BODY_BYTES,
+                        help=f"the most bytes of text kept from each email body (default {MAX_BODY_BYTES}); at 200 or "
+                             "less only the snippet Gmail sends with each message is used, and bodies are not fetched")
+    parser.add_argument("--metrics-json", metavar="FILE", help="write the run's timings, token counts and cost to a JSON file")
+    parser.add_argument("--metrics-prometheus", metavar="FILE",
+                        help="write the run's metrics to a file in the Prometheus text format (e.g. for node_exporter)")
+    parser.add_argument("--trace", metavar="FILE", help="write a Chrome trace of the run's stages, requests and retries")
+    parser.add_argument("--batch-submit", action="store_true",
+                        help=f"write the scoring prompts to {BATCH_REQUESTS_FILE_NAME} for a Groq batch job, then exit")
+    parser.add_argument("--batch-ingest", nargs="+", metavar="RESULTS_FILE",
+                        help="rank the emails saved by --batch-submit using batch job result files, then exit")
+    parser.add_argument("--batch-run-local", metavar="RESULTS_FILE",
+                        help=f"answer {BATCH_REQUESTS_FILE_NAME} with interactive queries and write a results file, then exit")
+    return parser.parse_args()
+
+def run_headless(args, options):
+    """ Runs the mode selected on the command line (with the RunOptions built from it) without showing the
+     menu. Returns False if no headless mode was selected. """
+    if args.train_local_model:
+        toneRank_train_local_model()
+        return True
+    if args.evaluate_local_model:
+        toneRank_evaluate_local_model(args.max_uncertainty)
+        return True
+    if args.profiles:
+        toneRank_profiles(args.profiles, options, args.profile_workers)
+        return True
+    if not (args.daemon or args.batch_submit or args.batch_ingest or args.batch_run_local):
+        return False
+    ToneRank_IO.active.load_remote_data() # Load data from file
+    if args.daemon:
+        toneRank_daemon(options, args.interval, args.trigger_file, args.decay_half_life, args.report_file, args.cycles)
+    elif args.batch_submit:
+        toneRank_batch_submit(options)
+    elif args.batch_ingest:
+        toneRank_batch_ingest(args.batch_ingest, options)
+    else:
+        toneRank_batch_run_local(args.batch_run_local, options)
+    return True
 
 if __name__ == '__main__':
+    args = parse_args()
+    options = RunOptions.from_args(args) # the options of every mode
+    GmailPipe.max_body_bytes = max(0, args.max_body_bytes)
+    if args.clear_cache:
+        with ResponseCache() as cache:
+            cache.clear()
+    if run_headless(args, options):
+        sys.exit()
+
     print("\n")
     print(colored("@@@@@@@@@    @@@@@@@    @@@   @@@   @@@@@@@@@      @@@@@@@@     @@@@@@@    @@@   @@@   @@@   @@@", "red"))
     print(colored("   @@@      @@@   @@@   @@@@  @@@   @@@            @@@   @@@   @@@   @@@   @@@@  @@@   @@@  @@@ ", "red"))
@@ -341,7 +1176,7 @@ if __name__ == '__main__':
     print(colored("=====================================\n", attrs=["bold"]))
 
     try:
-        ToneRank_IO.load_remote_data() # Load data from file
+        ToneRank_IO.active.load_remote_data() # Load data from file
     except Exception as e:
         print(f"Error while user preferences from the file: {e}")
 
@@ -369,23 +1204,23 @@ if __name__ == '__main__':
         elif responseNum == OPTION_4:
             remove_keywords()
         elif responseNum == OPTION_5:
-            print(colored(f"Emails you have marked as high-priority:\n{ToneRank_IO.email_whitelist}\n"))
+            print(colored(f"Emails you have marked as high-priority:\n{', '.join(sorted(ToneRank_IO.active.email_whitelist))}\n"))
         elif responseNum == OPTION_6:
             keystr = ""
-            for key in ToneRank_IO.keywords.keys():
-                keystr = keystr + f"{key} ({ToneRank_IO.keywords[key]}), "
+            for key in ToneRank_IO.active.keywords.keys():
+                keystr = keystr + f"{key} ({ToneRank_IO.active.keywords[key]}), "
             print(f"Keywords you have marked as high-priority:\n{keystr}\n")
         elif responseNum == OPTION_7:
-            print(colored(f"Priority report will highlight the top {ToneRank_IO.top_email_size} emails, and " \
-              f"makes a to-do list from the top {ToneRank_IO.todo_list_sample_size} emails\n"))
+            print(colored(f"Priority report will highlight the top {ToneRank_IO.active.top_email_size} emails, and " \
+              f"makes a to-do list from the top {ToneRank_IO.active.todo_list_sample_size} emails\n"))
         elif responseNum == OPTION_8: 
             update_priority_report()
         elif responseNum == OPTION_9: 
-            toneRank_main()
+            toneRank_main(options)
             break
         elif responseNum == OPTION_10:
             break
     try:
-        ToneRank_IO.save_local_data()
+        ToneRank_IO.active.save_local_data()
     except Exception as e:
         print(f"Error while saving user preferences to the file: {e}")
@@ -1,24 +1,28 @@
-# Utility class for handling I/O, specifically storing data in files
+# Utility class for handling I/O, specifically storing the user's preferences
 # @author Rylan Ahmadi (Ry305)
-# Last updated 07/11/2025
+# Last updated 10/18/2026
 
-import csv
-import os
-from typing import List
+from typing import Optional, Set
 from termcolor import colored
+from keywordIndex import KeywordIndex
+from stateStore import StateStore, STATE_FILE_NAME
+from whitelistIndex import WhitelistIndex, normalise_entry
 
 class ToneRank_IO:
 
     """ Used to manage I/O requests involved with running the ToneRank application. Primarily used
-     for loading, accessing, and saving the lists of user-defined keywords and whitelisted emails. """
+     for loading, accessing, and saving the lists of user-defined keywords and whitelisted emails. Each
+     instance holds the preferences of one profile (one mailbox), kept in its own state store (a SQLite
+     file) where every change is written as it is made; ToneRank_IO.active is the profile the application
+     is running for. """
 
-    KEYWORD_FILE_NAME = "keywords.txt" # the name of the file used to save keywords
-    EMAIL_WHITELIST_FILE_NAME = "whitelist.txt" # the name of the file used to save whitelisted emails
+    # The files earlier versions kept their state in (imported into the state store on first run)
+    KEYWORD_FILE_NAME = "keywords.txt"
+    EMAIL_WHITELIST_FILE_NAME = "whitelist.txt"
     PRIORITY_REPORT_FILE_NAME = "report.txt"
+    SENDER_HISTORY_FILE_NAME = "sender_history.json"
     MAX_KEYWORDS = 100 # the maximum number of keywords which can be held in the system at a given time
 
-    LEN_KW_ROWS = 2 # the length of a row in a csv file for keywords
-
     # Default settings for priority report
     MIN_TOP_EMAIL_SIZE = 1
     MAX_TOP_EMAIL_SIZE = 10
@@ -27,121 +31,128 @@ class ToneRank_IO:
     MAX_TODO_SAMPLE_SIZE = 20
     DEFAULT_TODO_SAMPLE_SIZE = 10
 
-    keywords: dict[str, float] = {} # Stores user-inputted keywords to be used in urgency calculation
-    email_whitelist: List[str] = [] # Stores emails the user has whitelisted for Category 0
-    top_email_size: int # The number of emails to be used in "Top X emails to read Right Now"
-    todo_list_sample_size: int # The number of emails to be used when making a to-do list
-
-    @staticmethod
-    def initialize_files():
-        """ Ensure required files exist before attempting to load """
-        for filename in [ToneRank_IO.KEYWORD_FILE_NAME, ToneRank_IO.EMAIL_WHITELIST_FILE_NAME, 
-                         ToneRank_IO.PRIORITY_REPORT_FILE_NAME]:
-            if not os.path.exists(filename):
-                try:
-                    with open(filename, 'x'):
-                        pass # just create the file
-                except Exception as e:
-                    print(f"File initialization error: {e}")
-                    raise
-
-    @staticmethod
-    def add_keyword(keyword, weight):
+    active: "ToneRank_IO" # the profile the application is running for (one per process)
+
+    def __init__(self, state_file_name=STATE_FILE_NAME):
+        """ Creates a profile with no keywords, an empty whitelist and the default report settings, kept in
+         state_file_name once load_remote_data is called (nothing is saved before then). """
+        self.state_file_name = state_file_name
+        self.store: Optional[StateStore] = None # Where changes are written (None until load_remote_data, so nothing is saved)
+        self.keywords: dict[str, float] = {} # Stores user-inputted keywords to be used in urgency calculation
+        self.email_whitelist: Set[str] = set() # Stores the whitelist entries (addresses, domains, wildcards) for Category 0
+        self.top_email_size: int = ToneRank_IO.DEFAULT_TOP_EMAIL_SIZE # The number of emails in "Top X emails to read Right Now"
+        self.todo_list_sample_size: int = ToneRank_IO.DEFAULT_TODO_SAMPLE_SIZE # The number of emails used to make a to-do list
+        self.keyword_index: Optional[KeywordIndex] = None # Matches all keywords at once (rebuilt when the keywords change)
+        self.whitelist_index: Optional[WhitelistIndex] = None # Matches senders against the whitelist (None when it must be rebuilt)
+
+    def get_keyword_index(self):
+        """ Returns the KeywordIndex for the current keywords, rebuilding it only if they have changed
+         since it was last built. """
+        if self.keyword_index is None or self.keyword_index.keywords != self.keywords:
+            self.keyword_index = KeywordIndex(self.keywords)
+        return self.keyword_index
+
+    def get_whitelist_index(self):
+        """ Returns the WhitelistIndex for the current whitelist. Anything which replaces or changes
+         email_whitelist other than the methods below must set whitelist_index to None. """
+        if self.whitelist_index is None:
+            self.whitelist_index = WhitelistIndex(self.email_whitelist)
+        return self.whitelist_index
+
+    def is_whitelisted(self, email_address):
+        """ Returns True if a sender address matches an entry in the whitelist. """
+        return self.get_whitelist_index().matches(email_address.strip().lower())
+
+    def add_keyword(self, keyword, weight):
         """ Adds a new keyword to the list if it is not a duplicate, and if the capacity has not
          been reached. """
-        if len(ToneRank_IO.keywords) >= ToneRank_IO.MAX_KEYWORDS:
+        if len(self.keywords) >= ToneRank_IO.MAX_KEYWORDS:
             print(colored(f"Cannot add keyword. Maximum number of keywords ({ToneRank_IO.MAX_KEYWORDS}) reached.", "red"))
             return # exit
         keyword = keyword.strip().lower() # Normalize the keyword
         # Add the keyword (and its weight) to the list
-        if keyword not in ToneRank_IO.keywords:
-            ToneRank_IO.keywords[keyword] = weight
+        if keyword not in self.keywords:
+            self.keywords[keyword] = weight
+            if self.store is not None:
+                self.store.set_keyword(keyword, weight)
         else:
             print(colored(f"Keyword \"{keyword}\" has already been added.", "red"))
     
-    @staticmethod
-    def remove_keyword(keyword):
+    def remove_keyword(self, keyword):
         """ Removes a keyword from the list. """
         keyword = keyword.strip().lower() # Normalize the keyword
-        if keyword in ToneRank_IO.keywords:
-            del ToneRank_IO.keywords[keyword]
+        if keyword in self.keywords:
+            del self.keywords[keyword]
+            if self.store is not None:
+                self.store.remove_keyword(keyword)
     
-    @staticmethod
-    def add_email_to_whitelist(email):
-        """ Add an email to the whitelist if it is not already present. """
-        email = email.strip().lower() # Normalize email
-        if email not in ToneRank_IO.email_whitelist:
-            ToneRank_IO.email_whitelist.append(email)
+    def add_email_to_whitelist(self, email):
+        """ Add an email (or a domain or wildcard entry, see whitelistIndex) to the whitelist if it is
+         not already present. """
+        normalised = normalise_entry(email)
+        if normalised is None:
+            print(colored(f"Invalid whitelist entry: {email}", "red"))
+            return
+        email, kind = normalised
+        if email not in self.email_whitelist:
+            self.email_whitelist.add(email)
+            self.whitelist_index = None
+            if self.store is not None:
+                self.store.add_whitelist_entry(email, kind)
         else:
             print(colored(f"Email \"{email}\" has already been added.", "red"))
 
-    @staticmethod
-    def remove_email(email):
-        """ Removes an email from the whitelist. """
-        email = email.strip().lower() # Normalize the keyword
-        if email in ToneRank_IO.email_whitelist:
-            ToneRank_IO.email_whitelist.remove(email)
+    def remove_email(self, email):
+        """ Removes an email (or a domain or wildcard entry) from the whitelist. """
+        normalised = normalise_entry(email)
+        email = normalised[0] if normalised is not None else email.strip().lower() # Normalize the entry
+        if email in self.email_whitelist:
+            self.email_whitelist.remove(email)
+            self.whitelist_index = None
+            if self.store is not None:
+                self.store.remove_whitelist_entry(email)
+
+    def set_report_settings(self, top_email_size, todo_list_sample_size):
+        """ Sets the sizes of the "Top X emails" list and of the to-do list sample. """
+        self.top_email_size = top_email_size
+        self.todo_list_sample_size = todo_list_sample_size
+        if self.store is not None:
+            self.store.set_setting("top_email_size", top_email_size)
+            self.store.set_setting("todo_list_sample_size", todo_list_sample_size)
     
-    @staticmethod
-    def load_remote_data():
-        """ Loads data saved to file from previous runs of the application. """
+    def load_remote_data(self, file_name=None):
+        """ Opens the state store (the profile's state file, unless another file_name is given) and loads
+         the data saved by previous runs of the application. On the first run, the CSV files earlier
+         versions used are imported. """
         try:
-            # Initialize files
-            ToneRank_IO.initialize_files()
-            # Load keywords
-            with open(ToneRank_IO.KEYWORD_FILE_NAME, 'r') as file:
-                csv_reader = csv.reader(file)
-                for row in csv_reader:
-                    if row and len(row) >= ToneRank_IO.LEN_KW_ROWS: # skip empty rows
-                        keyword = row[0].strip().lower()
-                        weight = float(row[1])
-                        ToneRank_IO.keywords[keyword] = weight
-            # Load whitelisted emails
-            with open(ToneRank_IO.EMAIL_WHITELIST_FILE_NAME, 'r') as file:
-                csv_reader = csv.reader(file)
-                for row in csv_reader:
-                    if row: # skip empty rows
-                        ToneRank_IO.email_whitelist.append(row[0])
-            # Load priority report options
-            with open(ToneRank_IO.PRIORITY_REPORT_FILE_NAME, 'r') as file:
-                csv_reader = csv.reader(file)
-                rows = list(csv_reader) # Read all rows into a list
-                if len(rows) == 0: # If this is the first run of the system 
-                    ToneRank_IO.top_email_size = ToneRank_IO.DEFAULT_TOP_EMAIL_SIZE
-                    ToneRank_IO.todo_list_sample_size = ToneRank_IO.DEFAULT_TODO_SAMPLE_SIZE
-                else:
-                    ToneRank_IO.top_email_size = int(rows[0][0]) # Load the Top X emails size                    
-                    ToneRank_IO.todo_list_sample_size = int(rows[1][0]) # Load the todo list sample size
+            if self.store is not None:
+                self.store.close()
+            file_name = file_name if file_name is not None else self.state_file_name
+            self.store = StateStore(file_name)
+            if self.store.migrate(ToneRank_IO.KEYWORD_FILE_NAME, ToneRank_IO.EMAIL_WHITELIST_FILE_NAME,
+                                  ToneRank_IO.PRIORITY_REPORT_FILE_NAME, ToneRank_IO.SENDER_HISTORY_FILE_NAME):
+                print(colored(f"Imported your keywords, whitelist and settings into {file_name}.\n"))
+            self.keywords = self.store.keywords()
+            self.email_whitelist = set(self.store.whitelist())
+            self.whitelist_index = None
+            self.top_email_size = self.store.get_setting("top_email_size", ToneRank_IO.DEFAULT_TOP_EMAIL_SIZE)
+            self.todo_list_sample_size = self.store.get_setting("todo_list_sample_size", ToneRank_IO.DEFAULT_TODO_SAMPLE_SIZE)
         except Exception as e:
             print(f"Error when loading files: {e}")
             raise
 
-    @staticmethod
-    def save_local_data():
-        """ Save keywords and whitelisted emails to the file. """
-        try:
-            with open(ToneRank_IO.KEYWORD_FILE_NAME, 'w', newline='') as file:
-                csv_writer = csv.writer(file)
-                for w, weight in ToneRank_IO.keywords.items():
-                    csv_writer.writerow([w, weight]) # each item on its own row
-        except Exception as e:
-            print(f"Error when saving keywords: {e}")
-            raise
-        try:  
-            with open(ToneRank_IO.EMAIL_WHITELIST_FILE_NAME, 'w', newline='', encoding='utf-8') as file:
-                csv_writer = csv.writer(file)
-                for e in ToneRank_IO.email_whitelist:
-                    csv_writer.writerow([e])
-        except Exception as e:
-            print(f"Error when saving email whitelist: {e}")
-            raise
+    def save_local_data(self):
+        """ Saves the priority report settings (in case they were set directly) and closes the state store.
+         Everything else was written when it changed. """
+        if self.store is None:
+            return
         try:
-            with open(ToneRank_IO.PRIORITY_REPORT_FILE_NAME, 'w', newline='', encoding='utf-8') as file:
-                csv_writer = csv.writer(file)
-                csv_writer.writerow([ToneRank_IO.top_email_size])
-                csv_writer.writerow([ToneRank_IO.todo_list_sample_size])
+            self.set_report_settings(self.top_email_size, self.todo_list_sample_size)
+            self.store.close()
+            self.store = None
         except Exception as e:
             print(f"Error when saving priority report customizations: {e}")
             raise
 
 
+ToneRank_IO.active = ToneRank_IO()
@@ -0,0 +1,73 @@
+# Constant-time whitelist matcher for sender addresses, with domain and wildcard entries
+# @author Rylan Ahmadi (Ry305)
+# Last updated 10/18/2026
+
+from fnmatch import fnmatchcase
+
+# The kinds of whitelist entry
+ADDRESS = "address" # name@example.com: that address only
+DOMAIN = "domain" # @example.com or *@example.com: every address at the domain
+SUBDOMAINS = "subdomains" # *.example.com or @*.example.com: every address at any subdomain of the domain
+PATTERN = "pattern" # any other entry with * or ?: a shell-style pattern matched against the whole address
+
+
+def normalise_entry(entry):
+    """ Returns (entry, kind) for a whitelist entry typed by the user, with the entry in its canonical
+     (lowercase) form, or None if it is not a valid entry. """
+    entry = entry.strip().lower()
+    if entry.startswith("*@"):
+        entry = entry[1:] # *@example.com means the same as @example.com
+    if entry.startswith("@*."):
+        entry = entry[1:] # @*.example.com means the same as *.example.com
+    if entry.startswith("*.") and "@" not in entry and "*" not in entry[2:] and "?" not in entry and "." in entry[2:]:
+        return entry, SUBDOMAINS
+    if "*" in entry or "?" in entry:
+        return (entry, PATTERN) if "@" in entry else None
+    if entry.startswith("@") and "." in entry[1:] and "@" not in entry[1:]:
+        return entry, DOMAIN
+    local, _, domain = entry.partition("@")
+    if local and "." in domain and "@" not in domain:
+        return entry, ADDRESS
+    return None
+
+
+class WhitelistIndex:
+
+    """ Answers whether a sender address is whitelisted. Addresses and domains are kept in sets, and a
+     subdomain entry is found by looking up each parent of the sender's domain, so a check costs the
+     same however long the whitelist is. Only pattern entries (rare) are checked one by one. """
+
+    def __init__(self, entries):
+        """ Builds the index for an iterable of canonical whitelist entries. """
+        self.addresses = set()
+        self.domains = set()
+        self.subdomain_parents = set()
+        self.patterns = []
+        for entry in entries:
+            normalised = normalise_entry(entry)
+            if normalised is None:
+                continue # Invalid entries (e.g. from a hand-edited file) never match
+            entry, kind = normalised
+            if kind == ADDRESS:
+                self.addresses.add(entry)
+            elif kind == DOMAIN:
+                self.domains.add(entry[1:])
+            elif kind == SUBDOMAINS:
+                self.subdomain_parents.add(entry[2:])
+            else:
+                self.patterns.append(entry)
+
+    def matches(self, address):
+        """ Returns True if the (lowercase) address is whitelisted. """
+        if address in self.addresses:
+            return True
+        domain = address.rpartition("@")[2]
+        if domain in self.domains:
+            return True
+        if self.subdomain_parents:
+            dot = domain.find(".")
+            while dot != -1: # Each parent domain: a.b.example.com -> b.example.com -> example.com -> com
+                if domain[dot + 1:] in self.subdomain_parents:
+                    return True
+                dot = domain.find(".", dot + 1)
+        return any(fnmatchcase(address, pattern) for pattern in self.patterns)